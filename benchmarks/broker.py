@@ -0,0 +1,329 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""In-memory stand-in for the subset of pika `BlockingConnection`/`BlockingChannel` API used by the service.
+
+All channels of a `Broker` are driven by a single event loop, any `start_consuming()` or
+`process_data_events()` call delivers messages to every consumer of the broker.
+"""
+from collections import deque
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+import heapq
+import itertools
+import threading
+import time
+
+from pika import BasicProperties
+from pika.frame import Method
+from pika.spec import (
+    Basic,
+    Queue,
+)
+
+
+REPLY_TO = "amq.rabbitmq.reply-to"
+
+Message = Tuple[bytes, BasicProperties, bool]
+Callback = Callable[["Channel", Basic.Deliver, BasicProperties, bytes], None]
+
+
+class Consumer:
+    """Subscription of channel to queue."""
+
+    def __init__(self, channel: "Channel", tag: str, queue: str, callback: Callback, auto_ack: bool) -> None:
+        """Initialize consumer."""
+        self.channel = channel
+        self.tag = tag
+        self.queue = queue
+        self.callback = callback
+        self.auto_ack = auto_ack
+
+    def can_receive(self) -> bool:
+        """Check prefetch limit of consumer's channel."""
+        prefetch_count = self.channel.prefetch_count
+        return self.auto_ack or not prefetch_count or len(self.channel.unacked) < prefetch_count
+
+
+class Broker:
+    """Single-threaded in-process broker with durable queues, direct reply-to and latency injection."""
+
+    def __init__(self, latency: Optional[Callable[[], float]] = None) -> None:
+        """Initialize broker, `latency` returns delay in seconds between publish and enqueue of message."""
+        self.latency = latency
+        self.queues: Dict[str, Deque[Message]] = {}
+        self.consumers: Dict[str, Deque[Consumer]] = {}
+        self.timers: List[Tuple[float, int, Callable[[], None]]] = []
+        self.threadsafe: Deque[Callable[[], None]] = deque()
+        self.wakeup = threading.Event()
+        self.counter = itertools.count(1)
+        self.running = True
+
+    def connection(self) -> "Connection":
+        """Open new connection."""
+        return Connection(self)
+
+    def declare(self, queue: str) -> Method[Queue.DeclareOk]:
+        """Declare queue if it does not exist and return `Queue.DeclareOk` frame."""
+        messages = self.queues.setdefault(queue, deque())
+        return Method(0, Queue.DeclareOk(queue, len(messages), len(self.consumers.get(queue, ()))))
+
+    def publish(self, routing_key: str, body: bytes, properties: BasicProperties) -> None:
+        """Enqueue message after injected latency, unroutable messages are dropped."""
+        delay = self.latency() if self.latency is not None else 0.0
+
+        if delay > 0:
+            self.call_later(delay, lambda: self.enqueue(routing_key, (body, properties, False)))
+        else:
+            self.enqueue(routing_key, (body, properties, False))
+
+    def enqueue(self, queue: str, message: Message, front: bool = False) -> None:
+        """Put message to queue."""
+        if queue not in self.queues:
+            return
+
+        if front:
+            self.queues[queue].appendleft(message)
+        else:
+            self.queues[queue].append(message)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> int:
+        """Schedule `callback` after `delay` seconds."""
+        timer_id = next(self.counter)
+        heapq.heappush(self.timers, (time.monotonic() + delay, timer_id, callback))
+        return timer_id
+
+    def remove_timeout(self, timer_id: int) -> None:
+        """Cancel timer scheduled by `call_later()`, unknown or fired timers are ignored."""
+        self.timers = [timer for timer in self.timers if timer[1] != timer_id]
+        heapq.heapify(self.timers)
+
+    def add_callback_threadsafe(self, callback: Callable[[], None]) -> None:
+        """Schedule `callback` from any thread."""
+        self.threadsafe.append(callback)
+        self.wakeup.set()
+
+    def run_callbacks(self) -> bool:
+        """Run due timers and threadsafe callbacks."""
+        ran = False
+
+        while self.threadsafe:
+            self.threadsafe.popleft()()
+            ran = True
+
+        while self.timers and self.timers[0][0] <= time.monotonic():
+            heapq.heappop(self.timers)[2]()
+            ran = True
+
+        return ran
+
+    def dispatch(self) -> bool:
+        """Deliver messages to consumers in round-robin order."""
+        delivered = False
+
+        for queue, consumers in list(self.consumers.items()):
+            messages = self.queues.get(queue)
+
+            for _ in range(len(consumers)):
+                if not messages:
+                    break
+
+                consumers.rotate(-1)
+                if consumers[-1].can_receive():
+                    consumers[-1].channel.deliver(consumers[-1], messages.popleft())
+                    delivered = True
+
+        return delivered
+
+    def shutdown(self) -> None:
+        """Stop event loops of all channels."""
+        self.running = False
+
+    def process_events(self, time_limit: float = 0) -> None:
+        """Run event loop once, waiting up to `time_limit` seconds if there is nothing to do."""
+        if self.run_callbacks() | self.dispatch():
+            return
+
+        timeout = time_limit
+        if self.timers:
+            timeout = min(timeout, max(0.0, self.timers[0][0] - time.monotonic()))
+
+        self.wakeup.wait(timeout)
+        self.wakeup.clear()
+        self.run_callbacks()
+        self.dispatch()
+
+
+class Connection:
+    """Stand-in for `pika.BlockingConnection`."""
+
+    def __init__(self, broker: Broker) -> None:
+        """Initialize connection."""
+        self.broker = broker
+        self.is_open = True
+
+    def channel(self) -> "Channel":
+        """Open new channel."""
+        return Channel(self, next(self.broker.counter))
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> int:
+        """Schedule `callback` after `delay` seconds."""
+        return self.broker.call_later(delay, callback)
+
+    def remove_timeout(self, timer_id: int) -> None:
+        """Cancel timer scheduled by `call_later()`."""
+        self.broker.remove_timeout(timer_id)
+
+    def add_callback_threadsafe(self, callback: Callable[[], None]) -> None:
+        """Schedule `callback` from any thread."""
+        self.broker.add_callback_threadsafe(callback)
+
+    def process_data_events(self, time_limit: Optional[float] = 0) -> None:
+        """Run broker event loop once."""
+        self.broker.process_events(time_limit or 0)
+
+    def sleep(self, duration: float) -> None:
+        """Run broker event loop for `duration` seconds."""
+        deadline = time.monotonic() + duration
+
+        while time.monotonic() < deadline:
+            self.broker.process_events(deadline - time.monotonic())
+
+    def close(self) -> None:
+        """Close connection."""
+        self.is_open = False
+
+
+class Channel:
+    """Stand-in for `pika.adapters.blocking_connection.BlockingChannel`."""
+
+    def __init__(self, connection: Connection, number: int) -> None:
+        """Initialize channel."""
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = number
+        self.reply_queue = f"{REPLY_TO}.{number}"
+        self.prefetch_count = 0
+        self.unacked: Dict[int, Tuple[str, Message]] = {}
+        self.delivery_tags = itertools.count(1)
+        self.consuming = False
+        self.is_open = True
+
+    def queue_declare(self, queue: str, passive: bool = False, **_: Any) -> Method[Queue.DeclareOk]:
+        """Declare queue."""
+        if passive and queue not in self.broker.queues:
+            raise KeyError(queue)
+
+        return self.broker.declare(queue)
+
+    def basic_qos(self, prefetch_size: int = 0, prefetch_count: int = 0, global_qos: bool = False) -> None:
+        """Limit number of unacknowledged deliveries."""
+        del prefetch_size, global_qos
+        self.prefetch_count = prefetch_count
+
+    def basic_publish(
+        self,
+        exchange: str,
+        routing_key: str,
+        body: bytes,
+        properties: Optional[BasicProperties] = None,
+        mandatory: bool = False,
+    ) -> None:
+        """Publish message to queue through default exchange."""
+        del exchange, mandatory
+        properties = properties or BasicProperties()
+
+        if properties.reply_to == REPLY_TO:
+            properties = BasicProperties(**{**properties.__dict__, "reply_to": self.reply_queue})
+
+        self.broker.publish(routing_key, body, properties)
+
+    def basic_consume(self, queue: str, on_message_callback: Callback, auto_ack: bool = False, **_: Any) -> str:
+        """Subscribe to queue, `amq.rabbitmq.reply-to` is a pseudo-queue of this channel."""
+        if queue == REPLY_TO:
+            queue = self.reply_queue
+            self.broker.declare(queue)
+
+        tag = f"ctag{self.channel_number}.{next(self.broker.counter)}"
+        self.broker.consumers.setdefault(queue, deque()).append(
+            Consumer(self, tag, queue, on_message_callback, auto_ack)
+        )
+        return tag
+
+    def basic_cancel(self, consumer_tag: str) -> List[Any]:
+        """Cancel consumer."""
+        for consumers in self.broker.consumers.values():
+            for consumer in list(consumers):
+                if consumer.tag == consumer_tag:
+                    consumers.remove(consumer)
+
+        return []
+
+    def deliver(self, consumer: Consumer, message: Message) -> None:
+        """Deliver message to consumer."""
+        body, properties, redelivered = message
+        tag = next(self.delivery_tags)
+
+        if not consumer.auto_ack:
+            self.unacked[tag] = (consumer.queue, message)
+
+        method = Basic.Deliver(consumer.tag, tag, redelivered, "", consumer.queue)
+        consumer.callback(self, method, properties, body)
+
+    def _settle(self, delivery_tag: int, multiple: bool) -> List[Tuple[str, Message]]:
+        """Remove acknowledged deliveries."""
+        tags = [tag for tag in self.unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+        return [self.unacked.pop(tag) for tag in tags if tag in self.unacked]
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False) -> None:
+        """Acknowledge delivery."""
+        self._settle(delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True) -> None:
+        """Reject delivery, requeued messages are marked as redelivered."""
+        for queue, (body, properties, _) in reversed(self._settle(delivery_tag, multiple)):
+            if requeue:
+                self.broker.enqueue(queue, (body, properties, True), front=True)
+
+    def basic_reject(self, delivery_tag: int = 0, requeue: bool = True) -> None:
+        """Reject single delivery."""
+        self.basic_nack(delivery_tag, requeue=requeue)
+
+    def start_consuming(self) -> None:
+        """Run broker event loop until `stop_consuming()` or `Broker.shutdown()` is called."""
+        self.consuming = True
+
+        while self.consuming and self.broker.running:
+            self.broker.process_events(0.1)
+
+    def stop_consuming(self) -> None:
+        """Stop event loop started by `start_consuming()`."""
+        self.consuming = False
+
+    def close(self) -> None:
+        """Close channel, unacknowledged deliveries are requeued."""
+        self.basic_nack(max(self.unacked, default=0), multiple=True)
+        self.is_open = False
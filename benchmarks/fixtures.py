@@ -0,0 +1,140 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Representative messages, synthetic template archives and fake peers for benchmarks."""
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Tuple,
+)
+import json
+import os
+import shutil
+import tarfile
+
+from pika import BasicProperties
+import msgpack
+
+from benchmarks.broker import Channel
+from service.downloaders import Downloader
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "..", "service", "config_dev.json")
+ARCHIVE_NAME = "rpi4_1.0.0_dac_configs.tgz"
+
+
+def make_request(index: int, encrypt: bool = False) -> Tuple[BasicProperties, bytes]:
+    """Return properties and JSON body of ABS request number `index`."""
+    body = {
+        "platformName": "rpi4",
+        "firmwareVersion": "1.0.0",
+        "appId": f"com.example.app{index % 10}",
+        "appVersion": f"1.0.{index}",
+        "ociImageUrl": f"docker://registry.example.com/com.example.app{index % 10}:1.0.{index}",
+        "encrypt": encrypt,
+    }
+    return BasicProperties(delivery_mode=2, headers={"x-request-id": f"request-{index}"}), json.dumps(body).encode()
+
+
+def publish_requests(channel: Channel, queue: str, count: int) -> None:
+    """Publish `count` requests to `queue`, every second one asks for encrypted bundle."""
+    for index in range(count):
+        props, body = make_request(index, encrypt=index % 2 == 1)
+        channel.basic_publish(exchange="", routing_key=queue, body=body, properties=props)
+
+
+def make_source_message(index: int, encrypt: bool = False) -> Dict[str, Any]:
+    """Return request number `index` extended with envs and headers as `BundleGenHandler.make_src_msg` does."""
+    _, body = make_request(index, encrypt)
+    return {
+        **json.loads(body),
+        "bundle_store_dir": "/bundles",
+        "nginx_store_dir": "/nginx",
+        "x-request-id": f"request-{index}",
+        "id": f"request-{index}",
+    }
+
+
+def make_template_archive(path: str, files: int = 20, size: int = 2048) -> str:
+    """Create tar.gz archive with `files` JSON templates of about `size` bytes each."""
+    directory = os.path.join(os.path.dirname(path), "templates")
+    os.makedirs(directory, exist_ok=True)
+
+    for index in range(files):
+        with open(os.path.join(directory, f"template{index}.json"), "w", encoding="utf8") as out_file:
+            json.dump({"name": f"template{index}", "payload": "x" * size}, out_file)
+
+    with tarfile.open(path, "w:gz") as archive:
+        for name in sorted(os.listdir(directory)):
+            archive.add(os.path.join(directory, name), arcname=name)
+
+    shutil.rmtree(directory)
+    return path
+
+
+class LocalDownloader(Downloader):
+    """Copy template archives from local directory instead of S3."""
+
+    def __init__(self, source: str) -> None:
+        """Initialize downloader with directory of archives."""
+        self.source = source
+
+    def download(self, path: str, filename: str) -> None:
+        """Copy `filename` from source directory to `path` directory."""
+        shutil.copyfile(os.path.join(self.source, filename), os.path.join(path, filename))
+
+
+class FakeBundleGen:
+    """Reply to every BundleGen ticket with successful msgpack status."""
+
+    def __init__(self, channel: Channel, queue: str) -> None:
+        """Subscribe to `queue`."""
+        channel.basic_consume(queue=queue, on_message_callback=self.on_ticket)
+
+    @staticmethod
+    def on_ticket(channel: Channel, method: Any, props: BasicProperties, body: bytes) -> None:
+        """Reply on `reply_to` of ticket."""
+        ticket: Dict[str, Any] = msgpack.unpackb(body)
+        channel.basic_publish(
+            exchange="",
+            routing_key=str(props.reply_to),
+            body=msgpack.packb({"uuid": ticket["uuid"], "success": True}),
+        )
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+
+class StatusCounter:
+    """Count status messages and call `done` after `expected` finished bundles."""
+
+    def __init__(self, channel: Channel, queue: str, expected: int, done: Callable[[], None]) -> None:
+        """Subscribe to `queue`."""
+        self.expected = expected
+        self.done = done
+        self.statuses: Dict[str, int] = {}
+        channel.basic_consume(queue=queue, on_message_callback=self.on_status, auto_ack=True)
+
+    def on_status(self, channel: Channel, method: Any, props: BasicProperties, body: bytes) -> None:
+        """Register status message."""
+        del channel, method, props
+        phase_code = json.loads(body)["phaseCode"]
+        self.statuses[phase_code] = self.statuses.get(phase_code, 0) + 1
+
+        if sum(self.statuses.values()) - self.statuses.get("GENERATION_LAUNCHED", 0) >= self.expected:
+            self.done()
@@ -0,0 +1,165 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Micro-benchmarks of per-message hot paths: formatter, codecs, config lookups and template file structure."""
+from typing import (
+    Any,
+    Dict,
+    Tuple,
+)
+import itertools
+import time
+
+import pytest
+
+from benchmarks.fixtures import (
+    ARCHIVE_NAME,
+    CONFIG_FILE,
+    LocalDownloader,
+    make_source_message,
+    make_template_archive,
+)
+from service import file_structures
+from service.config import Config
+from service.decoders import (
+    JsonDecoder,
+    MsgPackDecoder,
+)
+from service.decompressors import DECOMPRESSORS
+from service.encoders import (
+    JsonEncoder,
+    MsgPackEncoder,
+)
+from service.file_structures import BundleGenFileStructure
+from service.formatter import BundleGenFormatter
+
+
+# (number of files, size of file in bytes)
+ARCHIVES = {
+    "10x1KiB": (10, 1024),
+    "100x4KiB": (100, 4096),
+    "1000x1KiB": (1000, 1024),
+}
+CODECS = {
+    "json": (JsonEncoder, JsonDecoder),
+    "msgpack": (MsgPackEncoder, MsgPackDecoder),
+}
+
+
+@pytest.fixture(name="config")
+def fixture_config() -> Config:
+    """Return development config."""
+    return Config(CONFIG_FILE)
+
+
+@pytest.mark.parametrize("encrypt", [False, True])
+def test_formatter(benchmark: Any, config: Config, encrypt: bool) -> None:
+    """Format source message into BundleGen ticket."""
+    formatter = BundleGenFormatter(config)
+    msg = make_source_message(0, encrypt)
+
+    benchmark(formatter.format, msg)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_encode(benchmark: Any, config: Config, codec: str) -> None:
+    """Encode BundleGen ticket."""
+    ticket = BundleGenFormatter(config).format(make_source_message(0))
+
+    benchmark(CODECS[codec][0].encode, ticket)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_decode(benchmark: Any, config: Config, codec: str) -> None:
+    """Decode BundleGen ticket."""
+    encoder, decoder = CODECS[codec]
+    body = encoder.encode(BundleGenFormatter(config).format(make_source_message(0)))
+
+    benchmark(decoder.decode, body)
+
+
+@pytest.mark.parametrize("key", ["concurency", "worker.in_queue", "message"])
+def test_config_get(benchmark: Any, config: Config, key: str) -> None:
+    """Look up cached config value."""
+    benchmark(config.get, key)
+
+
+@pytest.mark.parametrize("key", ["concurency", "worker.in_queue", "message"])
+def test_config_get_uncached(benchmark: Any, config: Config, key: str) -> None:
+    """Look up config value bypassing `lru_cache`."""
+    benchmark(Config.get.__wrapped__, config, key)  # pylint: disable=E1101
+
+
+@pytest.mark.parametrize("archive", ARCHIVES)
+def test_file_structure(benchmark: Any, config: Config, tmp_path: Any, archive: str) -> None:
+    """Create template directory, copy template archive to it and unpack."""
+    source = tmp_path / "s3"
+    source.mkdir()
+    files, size = ARCHIVES[archive]
+    make_template_archive(str(source / ARCHIVE_NAME), files, size)
+    file_structure = BundleGenFileStructure(config, LocalDownloader(str(source)))
+    paths = (str(tmp_path / str(index)) for index in itertools.count())
+
+    def setup() -> Tuple[Tuple[str, str], Dict[str, Any]]:
+        return (next(paths), ARCHIVE_NAME), {}
+
+    benchmark.pedantic(file_structure.create_structure_for, setup=setup, rounds=20)
+
+
+@pytest.mark.parametrize("decompressor", ["pigz", "stdlib"])
+def test_unpack(benchmark: Any, config: Config, tmp_path: Any, decompressor: str) -> None:
+    """Unpack gzip template archive with 1000 files using `decompressor`."""
+    if not DECOMPRESSORS[decompressor]().available():
+        pytest.skip(f"{decompressor} is not available")
+    make_template_archive(str(tmp_path / ARCHIVE_NAME), *ARCHIVES["1000x1KiB"])
+    config.config.setdefault("unpack", {})["decompressors"] = [decompressor]
+    file_structure = BundleGenFileStructure(config, LocalDownloader(str(tmp_path)))
+    paths = (tmp_path / str(index) for index in itertools.count())
+
+    def setup() -> Tuple[Tuple[str, str], Dict[str, Any]]:
+        path = next(paths)
+        path.mkdir()
+        (path / ARCHIVE_NAME).symlink_to(tmp_path / ARCHIVE_NAME)
+        return (str(path), ARCHIVE_NAME), {}
+
+    benchmark.pedantic(file_structure.unpack_template_archive, setup=setup, rounds=20)
+
+
+@pytest.mark.parametrize("threads", [1, 8])
+def test_unpack_latency(benchmark: Any, config: Config, tmp_path: Any, monkeypatch: Any, threads: int) -> None:
+    """Unpack archive with 100 files to filesystem adding 1 ms to every file write, as NFS round-trips do."""
+    write_file = file_structures.write_file
+
+    def slow_write_file(*args: Any) -> None:
+        time.sleep(0.001)
+        write_file(*args)
+
+    monkeypatch.setattr(file_structures, "write_file", slow_write_file)
+    make_template_archive(str(tmp_path / ARCHIVE_NAME), *ARCHIVES["100x4KiB"])
+    config.config.setdefault("unpack", {}).update(decompressors=["stdlib"], threads=threads)
+    file_structure = BundleGenFileStructure(config, LocalDownloader(str(tmp_path)))
+    paths = (tmp_path / str(index) for index in itertools.count())
+
+    def setup() -> Tuple[Tuple[str, str], Dict[str, Any]]:
+        path = next(paths)
+        path.mkdir()
+        (path / ARCHIVE_NAME).symlink_to(tmp_path / ARCHIVE_NAME)
+        return (str(path), ARCHIVE_NAME), {}
+
+    benchmark.pedantic(file_structure.unpack_template_archive, setup=setup, rounds=10)
@@ -0,0 +1,76 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Import time of service entry points, measured with `python -X importtime` in a fresh interpreter.
+
+Every entry point has a budget of cumulative import time and a set of heavy dependencies it must not execute
+on import, scaled by `IMPORT_BUDGET_FACTOR` environment variable for slow machines.
+"""
+from typing import (
+    Any,
+    FrozenSet,
+    List,
+    Tuple,
+)
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+HEAVY = frozenset({"boto3", "botocore.client", "flask", "msgpack", "pika", "prometheus_client"})
+SCRIPT = "import sys, {module}; print(sorted(n for n in {heavy} if type(sys.modules.get(n)).__name__ == 'module'))"
+
+# module: (budget in milliseconds, heavy modules allowed to be executed on import)
+BUDGETS = {
+    "service.app": (300, frozenset({"flask", "prometheus_client"})),
+    "service.worker": (250, frozenset({"pika", "prometheus_client"})),
+    "service.config": (50, frozenset()),
+    "service.heartbeat": (50, frozenset()),
+}
+
+
+def import_module(module: str) -> Tuple[float, List[str]]:
+    """Import `module` in new interpreter, return its cumulative import time in ms and executed heavy modules."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT.format(module=module, heavy=sorted(HEAVY))],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    line = next(line for line in result.stderr.splitlines() if line.split("|")[-1].strip() == module)
+    return int(line.split("|")[1]) / 1000, json.loads(result.stdout.replace("'", '"'))
+
+
+@pytest.mark.parametrize("module", BUDGETS)
+def test_import_time(benchmark: Any, module: str) -> None:
+    """Import entry point within its budget, without heavy dependencies it does not need."""
+    budget = BUDGETS[module][0] * float(os.environ.get("IMPORT_BUDGET_FACTOR", 1))
+    allowed = BUDGETS[module][1]
+    samples: List[Tuple[float, List[str]]] = []
+
+    benchmark.pedantic(lambda: samples.append(import_module(module)), rounds=5)
+
+    import_ms = min(milliseconds for milliseconds, _ in samples)
+    executed: FrozenSet[str] = frozenset(samples[-1][1])
+    benchmark.extra_info["import_ms"] = import_ms
+    assert executed <= allowed, f"{module} imports {sorted(executed - allowed)}"
+    assert import_ms <= budget, f"{module} imports in {import_ms:.1f} ms, budget is {budget:.0f} ms"
@@ -0,0 +1,122 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Throughput of `Worker` with `BundleGenHandler` through in-memory broker, from ABS request to completed status."""
+from typing import (
+    Any,
+    Dict,
+    Tuple,
+)
+
+import pytest
+
+from benchmarks.broker import (
+    Broker,
+    Channel,
+)
+from benchmarks.fixtures import (
+    ARCHIVE_NAME,
+    CONFIG_FILE,
+    FakeBundleGen,
+    LocalDownloader,
+    make_template_archive,
+    publish_requests,
+    StatusCounter,
+)
+from service.config import Config
+from service.file_structures import BundleGenFileStructure
+from service.formatter import BundleGenFormatter
+from service.handlers import BundleGenHandler
+from service.heartbeat import (
+    create_slots,
+    HeartbeatSlot,
+)
+from service.worker import Worker
+
+
+MESSAGES = 100
+LATENCIES = {"none": 0.0, "1ms": 0.001}
+# `batch` config section, requests of the benchmark share one template archive
+BATCHES = {"single": None, "batch10": {"max_size": 10, "window": 0.01}}
+
+
+class InMemoryWorker(Worker):
+    """Worker connected to in-memory broker."""
+
+    broker: Broker
+
+    def initialize_channel(self) -> Channel:  # type: ignore[override]
+        """Open channel to in-memory broker."""
+        return self.broker.connection().channel()
+
+    def started(self) -> None:
+        """Occupy heartbeat slot, signal handlers of pytest process are left alone."""
+        self.heartbeat.start()
+
+
+@pytest.fixture(name="environment")
+def fixture_environment(tmp_path: Any, monkeypatch: Any) -> Dict[str, Any]:
+    """Prepare directories, template archive and config."""
+    for env in ("BUNDLE_STORE_DIR", "NGINX_STORE_DIR"):
+        monkeypatch.setenv(env, str(tmp_path / env.lower()))
+    monkeypatch.setenv("HEARTBEAT_FILE", str(tmp_path / "heartbeat"))
+
+    config = Config(CONFIG_FILE)
+    source = tmp_path / "s3"
+    source.mkdir()
+    make_template_archive(str(source / ARCHIVE_NAME))
+    create_slots(1)
+
+    return {"config": config, "source": str(source)}
+
+
+def make_pipeline(environment: Dict[str, Any], latency: float) -> Tuple[Tuple[InMemoryWorker], Dict[str, Any]]:
+    """Create broker, worker and its peers with `MESSAGES` requests waiting in input queue."""
+    config = environment["config"]
+    broker = Broker(lambda: latency)
+    file_structure = BundleGenFileStructure(config, LocalDownloader(environment["source"]))
+    handler = BundleGenHandler(config, BundleGenFormatter(config), file_structure)
+    worker = InMemoryWorker(config, handler, HeartbeatSlot(0))
+    worker.broker = broker
+
+    channel = broker.connection().channel()
+    FakeBundleGen(channel, config.get("worker.out_queue"))
+    StatusCounter(channel, config.get("worker.status_queue"), MESSAGES, broker.shutdown)
+    channel.queue_declare(config.get("worker.in_queue"))
+
+    publish_requests(channel, config.get("worker.in_queue"), MESSAGES)
+
+    return (worker,), {}
+
+
+@pytest.mark.parametrize("batch", BATCHES)
+@pytest.mark.parametrize("latency", LATENCIES)
+def test_throughput(benchmark: Any, environment: Dict[str, Any], latency: str, batch: str) -> None:
+    """Measure messages per second through `h_request`/`h_batch`/`h_response`."""
+    if BATCHES[batch] is not None:
+        environment["config"].config["batch"] = BATCHES[batch]
+
+    benchmark.pedantic(
+        InMemoryWorker.run,
+        setup=lambda: make_pipeline(environment, LATENCIES[latency]),
+        rounds=5,
+    )
+    # stats are not collected with `--benchmark-disable`
+    if benchmark.stats is not None:
+        benchmark.extra_info["messages_per_second"] = MESSAGES / benchmark.stats.stats.mean
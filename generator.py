@@ -17,40 +17,349 @@
 # limitations under the License.
 #
 
-"""Generate input message for RabbitMQ's `bundlegen-service-requests` queue"""
+"""Load generator and throughput benchmark for Bundle Generator Service.
+
+Publishes requests to `bundlegen-service-requests` queue with configurable rate, concurrency and message mix,
+optionally plays BundleGen role (replies on `reply_to` after random latency) and reports throughput and
+end-to-end latency percentiles collected from `bundlegen-service-status` queue.
+
+Typical run against a local environment with fake BundleGen:
+
+    python generator.py --rate 20 --concurrency 4 --duration 300 --fake-bundlegen --latency lognormal:2,0.5
+
+Status messages are consumed by the tool, so do not run it against an environment where ABS listens to them.
+"""
+from argparse import (
+    ArgumentParser,
+    Namespace,
+)
+from collections import deque
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 import json
+import math
+import os
+import random
+import threading
 import time
 import uuid
 
 from pika.adapters.blocking_connection import BlockingChannel
+import msgpack
 import pika
 
 
-channel: BlockingChannel = pika.BlockingConnection(
-    pika.ConnectionParameters("<rabbitmq.ip.address>"),
-).channel()
+def parse_distribution(value: str) -> Tuple[List[str], List[float]]:
+    """Parse `name=weight,name=weight` string to choices and weights."""
+    choices, weights = [], []
+
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        choices.append(name)
+        weights.append(float(weight or 1))
+
+    return choices, weights
+
+
+def parse_latency(value: str) -> Callable[[], float]:
+    """Parse `fixed:x`, `uniform:a,b`, `normal:mu,sigma`, `lognormal:median,sigma` or `exp:mean` latency."""
+    kind, _, params = value.partition(":")
+    args = [float(param) for param in params.split(",") if param]
+    samplers: Dict[str, Callable[[], float]] = {
+        "fixed": lambda: args[0],
+        "uniform": lambda: random.uniform(args[0], args[1]),
+        "normal": lambda: max(0.0, random.gauss(args[0], args[1])),
+        "lognormal": lambda: random.lognormvariate(math.log(args[0]), args[1]),
+        "exp": lambda: random.expovariate(1 / args[0]),
+    }
+    return samplers[kind]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return nearest-rank percentile of `values`."""
+    if not values:
+        return float("nan")
+
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def connect(args: Namespace) -> BlockingChannel:
+    """Open new connection to RabbitMQ and return its channel."""
+    return pika.BlockingConnection(pika.ConnectionParameters(host=args.host, port=args.port)).channel()
+
+
+class Stats:
+    """Thread-safe collector of sent requests and received statuses."""
+
+    def __init__(self) -> None:
+        """Initialize empty statistics."""
+        self.lock = threading.Lock()
+        self.sent: Dict[str, float] = {}
+        self.duplicates = 0
+        self.launched: List[float] = []
+        self.completed: List[float] = []
+        self.errors: List[float] = []
+        self.seen: Dict[str, Set[str]] = {
+            "GENERATION_LAUNCHED": set(),
+            "GENERATION_COMPLETED": set(),
+            "BUNDLE_ERROR": set(),
+        }
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    def on_sent(self, message_id: str, duplicate: bool) -> None:
+        """Register published request."""
+        with self.lock:
+            if duplicate:
+                self.duplicates += 1
+            else:
+                self.sent[message_id] = time.monotonic()
+
+    def on_status(self, message_id: str, phase_code: str) -> None:
+        """Register status message of request."""
+        with self.lock:
+            sent_at = self.sent.get(message_id)
+
+            # statuses of duplicated requests and requests from other clients are ignored
+            if sent_at is None or phase_code not in self.seen or message_id in self.seen[phase_code]:
+                return
+
+            self.seen[phase_code].add(message_id)
+            latencies = {
+                "GENERATION_LAUNCHED": self.launched,
+                "GENERATION_COMPLETED": self.completed,
+                "BUNDLE_ERROR": self.errors,
+            }
+            latencies[phase_code].append(time.monotonic() - sent_at)
+
+    @property
+    def pending(self) -> int:
+        """Return number of requests without final status."""
+        with self.lock:
+            return len(self.sent) - len(self.seen["GENERATION_COMPLETED"] | self.seen["BUNDLE_ERROR"])
+
+    def report(self) -> Dict[str, Any]:
+        """Return throughput and latency percentiles."""
+        with self.lock:
+            elapsed = (self.finished or time.monotonic()) - self.started
+            report: Dict[str, Any] = {
+                "elapsed_seconds": round(elapsed, 3),
+                "sent": len(self.sent),
+                "duplicates": self.duplicates,
+                "launched": len(self.launched),
+                "completed": len(self.completed),
+                "errors": len(self.errors),
+                "throughput_per_second": round((len(self.completed) + len(self.errors)) / elapsed, 3),
+            }
+
+            for name, values in (("launch", self.launched), ("end_to_end", self.completed)):
+                for pct in (50, 95, 99):
+                    report[f"{name}_p{pct}_seconds"] = round(percentile(values, pct), 3)
+
+            return report
+
+
+class Publisher(threading.Thread):
+    """Publish requests with the given rate over own connection."""
+
+    def __init__(self, args: Namespace, stats: Stats, stop: threading.Event) -> None:
+        """Initialize publisher thread."""
+        super().__init__(daemon=True)
+        self.args = args
+        self.stats = stats
+        self.stop = stop
+        self.interval = args.concurrency / args.rate
+        # pool of sent requests to resend as duplicates, bounded for long runs
+        self.history: Deque[Tuple[str, bytes]] = deque(maxlen=args.duplicate_pool)
+        self.distributions = {
+            "platformName": parse_distribution(args.platforms),
+            "firmwareVersion": parse_distribution(args.firmwares),
+            "appId": parse_distribution(args.apps),
+        }
+
+    def make_message(self) -> Tuple[str, bytes, bool]:
+        """Return new or duplicated request."""
+        if self.history and random.random() < self.args.duplicate_ratio:
+            return (*random.choice(self.history), True)
+
+        message_id = str(uuid.uuid4())
+        message: Dict[str, Any] = {
+            key: random.choices(choices, weights)[0] for key, (choices, weights) in self.distributions.items()
+        }
+        message.update(
+            ociImageUrl=f"docker://{self.args.registry}/{message['appId']}",
+            appVersion=message_id,
+            encrypt=random.random() < self.args.encrypt_ratio,
+        )
+        body = json.dumps(message).encode("utf8")
+        self.history.append((message_id, body))
+        return message_id, body, False
+
+    def run(self) -> None:
+        """Publish requests until stop event is set."""
+        channel = connect(self.args)
+        next_at = time.monotonic()
+
+        while not self.stop.is_set():
+            message_id, body, duplicate = self.make_message()
+            channel.basic_publish(
+                exchange="",
+                routing_key=self.args.in_queue,
+                body=body,
+                properties=pika.BasicProperties(delivery_mode=2, headers={"x-request-id": message_id}),
+            )
+            self.stats.on_sent(message_id, duplicate)
 
-while True:
-    message_id = str(uuid.uuid4())
-    print(f"SEND MESSAGE\t[{message_id}]")
+            next_at += self.interval
+            self.stop.wait(max(0.0, next_at - time.monotonic()))
 
-    channel.basic_publish(
-        exchange="",
-        routing_key="bundlegen-service-requests",
-        body=json.dumps(
+        channel.connection.close()
+
+
+class StatusCollector(threading.Thread):
+    """Consume status messages and register them in statistics."""
+
+    def __init__(self, args: Namespace, stats: Stats, stop: threading.Event) -> None:
+        """Initialize collector thread."""
+        super().__init__(daemon=True)
+        self.args = args
+        self.stats = stats
+        self.stop = stop
+
+    def on_status(self, channel: BlockingChannel, method: Any, _: Any, body: bytes) -> None:
+        """Register status message."""
+        msg = json.loads(body)
+        self.stats.on_status(msg["id"], msg["phaseCode"])
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def run(self) -> None:
+        """Consume status queue until stop event is set."""
+        channel = connect(self.args)
+        channel.queue_declare(queue=self.args.status_queue, durable=True)
+        channel.basic_consume(queue=self.args.status_queue, on_message_callback=self.on_status)
+
+        while not self.stop.is_set():
+            channel.connection.process_data_events(time_limit=0.5)
+
+        channel.connection.close()
+
+
+class FakeBundleGen(threading.Thread):
+    """Play BundleGen role, reply on `reply_to` after random latency."""
+
+    def __init__(self, args: Namespace, stop: threading.Event) -> None:
+        """Initialize responder thread."""
+        super().__init__(daemon=True)
+        self.args = args
+        self.stop = stop
+        self.latency = parse_latency(args.latency)
+
+    def on_request(self, channel: BlockingChannel, method: Any, props: pika.BasicProperties, body: bytes) -> None:
+        """Schedule reply for BundleGen ticket."""
+        ticket = msgpack.unpackb(body)
+        reply = msgpack.packb(
             {
-                "platformName": "eos2008c-debug",
-                "firmwareVersion": "502.54.1",
-                "ociImageUrl": "docker://docker.registry.url/dac/doom",
-                "appId": "com.dns.app.awesome",
-                "appVersion": message_id,
-                "encrypt": False,
+                "uuid": ticket["uuid"],
+                "success": random.random() >= self.args.failure_ratio,
+                "bundle_path": f"{ticket.get('outputdir', '')}/{ticket.get('output_filename', '')}.tar.gz",
             }
-        ),
-        properties=pika.BasicProperties(
-            delivery_mode=2,
-            headers={"x-request-id": message_id},
-        ),
-    )
-
-    time.sleep(15)
+        )
+
+        def respond() -> None:
+            channel.basic_publish(exchange="", routing_key=props.reply_to, body=reply)
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+
+        channel.connection.call_later(self.latency(), respond)
+
+    def run(self) -> None:
+        """Consume BundleGen queue until stop event is set."""
+        channel = connect(self.args)
+        channel.queue_declare(queue=self.args.out_queue, durable=True)
+        channel.basic_qos(prefetch_count=self.args.bundlegen_prefetch)
+        channel.basic_consume(queue=self.args.out_queue, on_message_callback=self.on_request)
+
+        while not self.stop.is_set():
+            channel.connection.process_data_events(time_limit=0.5)
+
+        channel.connection.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> Namespace:
+    """Parse command line arguments."""
+    parser = ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--host", default=os.environ.get("RABBITMQ_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("RABBITMQ_PORT", 5672)))
+    parser.add_argument("--in-queue", default="bundlegen-service-requests")
+    parser.add_argument("--out-queue", default="bundlegen-requests")
+    parser.add_argument("--status-queue", default="bundlegen-service-status")
+    parser.add_argument("--rate", type=float, default=1.0, help="total requests per second")
+    parser.add_argument("--concurrency", type=int, default=1, help="number of publishing connections")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of publishing")
+    parser.add_argument("--drain", type=float, default=60.0, help="seconds to wait for outstanding statuses")
+    parser.add_argument("--platforms", default="eos2008c-debug", help="weighted mix, e.g. `a=3,b=1`")
+    parser.add_argument("--firmwares", default="502.54.1", help="weighted mix, e.g. `502.54.1=3,502.55.0=1`")
+    parser.add_argument("--apps", default="com.dns.app.awesome", help="weighted mix of application ids")
+    parser.add_argument("--registry", default="docker.registry.url/dac")
+    parser.add_argument("--encrypt-ratio", type=float, default=0.0)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="ratio of resent requests")
+    parser.add_argument("--duplicate-pool", type=int, default=1000, help="number of last requests to resend from")
+    parser.add_argument("--fake-bundlegen", action="store_true", help="reply to BundleGen tickets")
+    parser.add_argument("--latency", default="fixed:1", help="fake BundleGen latency distribution")
+    parser.add_argument("--failure-ratio", type=float, default=0.0, help="ratio of failed fake generations")
+    parser.add_argument("--bundlegen-prefetch", type=int, default=100)
+    parser.add_argument("--report", help="write JSON report to file")
+    return parser.parse_args(argv)
+
+
+def drain(stats: Stats, seconds: float) -> None:
+    """Wait until all requests get final status, but not longer than `seconds`."""
+    drain_until = time.monotonic() + seconds
+
+    while stats.pending and time.monotonic() < drain_until:
+        print(f"WAITING FOR {stats.pending} STATUSES")
+        time.sleep(1)
+
+    stats.finished = time.monotonic()
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run load test and print report."""
+    args = parse_args(argv)
+    stats = Stats()
+    stop_publishing, stop_consuming = threading.Event(), threading.Event()
+    threads: List[threading.Thread] = [StatusCollector(args, stats, stop_consuming)]
+
+    if args.fake_bundlegen:
+        threads.append(FakeBundleGen(args, stop_consuming))
+
+    threads.extend(Publisher(args, stats, stop_publishing) for _ in range(args.concurrency))
+
+    for thread in threads:
+        thread.start()
+
+    stop_publishing.wait(args.duration)
+    stop_publishing.set()
+    drain(stats, args.drain)
+    stop_consuming.set()
+
+    report = stats.report()
+    print(json.dumps(report, indent=4))
+
+    if args.report:
+        with open(args.report, "w", encoding="utf8") as out_file:
+            json.dump(report, out_file, indent=4)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
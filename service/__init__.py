@@ -18,9 +18,3 @@
 #
 
 """Bundle Generator Service is a tiny layer between Appstore Bundle Service and BundleGen."""
-import logging.config
-
-from service.logging_config import LOGGING_CONFIG
-
-
-logging.config.dictConfig(LOGGING_CONFIG)
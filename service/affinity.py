@@ -0,0 +1,97 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Template affinity: route requests for the same template archive to the same pod, so its template cache stays warm.
+
+Requests are moved from `worker.in_queue` to one of `affinity.shards` shard queues by hash of their template archive
+name. Every worker consumes all shard queues with consumer priority ranked by rendezvous hashing of its pod and the
+shard. RabbitMQ delivers messages of a shard to the highest ranked pod that has free prefetch, the next ranked pods
+take over its shards when it is busy or gone, without moving any message.
+"""
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TYPE_CHECKING,
+)
+import socket
+import zlib
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pika import BasicProperties
+    from pika.adapters.blocking_connection import BlockingChannel
+
+    from service.config import Config
+
+
+def stable_hash(value: str) -> int:
+    """Return hash of `value` equal in all processes and pods, unlike built-in `hash()`."""
+    return zlib.crc32(value.encode())
+
+
+class Affinity:
+    """Shard queues of `worker.in_queue`, disabled if `affinity.shards` is 0."""
+
+    def __init__(self, config: "Config", pod: Optional[str] = None) -> None:
+        """Read number of shards from config, pod is identified by host name unless given."""
+        self.queue: str = config.get("worker.in_queue")
+        self.shards: int = config.get("affinity.shards", 0)
+        self.pod = pod or socket.gethostname()
+
+    @property
+    def enabled(self) -> bool:
+        """Check whether requests are routed to shard queues."""
+        return bool(self.shards)
+
+    @property
+    def queues(self) -> List[str]:
+        """Names of shard queues."""
+        return [f"{self.queue}.shard.{shard}" for shard in range(self.shards)]
+
+    def priority(self, shard: int) -> int:
+        """Return consumer priority of this pod for `shard`, pods rank every shard differently."""
+        return stable_hash(f"{self.pod}/{shard}") & 0x7FFF
+
+    def declare(self, channel: "BlockingChannel", arguments: Optional[Dict[str, Any]]) -> None:
+        """Create shard queues with the same `arguments` as input queue."""
+        for queue in self.queues:
+            channel.queue_declare(queue=queue, durable=True, arguments=arguments)  # type: ignore[arg-type]
+
+    def subscribe(self, channel: "BlockingChannel", on_message: Callable[..., None]) -> List[str]:
+        """Start consuming from all shard queues with priorities of this pod, return consumer tags."""
+        return [
+            channel.basic_consume(
+                queue=queue,
+                on_message_callback=on_message,
+                arguments={"x-priority": self.priority(shard)},
+            )
+            for shard, queue in enumerate(self.queues)
+        ]
+
+    def route(self, channel: "BlockingChannel", key: str, props: "BasicProperties", body: bytes) -> None:
+        """Publish message to shard queue of `key` as it is."""
+        channel.basic_publish(
+            exchange="",
+            routing_key=self.queues[stable_hash(key) % self.shards],
+            body=body,
+            properties=props,
+        )
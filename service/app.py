@@ -19,13 +19,34 @@
 
 """Flask app for monitoring purpose."""
 
-from typing import Dict
+from typing import (
+    Any,
+    Dict,
+    Tuple,
+)
+import os
 
-from flask import Flask
+from flask import (
+    Flask,
+    request,
+    Response,
+)
 
+from service.heartbeat import (
+    get_workers_state,
+    is_live,
+    is_ready,
+)
 from service.info import Info
+from service.logging_config import configure_logging
+from service.metrics import export
+from service.profiling import (
+    request_profile,
+    SIGNALS,
+)
 
 
+configure_logging()
 app = Flask(__name__)
 app_info = Info()
 
@@ -36,9 +57,48 @@ def healthz() -> str:
     return "OK"
 
 
+@app.route("/readyz")
+def readyz() -> Tuple[Dict[str, Any], int]:
+    """Readiness probe, fails if no worker is connected to RabbitMQ."""
+    workers = get_workers_state()
+    ready = is_ready(workers)
+    return {"ready": ready, "workers": workers}, 200 if ready else 503
+
+
+@app.route("/livez")
+def livez() -> Tuple[Dict[str, Any], int]:
+    """Liveness probe, fails if any worker died or its consume loop stalled."""
+    workers = get_workers_state()
+    live = is_live(workers)
+    return {"live": live, "workers": workers}, 200 if live else 503
+
+
 @app.route("/info")
 def info() -> Dict[str, str]:
     """Info endpoint."""
     appinfo: Dict[str, str] = {}
     appinfo = app_info.get()
     return appinfo
+
+
+@app.route("/metrics")
+def metrics() -> Response:
+    """Prometheus metrics endpoint."""
+    data, content_type = export()
+    return Response(data, content_type=content_type)
+
+
+@app.route("/profile/<int:pid>", methods=["POST"])
+def profile(pid: int) -> Tuple[Dict[str, Any], int]:
+    """Start profiling of worker `pid`, `mode` query parameter is `sampling` (default) or `cprofile`."""
+    mode = request.args.get("mode", "sampling")
+
+    if not os.environ.get("PROFILING_DIR"):
+        return {"error": "Profiling is disabled"}, 404
+    if mode not in SIGNALS:
+        return {"error": f"Unknown profiling mode `{mode}`"}, 400
+    if not any(worker["pid"] == pid and worker["alive"] for worker in get_workers_state()):
+        return {"error": f"No alive worker with pid {pid}"}, 404
+
+    request_profile(pid, mode)
+    return {"pid": pid, "mode": mode, "directory": os.environ["PROFILING_DIR"]}, 202
@@ -0,0 +1,76 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Backpressure from BundleGen: pause consuming of input queue while BundleGen is behind."""
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from service.config import Config
+
+
+class Watermark:
+    """High/low watermark pair with hysteresis, disabled if `high` is 0."""
+
+    def __init__(self, high: int, low: int) -> None:
+        """Initialize watermark."""
+        self.high = high
+        self.low = low
+
+    def exceeded(self, value: int, paused: bool) -> bool:
+        """Check `value` against high watermark while running and against low watermark while paused."""
+        if not self.high:
+            return False
+
+        return value > self.low if paused else value >= self.high
+
+
+class Backpressure:
+    """Decide whether worker pauses consuming, based on `out_queue` depth, number of outstanding replies and disk."""
+
+    def __init__(self, config: "Config") -> None:
+        """Read watermarks from `backpressure` section of config."""
+        self.queue = Watermark(config.get("backpressure.queue_high", 0), config.get("backpressure.queue_low", 0))
+        self.outstanding = Watermark(
+            config.get("backpressure.outstanding_high", 0),
+            config.get("backpressure.outstanding_low", 0),
+        )
+        self.interval = float(config.get("backpressure.interval", 5))
+        self.queue_depth = 0
+        # store volumes reached `disk.hard` watermark
+        self.disk_full = False
+        self.paused = False
+
+    @property
+    def enabled(self) -> bool:
+        """Check whether any watermark is configured."""
+        return bool(self.queue.high or self.outstanding.high)
+
+    def update(self, outstanding: int) -> bool:
+        """Update paused state with current number of `outstanding` replies, return `True` if state changed."""
+        paused = any(
+            (
+                self.queue.exceeded(self.queue_depth, self.paused),
+                self.outstanding.exceeded(outstanding, self.paused),
+                self.disk_full,
+            ),
+        )
+        changed = paused != self.paused
+        self.paused = paused
+        return changed
@@ -0,0 +1,75 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Micro-batching of input messages, tickets sharing template archive get their template directory prepared once.
+
+Deliveries are collected on the connection thread for `batch.window` seconds after the first one arrives, or until
+`batch.max_size` are collected. With the default window of 0 the batch is flushed as soon as the consume loop has
+dispatched deliveries already read from the socket, so a lone request is never delayed.
+"""
+from typing import (
+    Any,
+    List,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pika import BasicProperties
+    from pika.spec import Basic
+
+    from service.config import Config
+
+
+Delivery = Tuple["Basic.Deliver", "BasicProperties", bytes]
+
+
+class Batch:
+    """Input messages waiting for batch window, disabled unless `batch.max_size` is at least 2."""
+
+    def __init__(self, config: "Config") -> None:
+        """Read batch size and window from config."""
+        self.max_size: int = config.get("batch.max_size", 0)
+        self.window = float(config.get("batch.window", 0))
+        self.deliveries: List[Delivery] = []
+        # timer id returned by `connection.call_later`, set while batch window is open
+        self.timer: Optional[Any] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Batching is configured."""
+        return self.max_size > 1
+
+    @property
+    def full(self) -> bool:
+        """Batch reached `batch.max_size` deliveries."""
+        return len(self.deliveries) >= self.max_size
+
+    def add(self, delivery: Delivery) -> bool:
+        """Collect delivery, return `True` if it opens batch window."""
+        self.deliveries.append(delivery)
+        return len(self.deliveries) == 1
+
+    def take(self) -> List[Delivery]:
+        """Return collected deliveries and start empty batch."""
+        deliveries, self.deliveries = self.deliveries, []
+        self.timer = None
+        return deliveries
@@ -18,7 +18,11 @@
 #
 
 """JSON Config module."""
-from functools import lru_cache
+from functools import (
+    lru_cache,
+    reduce,
+)
+from operator import getitem
 from typing import (
     Any,
     Dict,
@@ -27,6 +31,9 @@ import json
 import logging
 
 
+MISSING = object()
+
+
 class Config:
     """Load config parameters from JSON file."""
 
@@ -48,18 +55,16 @@ class Config:
         return self._config
 
     @lru_cache
-    def get(self, key: str) -> Any:
-        """Get value from config file by key/path. Throw exception if there is no key/path."""
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """Get value from config file by key/path. Throw exception if there is no key/path and no `default`."""
         self.logger.debug("Trying to get `%s` in `%s`", key, self.config)
 
-        if self.sep in key:
-            paths = key.split(self.sep)
-            result = self.config[paths.pop(0)]
-
-            for path in paths:
-                result = result[path]
-        else:
-            result = self.config[key]
+        try:
+            result = reduce(getitem, key.split(self.sep), self.config)
+        except KeyError:
+            if default is MISSING:
+                raise
+            result = default
 
         self.logger.debug("Got `%s` = `%s`", key, result)
         return result
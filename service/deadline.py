@@ -0,0 +1,82 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Deadlines of tickets: tickets ABS gave up on are dropped before any work is spent on them."""
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    TYPE_CHECKING,
+)
+import time
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pika import BasicProperties
+
+    from service.config import Config
+
+
+def milliseconds(value: Any) -> Optional[float]:
+    """Convert header value in milliseconds to seconds, `None` if it is missing or not a number."""
+    try:
+        return float(value) / 1000
+    except (TypeError, ValueError):
+        return None
+
+
+class Deadlines:
+    """Read deadline of input message and forward it to BundleGen.
+
+    Deadline is the earliest of `deadline.header` header (epoch milliseconds), `deadline.ttl_header` header
+    (milliseconds after AMQP `timestamp`) and `deadline.max_age` seconds after AMQP `timestamp`. Message without
+    any of them has no deadline. `deadline.max_age` is disabled while it is `0` (the default).
+    """
+
+    def __init__(self, config: "Config") -> None:
+        """Read header names and maximum age from config."""
+        self.header: str = config.get("deadline.header", "x-deadline")
+        self.ttl_header: str = config.get("deadline.ttl_header", "x-ttl")
+        self.max_age = float(config.get("deadline.max_age", 0))
+        self.field: str = config.get("deadline.field", "")
+
+    def deadline(self, props: "BasicProperties") -> Optional[float]:
+        """Return deadline of input message in epoch seconds."""
+        headers = props.headers or {}
+        candidates = [milliseconds(headers.get(self.header))]
+        if props.timestamp is not None:
+            ttl = milliseconds(headers.get(self.ttl_header))
+            candidates.append(None if ttl is None else props.timestamp + ttl)
+            candidates.append(props.timestamp + self.max_age if self.max_age else None)
+
+        return min((candidate for candidate in candidates if candidate is not None), default=None)
+
+    @staticmethod
+    def expired(deadline: Optional[float]) -> bool:
+        """Check whether `deadline` has passed."""
+        return deadline is not None and deadline <= time.time()
+
+    def headers(self, deadline: Optional[float]) -> Dict[str, int]:
+        """Return headers of BundleGen ticket with `deadline`, so BundleGen can drop it too."""
+        return {} if deadline is None else {self.header: int(deadline * 1000)}
+
+    def stamp(self, msg: Dict[str, Any], deadline: Optional[float]) -> None:
+        """Add milliseconds remaining until `deadline` to `deadline.field` of BundleGen ticket, if it is configured."""
+        if self.field and deadline is not None:
+            msg[self.field] = max(int((deadline - time.time()) * 1000), 0)
@@ -25,7 +25,10 @@ from abc import (
 from json import loads
 from typing import Any
 
-from msgpack import unpackb
+from service.utils import lazy_import
+
+
+msgpack = lazy_import("msgpack")
 
 
 class Decoder(ABC):
@@ -52,4 +55,4 @@ class MsgPackDecoder(Decoder):
     @staticmethod
     def decode(msg: bytes) -> Any:
         """Return `msg` string in MsgPack format as dict."""
-        return unpackb(msg)
+        return msgpack.unpackb(msg)
@@ -0,0 +1,179 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Module defines base `Decompressor` class and all specific childs.
+
+Decompressors turn template archive into uncompressed tar stream. External processes and native libraries
+decompress on another core while tar members are extracted, stdlib is the fallback.
+"""
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from contextlib import contextmanager
+from functools import partial
+from importlib import import_module
+from importlib.util import find_spec
+from typing import (
+    BinaryIO,
+    Callable,
+    cast,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+import shutil
+# only fixed decompression commands are run, never through shell
+import subprocess  # nosec B404
+import tempfile
+
+
+# magic numbers of compressed archives, anything else is read as uncompressed tar
+FORMATS = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"BZh", "bzip2"),
+    (b"\xfd7zXZ\x00", "xz"),
+)
+
+
+def detect_format(filename: str) -> str:
+    """Return compression format of `filename` by its magic number, `tar` for uncompressed archive."""
+    with open(filename, "rb") as archive:
+        head = archive.read(6)
+
+    return next((name for magic, name in FORMATS if head.startswith(magic)), "tar")
+
+
+class Decompressor(ABC):
+    """Base class for decompressors of template archives."""
+
+    name = ""
+    formats: Tuple[str, ...] = ()
+
+    @abstractmethod
+    def available(self) -> bool:
+        """Return whether decompressor can be used in current environment."""
+
+    @abstractmethod
+    def stream(self, filename: str) -> ContextManager[BinaryIO]:
+        """Return uncompressed tar stream of `filename`."""
+
+
+class ProcessDecompressor(Decompressor):
+    """Decompress in external process like `pigz` or `zstd`, its output is read through pipe."""
+
+    def __init__(self, formats: Tuple[str, ...], command: Sequence[str]) -> None:
+        """Initialize decompressor with supported formats and command writing decompressed file to stdout."""
+        self.name = command[0]
+        self.formats = formats
+        self.command = tuple(command)
+        self._available: Optional[bool] = None
+
+    def available(self) -> bool:
+        """Return whether command is installed, `PATH` is searched once per decompressor."""
+        if self._available is None:
+            self._available = shutil.which(self.command[0]) is not None
+
+        return self._available
+
+    @contextmanager
+    def stream(self, filename: str) -> Iterator[BinaryIO]:
+        """Yield stdout of decompressing process, raise `shutil.ReadError` if process failed.
+
+        Stderr goes to temporary file, pipe would block chatty command while its stdout is being read.
+        """
+        # command is a fixed tuple from `DECOMPRESSORS` and filename is passed as argument without shell
+        with tempfile.TemporaryFile() as stderr, subprocess.Popen(  # nosec B603
+            [*self.command, filename], stdout=subprocess.PIPE, stderr=stderr
+        ) as process:
+            try:
+                yield cast(BinaryIO, process.stdout)
+            except BaseException:
+                process.kill()
+                raise
+            finally:
+                # reads rest of the stream, so process does not block on full pipe
+                process.communicate()
+
+            stderr.seek(0)
+            error = stderr.read().decode(errors="replace").strip()
+
+        if process.returncode:
+            raise shutil.ReadError(f"`{self.name}` failed to decompress `{filename}`: {error}")
+
+
+class ZstandardDecompressor(Decompressor):
+    """Decompress zstd archive with optional `zstandard` library, which releases GIL while decompressing."""
+
+    name = "zstandard"
+    formats = ("zstd",)
+
+    def available(self) -> bool:
+        """Return whether `zstandard` is installed."""
+        return find_spec("zstandard") is not None
+
+    @contextmanager
+    def stream(self, filename: str) -> Iterator[BinaryIO]:
+        """Yield decompressing reader of `filename`."""
+        zstandard = import_module("zstandard")
+
+        with open(filename, "rb") as archive, zstandard.ZstdDecompressor().stream_reader(archive) as reader:
+            yield reader
+
+
+class StdlibDecompressor(Decompressor):
+    """Leave decompression to `tarfile`, on the same core as extraction."""
+
+    name = "stdlib"
+    formats = ("tar", "gzip", "bzip2", "xz")
+
+    def available(self) -> bool:
+        """Return `True`, stdlib is always available."""
+        return True
+
+    def stream(self, filename: str) -> ContextManager[BinaryIO]:
+        """Return `filename` opened as it is."""
+        return open(filename, "rb")  # pylint: disable=R1732
+
+
+DECOMPRESSORS: Dict[str, Callable[[], Decompressor]] = {
+    "pigz": partial(ProcessDecompressor, ("gzip",), ("pigz", "-dc")),
+    "zstd": partial(ProcessDecompressor, ("zstd",), ("zstd", "-dc")),
+    "zstandard": ZstandardDecompressor,
+    "stdlib": StdlibDecompressor,
+}
+
+
+def get_decompressors(keys: Sequence[str]) -> List[Decompressor]:
+    """Get decompressors by names in order of preference."""
+    return [DECOMPRESSORS[key]() for key in keys]
+
+
+def select_decompressor(decompressors: Sequence[Decompressor], archive_format: str) -> Decompressor:
+    """Return first available decompressor of `archive_format`, raise `shutil.ReadError` if there is none."""
+    for decompressor in decompressors:
+        if archive_format in decompressor.formats and decompressor.available():
+            return decompressor
+
+    raise shutil.ReadError(f"No decompressor available for {archive_format} archive")
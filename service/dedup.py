@@ -0,0 +1,117 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Deduplication of redelivered input messages.
+
+RabbitMQ redelivers input message of a worker that died after sending its ticket to BundleGen but before it
+acknowledged the message, usually to another worker. Request ids of launched tickets are remembered in a directory
+shared by all workers, so such redelivery is not launched again.
+"""
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+import hashlib
+import logging
+import os
+import threading
+import time
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from service.config import Config
+
+
+class RecentTickets:
+    """Request ids of tickets recently sent to BundleGen, disabled while `dedup.size` is `0`.
+
+    Ids are written as marker files to `dedup.dir` shared by workers and pods, so the worker receiving redelivery of
+    another worker's message finds them. Markers expire after `dedup.ttl` seconds. The last `dedup.size` ids recorded
+    by this worker are also kept in memory.
+    """
+
+    def __init__(self, config: "Config") -> None:
+        """Read size, directory and TTL from config, shared directory is required when deduplication is enabled."""
+        self.size: int = config.get("dedup.size", 0)
+        self.directory: str = config.get("dedup.dir", "")
+        if self.size > 0 and not self.directory:
+            raise ValueError("`dedup.dir` shared by all workers is required when `dedup.size` is set")
+        self.ttl = float(config.get("dedup.ttl", 3600))
+        self.recent: "OrderedDict[str, None]" = OrderedDict()
+        self.recorded = 0
+        # tickets are recorded from handler threads in threaded mode
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def enabled(self) -> bool:
+        """Deduplication is configured."""
+        return self.size > 0
+
+    def marker(self, request_id: str) -> str:
+        """Return path of marker file of `request_id`, ids are hashed as they may contain any characters."""
+        return os.path.join(self.directory, hashlib.sha256(request_id.encode()).hexdigest())
+
+    def seen(self, request_id: str) -> bool:
+        """Check whether ticket `request_id` was sent to BundleGen by any worker."""
+        if not self.enabled or not request_id:
+            return False
+
+        with self.lock:
+            if request_id in self.recent:
+                return True
+
+        return self.marked(request_id)
+
+    def marked(self, request_id: str) -> bool:
+        """Check whether marker file of `request_id` exists and is not expired."""
+        try:
+            return time.time() - os.stat(self.marker(request_id)).st_mtime < self.ttl
+        except FileNotFoundError:
+            return False
+
+    def record(self, request_id: str) -> None:
+        """Remember ticket `request_id` sent to BundleGen."""
+        if not self.enabled or not request_id:
+            return
+
+        with self.lock:
+            self.recent[request_id] = None
+            self.recent.move_to_end(request_id)
+            if len(self.recent) > self.size:
+                self.recent.popitem(last=False)
+            self.recorded += 1
+            prune = self.recorded % self.size == 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.marker(request_id), "w", encoding="utf8") as marker:
+            marker.write(request_id)
+        if prune:
+            self.prune()
+
+    def prune(self) -> None:
+        """Remove expired marker files, every worker prunes after recording `dedup.size` tickets."""
+        deadline = time.time() - self.ttl
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < deadline:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    # removed by another worker
+                    continue
+        self.logger.debug("Pruned expired markers in `%s`", self.directory)
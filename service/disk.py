@@ -0,0 +1,118 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Disk space admission control: stop preparing tickets before store volumes run out of space or inodes."""
+from typing import (
+    Callable,
+    List,
+    Optional,
+    TYPE_CHECKING,
+)
+import logging
+import os
+import threading
+import time
+
+from service.metrics import count_disk_admission
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pika.adapters.blocking_connection import BlockingChannel
+    from pika.spec import Basic
+
+    from service.config import Config
+
+
+def used_percent(path: str) -> int:
+    """Return used percentage of space or inodes of volume with `path`, whichever is higher."""
+    stat = os.statvfs(path)
+    space = 100 - 100 * stat.f_bavail // stat.f_blocks if stat.f_blocks else 0
+    # some filesystems do not limit inodes and report none
+    inodes = 100 - 100 * stat.f_favail // stat.f_files if stat.f_files else 0
+    return max(space, inodes)
+
+
+class DiskSpace:
+    """Usage of store volumes from `envs`, polled with `statvfs` at most every `disk.interval` seconds.
+
+    Above `disk.soft` percent of used space or inodes, reapers are started in background thread. Above `disk.hard`
+    percent, input messages are requeued instead of failing on full volume and the worker pauses consuming.
+    Disabled while both watermarks are `0` (the default).
+    """
+
+    def __init__(self, config: "Config") -> None:
+        """Read watermarks from `disk` section of config."""
+        self.soft: int = config.get("disk.soft", 0)
+        self.hard: int = config.get("disk.hard", 0)
+        self.interval = float(config.get("disk.interval", 5))
+        self.envs: List[str] = config.get("envs")
+        self.reapers: List[Callable[[], None]] = []
+        self.usage = 0
+        self.polled_at: Optional[float] = None
+        self.reaper: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def enabled(self) -> bool:
+        """Check whether any watermark is configured."""
+        return bool(self.soft or self.hard)
+
+    def poll(self) -> int:
+        """Return used percentage of the fullest store volume, volumes are polled once per `disk.interval`."""
+        now = time.monotonic()
+        if self.polled_at is None or now - self.polled_at >= self.interval:
+            self.polled_at = now
+            paths = [os.environ[env] for env in self.envs if os.environ.get(env)]
+            self.usage = max((used_percent(path) for path in paths), default=0)
+            if self.soft and self.usage >= self.soft:
+                self.reap()
+
+        return self.usage
+
+    def full(self) -> bool:
+        """Check whether usage reached hard watermark."""
+        return bool(self.hard) and self.poll() >= self.hard
+
+    def admit(self, channel: "BlockingChannel", method: "Basic.Deliver") -> bool:
+        """Requeue input message and return `False` if store volumes are full."""
+        if not self.full():
+            return True
+
+        self.logger.warning("Store volumes are %s%% full, requeueing input message", self.usage)
+        count_disk_admission("requeued")
+        channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+        return False
+
+    def reap(self) -> None:
+        """Run reapers in background thread, unless previous run has not finished yet."""
+        if self.reaper is not None and self.reaper.is_alive():
+            return
+
+        self.logger.warning("Store volumes are %s%% full, reaping", self.usage)
+        count_disk_admission("reaped")
+        self.reaper = threading.Thread(target=self.run_reapers, name="reaper", daemon=True)
+        self.reaper.start()
+
+    def run_reapers(self) -> None:
+        """Run every reaper, failure of one does not stop the others."""
+        for reaper in self.reapers:
+            try:
+                reaper()
+            except Exception:  # pylint: disable=W0703
+                self.logger.exception("Reaper %s failed", reaper)
@@ -22,16 +22,41 @@ from abc import (
     ABC,
     abstractmethod,
 )
-from typing import TYPE_CHECKING
+from typing import (
+    Any,
+    TYPE_CHECKING,
+)
 import os
+import threading
 
-from boto3 import client
+from service.retry import TransientError
+from service.utils import lazy_import
 
 
 if TYPE_CHECKING:  # pragma: no cover
+    from botocore.exceptions import ClientError
+
     from service.config import Config
 
 
+boto3 = lazy_import("boto3")
+botocore_exceptions = lazy_import("botocore.exceptions")
+
+
+THROTTLING_CODES = {"SlowDown", "Throttling", "ThrottlingException", "RequestTimeout"}
+
+
+def is_transient_client_error(exc: "ClientError") -> bool:
+    """Check whether S3 refused request because of server error or throttling."""
+    status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+    return status >= 500 or exc.response.get("Error", {}).get("Code") in THROTTLING_CODES
+
+
+def preload(config: "Config") -> None:
+    """Load boto3 service model into default session inherited by forked processes, client itself is dropped."""
+    boto3.client(config.get("storage.type"), region_name=os.environ.get("S3_REGION"))
+
+
 class Downloader(ABC):
     """Base class for downloader's hierarchy."""
 
@@ -44,17 +69,46 @@ class S3Downloader(Downloader):
     """Class for working with S3."""
 
     def __init__(self, config: "Config") -> None:
-        """Initialize boto3 client."""
+        """Initialize downloader, boto3 client is created on first use."""
         self.config = config
-        self.client = client(
-            config.get("storage.type"),
-            region_name=os.environ.get("S3_REGION"),
-        )
+        self._client: Any = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        """Create boto3 client, its connection pool must not be shared with forked processes.
+
+        Client is shared by handler threads in threaded mode, but creating it in the default session is not
+        thread-safe.
+        """
+        with self._client_lock:
+            if self._client is None:
+                self._client = boto3.client(
+                    self.config.get("storage.type"),
+                    region_name=os.environ.get("S3_REGION"),
+                )
+
+        return self._client
 
     def download(self, path: str, filename: str) -> None:
-        """Download `filename` from S3 storage to `path` directory."""
-        self.client.download_file(
-            os.environ.get("S3_BUCKET"),
-            filename,
-            os.path.join(path, filename),
-        )
+        """Download `filename` from S3 storage to `path` directory.
+
+        Raises `TransientError` if S3 is unreachable, overloaded or failing, errors like missing object are raised
+        as they are.
+        """
+        try:
+            self.client.download_file(
+                os.environ.get("S3_BUCKET"),
+                filename,
+                os.path.join(path, filename),
+            )
+        except botocore_exceptions.ClientError as exc:
+            if is_transient_client_error(exc):
+                raise TransientError(str(exc)) from exc
+            raise
+        except (
+            botocore_exceptions.ConnectionError,
+            botocore_exceptions.HTTPClientError,
+            boto3.exceptions.S3TransferFailedError,
+        ) as exc:
+            raise TransientError(str(exc)) from exc
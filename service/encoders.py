@@ -29,7 +29,10 @@ from typing import (
     Dict,
 )
 
-from msgpack import packb
+from service.utils import lazy_import
+
+
+msgpack = lazy_import("msgpack")
 
 
 class Encoder(ABC):
@@ -56,4 +59,5 @@ class MsgPackEncoder(Encoder):
     @staticmethod
     def encode(msg: Dict[str, AnyStr]) -> bytes:
         """Return MsgPack string of `msg`."""
-        return packb(msg)
+        encoded: bytes = msgpack.packb(msg)
+        return encoded
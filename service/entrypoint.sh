@@ -4,9 +4,13 @@ echo "Activating Poetry virtualenv"
 source $(poetry env info --path)/bin/activate
 echo "Activated"
 
+echo "Preparing Prometheus multiprocess directory"
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/bundlegen-service-metrics}
+rm -rf $PROMETHEUS_MULTIPROC_DIR && mkdir -p $PROMETHEUS_MULTIPROC_DIR
+
 echo "Starting Gunicorn with Flask application"
 PYTHONPATH=$(dirname `pwd`):$PYTHONPATH gunicorn --bind 0.0.0.0:8081 app:app --daemon
 echo "Gunicorn started"
 
 echo "Starting Worker"
-PYTHONPATH=$(dirname `pwd`):$PYTHONPATH python3 ./worker.py
+PYTHONPATH=$(dirname `pwd`):$PYTHONPATH exec python3 ./worker.py
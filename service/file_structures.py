@@ -22,10 +22,37 @@ from abc import (
     ABC,
     abstractmethod,
 )
-from typing import TYPE_CHECKING
+from collections import deque
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import (
+    cast,
+    Deque,
+    Dict,
+    IO,
+    List,
+    Tuple,
+    TYPE_CHECKING,
+)
 import logging
 import os
 import shutil
+import tarfile
+
+from service.decompressors import (
+    detect_format,
+    get_decompressors,
+    select_decompressor,
+)
+from service.metrics import measure
+from service.template_cache import (
+    link_or_copy,
+    TemplateCache,
+)
+from service.tracing import tracer
 
 
 if TYPE_CHECKING:  # pragma: no cover
@@ -33,6 +60,161 @@ if TYPE_CHECKING:  # pragma: no cover
     from service.downloaders import Downloader
 
 
+DEFAULT_DECOMPRESSORS = ("pigz", "zstd", "zstandard", "stdlib")
+
+
+class UnsafeArchiveError(shutil.ReadError):
+    """Archive member would be extracted outside of destination or is not a file, directory or link."""
+
+
+def is_within(path: str, root: str) -> bool:
+    """Return whether normalized `path` is `root` or inside it."""
+    return os.path.commonpath([root, path]) == root
+
+
+def member_target(member: tarfile.TarInfo, root: str) -> str:
+    """Return extraction path of `member` inside `root`, raise `UnsafeArchiveError` for unsafe members."""
+    if not (member.isfile() or member.isdir() or member.issym() or member.islnk()):
+        raise UnsafeArchiveError(f"Member `{member.name}` is not a file, directory or link")
+
+    target = os.path.normpath(os.path.join(root, member.name))
+    if os.path.isabs(member.name) or not is_within(target, root):
+        raise UnsafeArchiveError(f"Member `{member.name}` is outside of destination")
+
+    return target
+
+
+def link_source(member: tarfile.TarInfo, target: str, root: str) -> str:
+    """Return path `member` link points to, raise `UnsafeArchiveError` if it is outside of `root`.
+
+    Paths are resolved through links created before, so chained links of the same archive cannot escape `root`.
+    """
+    base = os.path.dirname(target) if member.issym() else root
+    source = os.path.realpath(os.path.join(base, member.linkname))
+    if os.path.isabs(member.linkname) or not is_within(source, root):
+        raise UnsafeArchiveError(f"Link `{member.name}` points outside of destination")
+    if not is_within(os.path.realpath(os.path.dirname(target)), root):
+        raise UnsafeArchiveError(f"Member `{member.name}` is outside of destination")
+
+    return source
+
+
+def write_file(target: str, data: bytes, mode: int) -> None:
+    """Write `data` to new file `target`, set-id and sticky bits of `mode` are dropped."""
+    with os.fdopen(os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode & 0o777), "wb") as out_file:
+        out_file.write(data)
+
+
+class Extraction:
+    """State of single extraction: written files, deferred links and directories known to exist."""
+
+    def __init__(self, root: str) -> None:
+        """Initialize extraction to `root` directory."""
+        self.root = root
+        self.pending: Deque[Future[None]] = deque()
+        # last write of every file, members with the same name are written in archive order
+        self.writes: Dict[str, Future[None]] = {}
+        self.links: List[Tuple[tarfile.TarInfo, str]] = []
+        self.directories = {root}
+
+    def makedirs(self, directory: str) -> None:
+        """Create `directory` once per extraction, saves lookups on network filesystem."""
+        if directory not in self.directories:
+            os.makedirs(directory, exist_ok=True)
+            self.directories.add(directory)
+
+    def finish(self) -> None:
+        """Raise first error of file writes, then create links pointing inside root."""
+        for future in self.pending:
+            future.result()
+
+        created: List[Tuple[tarfile.TarInfo, str]] = []
+        try:
+            for member, target in self.links:
+                self.link(member, target)
+                created.append((member, target))
+        finally:
+            self.verify_links(created)
+
+    def link(self, member: tarfile.TarInfo, target: str) -> None:
+        """Create link `member` at `target`, raise `UnsafeArchiveError` if it points outside of root."""
+        source = link_source(member, target, self.root)
+        self.makedirs(os.path.dirname(target))
+        if member.issym():
+            os.symlink(member.linkname, target)
+        else:
+            os.link(source, target)
+
+    def verify_links(self, links: List[Tuple[tarfile.TarInfo, str]]) -> None:
+        """Remove symlinks redirected outside of root by symlinks created after them, raise `UnsafeArchiveError`."""
+        escaped = [member.name for member, target in links if member.issym() and self.unlink_escaped(target)]
+        if escaped:
+            raise UnsafeArchiveError(f"Link `{escaped[0]}` points outside of destination")
+
+    def unlink_escaped(self, target: str) -> bool:
+        """Remove symlink `target` if it points outside of root, return whether it does.
+
+        Links are checked in order of creation, so escaped parent links are removed first and nothing is removed
+        through a parent directory outside of root.
+        """
+        if is_within(os.path.realpath(target), self.root):
+            return False
+
+        parent = os.path.realpath(os.path.dirname(target))
+        if is_within(parent, self.root):
+            os.unlink(os.path.join(parent, os.path.basename(target)))
+        return True
+
+
+class TarExtractor:
+    """Extract tar stream with file writes dispatched to thread pool.
+
+    Members are read sequentially, directories are created before files are written to them and every regular
+    file is written by pool thread, so `open`/`write`/`close` round-trips to network filesystem overlap. Members with
+    the same name are written in archive order, so the last one wins. Links are created last, after all files are
+    written. Ownership and modification times are not restored.
+    """
+
+    def __init__(self, threads: int) -> None:
+        """Initialize extractor, pool threads are started on demand."""
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="unpack")
+        # bounds memory held by read members waiting for pool thread
+        self.max_pending = threads * 4
+
+    def extract(self, tar: tarfile.TarFile, path: str) -> None:
+        """Extract all members of `tar` to `path`, raise `UnsafeArchiveError` before extracting unsafe member."""
+        extraction = Extraction(os.path.realpath(path))
+
+        try:
+            for member in tar:
+                self.add(tar, member, extraction)
+        finally:
+            # files are not written after extraction failed
+            wait(extraction.pending)
+
+        extraction.finish()
+
+    def add(self, tar: tarfile.TarFile, member: tarfile.TarInfo, extraction: Extraction) -> None:
+        """Create directory, defer link or read file `member` from stream and write it in pool thread."""
+        target = member_target(member, extraction.root)
+        if member.isdir():
+            extraction.makedirs(target)
+            return
+        if not member.isfile():
+            extraction.links.append((member, target))
+            return
+
+        extraction.makedirs(os.path.dirname(target))
+        data = cast(IO[bytes], tar.extractfile(member)).read()
+        if target in extraction.writes:
+            extraction.writes[target].result()
+        extraction.writes[target] = self.executor.submit(write_file, target, data, member.mode)
+        extraction.pending.append(extraction.writes[target])
+
+        while len(extraction.pending) > self.max_pending:
+            extraction.pending.popleft().result()
+
+
 class FileStructure(ABC):
     """Base class for creating, deleting and unpacking files and directories."""
 
@@ -46,6 +228,14 @@ class FileStructure(ABC):
     def create_structure_for(self, path: str, filename: str) -> None:
         """Create directory structure for files."""
 
+    @abstractmethod
+    def clone_structure(self, source: str, path: str) -> None:
+        """Create directory structure for files from the one already created in `source`."""
+
+    @abstractmethod
+    def reap(self) -> None:
+        """Remove files which are no longer needed, called when store volumes fill up."""
+
 
 class BundleGenFileStructure(FileStructure):
     """Create file structure for BundleGen."""
@@ -53,10 +243,32 @@ class BundleGenFileStructure(FileStructure):
     def __init__(self, config: "Config", downloader: "Downloader") -> None:  # move downloader out
         super().__init__(config)
         self.downloader = downloader
+        self.decompressors = get_decompressors(config.get("unpack.decompressors", DEFAULT_DECOMPRESSORS))
+        self.extractor = TarExtractor(config.get("unpack.threads", 4))
+        cache_dir = config.get("template_cache.dir", None)
+        self.cache = TemplateCache(cache_dir, config.get("template_cache.ttl", 300)) if cache_dir else None
 
     def create_structure_for(self, path: str, filename: str) -> None:
-        """Create temp directory, download tar template file to it and unpack."""
+        """Create temp directory, download tar template file to it and unpack, or link it from template cache."""
         self.create_template_directory(path)
+        if self.cache is None:
+            self.fetch_template(path, filename)
+        else:
+            self.cache.populate(path, filename, lambda directory: self.fetch_template(directory, filename))
+
+    def clone_structure(self, source: str, path: str) -> None:
+        """Link template files unpacked to `source` into `path`, tickets of a batch share template archive."""
+        self.logger.info("Cloning template files from `%s` to `%s`", source, path)
+        with measure("clone"):
+            shutil.copytree(source, path, symlinks=True, copy_function=link_or_copy, dirs_exist_ok=True)
+
+    def reap(self) -> None:
+        """Remove expired entries of template cache."""
+        if self.cache is not None:
+            self.cache.reap()
+
+    def fetch_template(self, path: str, filename: str) -> None:
+        """Download tar template file to `path` and unpack."""
         self.download_template_archive(path, filename)
         self.unpack_template_archive(path, filename)
 
@@ -69,9 +281,15 @@ class BundleGenFileStructure(FileStructure):
     def download_template_archive(self, path: str, filename: str) -> None:
         """Download template files from S3 to tmp directory."""
         self.logger.info("Downloading template archive `%s` to `%s`", filename, path)
-        self.downloader.download(path, filename)
+        with measure("download"), tracer.span("download"):
+            self.downloader.download(path, filename)
 
     def unpack_template_archive(self, path: str, filename: str) -> None:
-        """Unpack tar.gz file with templates json files."""
-        self.logger.info("Unpacking template archive `%s`", filename)
-        shutil.unpack_archive(os.path.join(path, filename), path)
+        """Unpack tar archive with templates json files, compression format is detected from its content."""
+        archive = os.path.join(path, filename)
+        archive_format = detect_format(archive)
+        decompressor = select_decompressor(self.decompressors, archive_format)
+        self.logger.info("Unpacking %s template archive `%s` with %s", archive_format, filename, decompressor.name)
+        with measure("unpack"), tracer.span("unpack"):
+            with decompressor.stream(archive) as stream, tarfile.open(fileobj=stream, mode="r|*") as tar:
+                self.extractor.extract(tar, path)
@@ -26,6 +26,9 @@ from typing import (
     Any,
     Callable,
     Dict,
+    List,
+    Optional,
+    Tuple,
     TYPE_CHECKING,
 )
 
@@ -56,12 +59,21 @@ class Formatter(ABC):
 class BundleGenFormatter(Formatter):
     """Format input message to BundleGen message based on rules described in config file."""
 
-    def format(self, msg: Dict[str, Any]) -> Dict[str, str]:
-        """Transform `msg` dict into BundleGen message dict, based on rules from config."""
-        message: Dict[str, Any] = {}
+    def __init__(self, config: "Config") -> None:
+        """Formatter initialization, rules from config are parsed on first use."""
+        super().__init__(config)
+        self._compiled: Optional[List[Tuple[str, Callable[[str, Dict[str, Any]], Any], str]]] = None
 
-        for key, string in self.config.get("message").items():
-            rule, fstring = string.split(":", 1)
-            message[key] = self.rules[rule](fstring, msg)
+    def compile(self) -> List[Tuple[str, Callable[[str, Dict[str, Any]], Any], str]]:
+        """Parse `message` section of config into (key, rule, argument) triples once."""
+        if self._compiled is None:
+            self._compiled = []
+            for key, string in self.config.get("message").items():
+                rule, fstring = string.split(":", 1)
+                self._compiled.append((key, self.rules[rule], fstring))
 
-        return message
+        return self._compiled
+
+    def format(self, msg: Dict[str, Any]) -> Dict[str, str]:
+        """Transform `msg` dict into BundleGen message dict, based on rules from config."""
+        return {key: rule(fstring, msg) for key, rule, fstring in self.compile()}
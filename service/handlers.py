@@ -27,30 +27,56 @@ from typing import (
     Any,
     Dict,
     List,
+    Optional,
+    Tuple,
     TYPE_CHECKING,
 )
 import logging
 import os
 import shutil
+import time
 
 from pika import BasicProperties
 from pika.adapters.blocking_connection import BlockingChannel
 from pika.spec import Basic
 
+from service.affinity import Affinity
+from service.batching import Batch
+from service.deadline import Deadlines
 from service.decoders import (
     Decoder,
     JsonDecoder,
     MsgPackDecoder,
 )
+from service.dedup import RecentTickets
+from service.disk import DiskSpace
 from service.encoders import (
     Encoder,
     JsonEncoder,
     MsgPackEncoder,
 )
+from service.metrics import (
+    count_duplicate,
+    count_expired,
+    count_late_reply,
+    count_status_message,
+    measure,
+    observe_stage,
+    observe_turnaround,
+)
+from service.retry import RetryPolicy
+from service.tracing import (
+    extract,
+    inject,
+    Span,
+    tracer,
+)
 from service.utils import get_utc_timestamp_ms
+from service.watchdog import Watchdog
 
 
 if TYPE_CHECKING:  # pragma: no cover
+    from service.batching import Delivery
     from service.config import Config
     from service.file_structures import FileStructure
     from service.formatter import Formatter
@@ -75,7 +101,30 @@ class Statuses(str, Enum):
     BUNDLE_ERROR = "BUNDLE_ERROR"
 
 
-class Handler(ABC):
+class Ticket:
+    """Input message on its way to BundleGen."""
+
+    def __init__(self, method: Basic.Deliver, props: BasicProperties, body: bytes) -> None:
+        """Start ticket span from trace context of input message."""
+        self.method = method
+        self.props = props
+        self.body = body
+        self.span = tracer.start_span("ticket", extract(props.headers))
+        self.source_msg: Dict[str, str] = {}
+        self.destination_msg: Dict[str, str] = {}
+        self.deadline: Optional[float] = None
+
+    @property
+    def request_id(self) -> str:
+        """Return `x-request-id` header of input message, empty string if it is missing."""
+        return str((self.props.headers or {}).get("x-request-id", ""))
+
+    def ack(self, channel: BlockingChannel) -> None:
+        """Acknowledge input message."""
+        channel.basic_ack(delivery_tag=self.method.delivery_tag)  # type: ignore[arg-type]
+
+
+class Handler(ABC):  # pylint: disable=R0902
     """Base class for handling RabbitMQ messages."""
 
     def __init__(self, config: "Config") -> None:
@@ -84,6 +133,13 @@ class Handler(ABC):
         self.config = config
         self.decoders: Dict[str, Decoder] = {}
         self.encoders: Dict[str, Encoder] = {}
+        self.retry = RetryPolicy(config)
+        self.affinity = Affinity(config)
+        self.batch = Batch(config)
+        self.recent = RecentTickets(config)
+        self.disk = DiskSpace(config)
+        self.deadlines = Deadlines(config)
+        self.watchdog = Watchdog(config)
         self.logger = logging.getLogger(self.__class__.__name__)
 
     @abstractmethod
@@ -98,10 +154,27 @@ class Handler(ABC):
     def h_request(self, channel: BlockingChannel, method: Basic.Deliver, props: BasicProperties, body: bytes) -> None:
         """Handle input message."""
 
+    @abstractmethod
+    def h_batch(self, channel: BlockingChannel, deliveries: List["Delivery"]) -> None:
+        """Handle batch of input messages."""
+
     @abstractmethod
     def h_response(self, channel: BlockingChannel, method: Basic.Deliver, props: BasicProperties, body: bytes) -> None:
         """Handle output message."""
 
+    @property
+    def outstanding(self) -> int:
+        """Number of sent tickets waiting for reply."""
+        return 0
+
+    @abstractmethod
+    def abort_outstanding(self, channel: BlockingChannel, message: str, uuids: Optional[List[str]] = None) -> None:
+        """Give up tickets `uuids` waiting for reply, all of them by default."""
+
+    @abstractmethod
+    def affinity_key(self, body: bytes, props: BasicProperties) -> str:
+        """Return key of input message, messages with the same key are routed to the same pod."""
+
 
 class BundleGenHandler(Handler):
     """Handle messages for BundleGen."""
@@ -111,6 +184,21 @@ class BundleGenHandler(Handler):
         self.formatter = formatter
         self.file_structure = file_structure  # add downloader here and remove from file_structure, not it is ugly
         self.request_id_map: Dict[str, str] = {}
+        self.launch_times: Dict[str, float] = {}
+        self.pending_spans: Dict[str, Span] = {}
+        self.disk.reapers.append(file_structure.reap)
+        if self.recent.enabled:
+            self.disk.reapers.append(self.recent.prune)
+
+    @property
+    def outstanding(self) -> int:
+        """Number of tickets sent to BundleGen and waiting for reply."""
+        return len(self.launch_times)
+
+    def preload(self) -> None:
+        """Create codecs before worker process is forked."""
+        for codec in ("in_decoder", "out_encoder", "status_decoder", "status_encoder"):
+            getattr(self, codec)
 
     @property
     def in_decoder(self) -> Decoder:
@@ -149,31 +237,197 @@ class BundleGenHandler(Handler):
         f_template_filename: str = self.config.get("templates_archive_name")
         return f_template_filename.format(**msg)
 
+    def affinity_key(self, body: bytes, props: BasicProperties) -> str:
+        """Return template archive name of input message, empty string if it cannot be decoded or formatted.
+
+        Broken message is routed to any pod, which reports the error when handling it.
+        """
+        try:
+            msg = self.extend_message(self.decode_input_message(body), props.headers or {})  # type: ignore[arg-type]
+            return self.get_template_filename(msg)
+        except Exception:  # pylint: disable=W0703
+            self.logger.warning("Cannot get template archive name of input message, routing it to any shard")
+            return ""
+
+    def get_priority(self, msg: Dict[str, Any], props: BasicProperties) -> Optional[int]:
+        """Get ticket priority from AMQP property, `priority.header` header or `priority.field` message field.
+
+        Returns `None` if priority queues are disabled (no `worker.max_priority`).
+        """
+        max_priority: int = self.config.get("worker.max_priority", 0)
+        if not max_priority:
+            return None
+
+        candidates = (
+            props.priority,
+            (props.headers or {}).get(self.config.get("priority.header", "x-priority")),
+            msg.get(self.config.get("priority.field", "priority")),
+        )
+        value = next((candidate for candidate in candidates if candidate is not None), 0)
+
+        try:
+            return min(max(int(value), 0), max_priority)
+        except (TypeError, ValueError):
+            return 0
+
     def h_request(self, channel: BlockingChannel, method: Basic.Deliver, props: BasicProperties, body: bytes) -> None:
         """Handle input message."""
         self.logger.debug("%s\t%s\t%s", channel, method, props)
-        try:
-            source_msg = self.make_src_msg(body, props)
-            self.logger.info("Received new input message: %s", source_msg)
+        if not self.disk.admit(channel, method):
+            return
 
-            destination_msg = self.make_dst_msg(source_msg)
-            self.file_structure.create_structure_for(
-                destination_msg["searchpath"],
-                self.get_template_filename(source_msg),
-            )
-            if os.path.exists(destination_msg["outputdir"]):
-                shutil.rmtree(destination_msg["outputdir"])
+        ticket = Ticket(method, props, body)
+        if self.skip_ticket(channel, ticket):
+            return
 
-            os.makedirs(destination_msg["outputdir"])
+        try:
+            with tracer.activate(ticket.span):
+                ticket.source_msg, ticket.destination_msg = self.prepare_ticket(body, props)
         except Exception as exc:  # pylint: disable=W0703
-            self.logger.exception("Exception occurred while formatting message: %s", str(exc))
-            source_id = str(props.headers.get("x-request-id", "")) if props.headers is not None else ""
-            self.send_error_msg(channel, str(exc), source_id)
+            self.finish_ticket(channel, ticket, exc)
         else:
-            self.send_bundlegen_msg(channel, destination_msg)
-            self.send_success_msg(channel, Statuses.GENERATION_LAUNCHED, source_msg["id"])
+            self.finish_ticket(channel, ticket, None)
+
+    def h_batch(self, channel: BlockingChannel, deliveries: List["Delivery"]) -> None:
+        """Handle batch of input messages, template directory is prepared once per template archive."""
+        groups: Dict[str, List[Ticket]] = {}
+        for delivery in [delivery for delivery in deliveries if self.disk.admit(channel, delivery[0])]:
+            ticket = Ticket(*delivery)
+            if self.skip_ticket(channel, ticket):
+                continue
+
+            filename = self._format_member(channel, ticket)
+            if filename is not None:
+                groups.setdefault(filename, []).append(ticket)
+
+        for filename, tickets in groups.items():
+            self.launch_group(channel, filename, tickets)
+
+    def _format_member(self, channel: BlockingChannel, ticket: Ticket) -> Optional[str]:
+        """Format ticket of batched input message and return its template archive name, `None` if it failed."""
+        try:
+            with tracer.activate(ticket.span):
+                ticket.source_msg, ticket.destination_msg = self.format_ticket(ticket.body, ticket.props)
+                return self.get_template_filename(ticket.source_msg)
+        except Exception as exc:  # pylint: disable=W0703
+            self.finish_ticket(channel, ticket, exc)
+            return None
+
+    def launch_group(self, channel: BlockingChannel, filename: str, tickets: List[Ticket]) -> None:
+        """Prepare template directory of first ticket, fan it out to the other tickets and launch all of them."""
+        searchpath = tickets[0].destination_msg["searchpath"]
+        self.logger.info("Preparing template archive `%s` for %s tickets", filename, len(tickets))
+        try:
+            with tracer.activate(tickets[0].span):
+                self.file_structure.create_structure_for(searchpath, filename)
+        except Exception as exc:  # pylint: disable=W0703
+            for ticket in tickets:
+                self.finish_ticket(channel, ticket, exc)
+            return
+
+        for ticket in tickets:
+            self.finish_ticket(channel, ticket, self._prepare_member(ticket, searchpath))
+
+    def _prepare_member(self, ticket: Ticket, source: str) -> Optional[Exception]:
+        """Fill searchpath of ticket from template directory `source` and prepare its output directory.
+
+        Returns the error instead of raising it, so the other tickets of the group are still launched.
+        """
+        try:
+            with tracer.activate(ticket.span):
+                if ticket.destination_msg["searchpath"] != source:
+                    self.file_structure.clone_structure(source, ticket.destination_msg["searchpath"])
+                self.prepare_outputdir(ticket.destination_msg["outputdir"])
+        except Exception as exc:  # pylint: disable=W0703
+            return exc
+        return None
+
+    def finish_ticket(self, channel: BlockingChannel, ticket: Ticket, error: Optional[Exception]) -> None:
+        """Launch prepared ticket or report its error, input message is acknowledged in any case."""
+        try:
+            if error is None:
+                with tracer.activate(ticket.span):
+                    priority = self.get_priority(ticket.source_msg, ticket.props)
+                    self.deadlines.stamp(ticket.destination_msg, ticket.deadline)
+                    self.send_bundlegen_msg(channel, ticket.destination_msg, priority, ticket.deadline)
+                self.recent.record(ticket.request_id)
+                self.send_success_msg(channel, Statuses.GENERATION_LAUNCHED, ticket.source_msg["id"])
+                observe_stage("launch", time.time() - ticket.span.start)
+            else:
+                self.fail_ticket(channel, ticket, error)
         finally:
-            channel.basic_ack(delivery_tag=method.delivery_tag)  # type: ignore[arg-type]
+            ticket.ack(channel)
+
+    def skip_ticket(self, channel: BlockingChannel, ticket: Ticket) -> bool:
+        """Acknowledge input message of expired ticket or redelivered message of ticket already sent to BundleGen.
+
+        Expired ticket is reported with `DEADLINE_EXCEEDED` error. BundleGen reply to the first attempt of redelivered
+        ticket went to the connection of the dead worker, so the ticket is reported as launched and failed with
+        `REPLY_LOST` error. Deadline of ticket which is not skipped is kept for BundleGen.
+        """
+        ticket.deadline = self.deadlines.deadline(ticket.props)
+        error: Optional[str] = None
+        if self.deadlines.expired(ticket.deadline):
+            error = "Ticket expired before it was launched"
+            self.logger.warning("Ticket `%s` expired before it was launched, dropping it", ticket.request_id)
+            count_expired()
+            self.send_error_msg(channel, error, ticket.request_id, "DEADLINE_EXCEEDED")
+        elif ticket.method.redelivered and self.recent.seen(ticket.request_id):
+            error = "BundleGen reply to the first attempt was lost"
+            self.logger.warning("Ticket `%s` was already sent to BundleGen, skipping its redelivery", ticket.request_id)
+            count_duplicate()
+            self.send_success_msg(channel, Statuses.GENERATION_LAUNCHED, ticket.request_id)
+            self.send_error_msg(channel, error, ticket.request_id, "REPLY_LOST")
+        else:
+            return False
+
+        self._forget_request(ticket.request_id)
+        tracer.end_span(ticket.span, error)
+        ticket.ack(channel)
+        return True
+
+    def fail_ticket(self, channel: BlockingChannel, ticket: Ticket, error: Exception) -> None:
+        """Schedule retry of failed ticket or report the error to ABS."""
+        self.logger.error("Exception occurred while formatting message: %s", str(error), exc_info=error)
+        if not self.retry.schedule(channel, ticket.props, ticket.body, error):
+            self.send_error_msg(channel, str(error), ticket.request_id)
+        self._forget_request(ticket.source_msg.get("id", ticket.request_id))
+        tracer.end_span(ticket.span, str(error))
+
+    def _forget_request(self, uuid: str) -> None:
+        """Drop request id of ticket `uuid` which was not launched, unless ticket with the same id waits for reply."""
+        if uuid not in self.launch_times:
+            self.request_id_map.pop(uuid, None)
+
+    def prepare_ticket(self, body: bytes, props: BasicProperties) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Decode input message, format BundleGen ticket and prepare its directories."""
+        source_msg, destination_msg = self.format_ticket(body, props)
+        self.file_structure.create_structure_for(
+            destination_msg["searchpath"],
+            self.get_template_filename(source_msg),
+        )
+        self.prepare_outputdir(destination_msg["outputdir"])
+
+        return source_msg, destination_msg
+
+    def format_ticket(self, body: bytes, props: BasicProperties) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Decode input message and format BundleGen ticket."""
+        with measure("decode"):
+            source_msg = self.make_src_msg(body, props)
+        self.logger.info("Received new input message: %s", source_msg)
+
+        with measure("format"):
+            destination_msg = self.make_dst_msg(source_msg)
+
+        return source_msg, destination_msg
+
+    def prepare_outputdir(self, path: str) -> None:
+        """Recreate empty output directory for BundleGen."""
+        with measure("cleanup"):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+
+            os.makedirs(path)
 
     def h_response(self, channel: BlockingChannel, method: Basic.Deliver, props: BasicProperties, body: bytes) -> None:
         """Handle output message."""
@@ -183,10 +437,22 @@ class BundleGenHandler(Handler):
 
         self.logger.info("Received new status message: %s", msg)
 
+        self.watchdog.release(msg["uuid"])
+        launched_at = self.launch_times.pop(msg["uuid"], None)
+        if launched_at is None:
+            # ticket was given up by watchdog or drain, ABS already got its error
+            self.logger.warning("Dropping reply of ticket `%s` which is not waiting for it", msg["uuid"])
+            count_late_reply()
+            return
+
+        observe_turnaround(time.monotonic() - launched_at)
+        self.end_ticket_span(msg["uuid"], None if msg["success"] else "Got error from BundleGen")
+
         if msg["success"]:
             self.send_success_msg(channel, Statuses.GENERATION_COMPLETED, msg["uuid"])
         else:
             self.send_error_msg(channel, "Got error from BundleGen", msg["uuid"])
+        self.request_id_map.pop(msg["uuid"], None)
 
     def make_src_msg(self, body: bytes, properties: BasicProperties) -> Dict[str, str]:
         """Prepare message from input queue."""
@@ -224,6 +490,7 @@ class BundleGenHandler(Handler):
 
     def _send_status_message(self, channel: BlockingChannel, msg: Dict[str, Any], uuid: str) -> None:
         """Send status message for ABS."""
+        count_status_message(msg["phaseCode"])
         channel.basic_publish(
             exchange="",
             routing_key=self.config.get("worker.status_queue"),
@@ -234,7 +501,7 @@ class BundleGenHandler(Handler):
             ),
         )
 
-    def send_error_msg(self, channel: BlockingChannel, message: str, uuid: str) -> None:
+    def send_error_msg(self, channel: BlockingChannel, message: str, uuid: str, code: str = "GENERIC_ERROR") -> None:
         """Send error status message for ABS."""
         self._send_status_message(
             channel,
@@ -243,7 +510,7 @@ class BundleGenHandler(Handler):
                 "phaseCode": Statuses.BUNDLE_ERROR.value,
                 "messageTimestamp": get_utc_timestamp_ms(),
                 "error": {
-                    "code": "GENERIC_ERROR",
+                    "code": code,
                     "message": message,
                 },
             },
@@ -262,16 +529,52 @@ class BundleGenHandler(Handler):
             uuid,
         )
 
-    def send_bundlegen_msg(self, channel: BlockingChannel, msg: Dict[str, str]) -> None:
-        """Send ticket for BundleGen."""
+    def send_bundlegen_msg(
+        self,
+        channel: BlockingChannel,
+        msg: Dict[str, str],
+        priority: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> None:
+        """Send ticket for BundleGen, its deadline is forwarded in headers."""
         self.logger.info("Send message to BundleGen: %s", msg)
 
-        channel.basic_publish(
-            exchange="",
-            routing_key=self.config.get("worker.out_queue"),
-            body=self.out_encoder.encode(msg),
-            properties=BasicProperties(
-                delivery_mode=2,  # make message persistent
-                reply_to="amq.rabbitmq.reply-to",
-            ),
-        )
+        bundlegen_span = tracer.start_span("bundlegen")
+        # register ticket before publishing, in threaded mode reply is handled on another thread
+        self.launch_times[msg["uuid"]] = time.monotonic()
+        self.pending_spans[msg["uuid"]] = bundlegen_span
+        self.watchdog.track(msg)
+
+        headers: Dict[str, Any] = inject(bundlegen_span)
+        headers.update(self.deadlines.headers(deadline))
+        with measure("publish"), tracer.span("publish"):
+            channel.basic_publish(
+                exchange="",
+                routing_key=self.config.get("worker.out_queue"),
+                body=self.out_encoder.encode(msg),
+                properties=BasicProperties(
+                    delivery_mode=2,  # make message persistent
+                    reply_to="amq.rabbitmq.reply-to",
+                    headers=headers,
+                    priority=priority,
+                ),
+            )
+
+    def abort_outstanding(self, channel: BlockingChannel, message: str, uuids: Optional[List[str]] = None) -> None:
+        """Report tickets `uuids` still waiting for BundleGen reply as failed, all of them by default."""
+        for uuid in list(self.launch_times) if uuids is None else uuids:
+            if self.launch_times.pop(uuid, None) is None:
+                continue
+
+            self.watchdog.release(uuid)
+            self.end_ticket_span(uuid, message)
+            self.send_error_msg(channel, message, uuid)
+            self.request_id_map.pop(uuid, None)
+
+    def end_ticket_span(self, uuid: str, error: Optional[str]) -> None:
+        """Finish BundleGen span of ticket `uuid` together with its parent ticket span."""
+        span = self.pending_spans.pop(uuid, None)
+
+        while span is not None:
+            tracer.end_span(span, error)
+            span = span.parent
@@ -0,0 +1,145 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Heartbeat slots in shared memory, written by `Worker` processes and read by health probes."""
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+)
+import mmap
+import os
+import struct
+import time
+
+
+SLOT = struct.Struct("<qqdddqdq")
+FIELDS = ("pid", "connected", "started_at", "heartbeat_at", "last_message_at", "in_flight", "busy", "capacity")
+
+
+def get_heartbeat_path() -> str:
+    """Return path of shared memory file with heartbeat slots."""
+    # tmpfs shared by worker processes and probes of the same pod, not a temporary file
+    return os.environ.get("HEARTBEAT_FILE", "/dev/shm/bundlegen-service-heartbeat")  # nosec B108
+
+
+def create_slots(count: int, path: Optional[str] = None) -> None:
+    """Create shared memory file with `count` empty heartbeat slots."""
+    with open(path or get_heartbeat_path(), "wb") as out_file:
+        out_file.write(bytes(SLOT.size * count))
+
+
+def read_slots(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Return state of all occupied heartbeat slots."""
+    with open(path or get_heartbeat_path(), "rb") as in_file:
+        data = in_file.read()
+
+    slots = [dict(zip(FIELDS, values)) for values in SLOT.iter_unpack(data[: len(data) - len(data) % SLOT.size])]
+    return [slot for slot in slots if slot["pid"]]
+
+
+class HeartbeatSlot:
+    """Heartbeat slot of single `Worker` process."""
+
+    def __init__(self, index: int, path: Optional[str] = None) -> None:
+        """Initialize slot, shared memory is mapped lazily in worker process."""
+        self.index = index
+        self.path = path or get_heartbeat_path()
+        self._mmap: Optional[mmap.mmap] = None
+        self._values: Dict[str, Any] = dict.fromkeys(FIELDS, 0)
+
+    @property
+    def memory(self) -> mmap.mmap:
+        """Map shared memory file."""
+        if self._mmap is None:
+            with open(self.path, "r+b") as shm_file:
+                self._mmap = mmap.mmap(shm_file.fileno(), 0)
+
+        return self._mmap
+
+    def update(self, **values: Any) -> None:
+        """Update slot fields and write the whole slot to shared memory.
+
+        Every message in flight since previous update adds the elapsed time to `busy`, so overlapping messages of
+        threaded worker are counted each for its own duration.
+        """
+        now = time.time()
+        busy = self._values["busy"] + self._values["in_flight"] * (now - self._values["heartbeat_at"])
+        self._values.update(values, busy=busy, heartbeat_at=now)
+        SLOT.pack_into(self.memory, self.index * SLOT.size, *(self._values[field] for field in FIELDS))
+
+    def start(self, capacity: int = 1) -> None:
+        """Occupy slot by current process handling up to `capacity` messages at once."""
+        self._values.update(dict.fromkeys(FIELDS, 0), pid=os.getpid(), started_at=time.time(), capacity=capacity)
+        self.update()
+
+    def clear(self) -> None:
+        """Free slot of exited process."""
+        SLOT.pack_into(self.memory, self.index * SLOT.size, *bytes(len(FIELDS)))
+
+    def set_connected(self, connected: bool) -> None:
+        """Store state of RabbitMQ connection."""
+        self.update(connected=int(connected))
+
+    def message_started(self) -> None:
+        """Register new message in processing."""
+        self.update(last_message_at=time.time(), in_flight=self._values["in_flight"] + 1)
+
+    def message_finished(self) -> None:
+        """Register finished message, its duration is already added to `busy` seconds."""
+        self.update(in_flight=self._values["in_flight"] - 1)
+
+
+def pid_exists(pid: int) -> bool:
+    """Check whether process with `pid` is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def get_workers_state(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Return heartbeat slots with `alive` flag, worker is alive if it is running and its heartbeat is fresh."""
+    timeout = float(os.environ.get("HEARTBEAT_TIMEOUT", 300))
+    now = time.time()
+
+    try:
+        slots = read_slots(path)
+    except FileNotFoundError:
+        return []
+
+    for slot in slots:
+        slot["alive"] = now - slot["heartbeat_at"] <= timeout and pid_exists(slot["pid"])
+
+    return slots
+
+
+def is_ready(workers: List[Dict[str, Any]]) -> bool:
+    """Service is ready if at least one alive worker is connected to RabbitMQ."""
+    return any(worker["alive"] and worker["connected"] for worker in workers)
+
+
+def is_live(workers: List[Dict[str, Any]]) -> bool:
+    """Service is live if there are workers and none of them is dead or stalled."""
+    return bool(workers) and all(worker["alive"] for worker in workers)
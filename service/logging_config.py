@@ -17,8 +17,29 @@
 # limitations under the License.
 #
 
-"""Logging configuration."""
+"""Logging configuration.
+
+Records are put to a queue by the calling thread and formatted and written to stdout by a background
+`QueueListener` thread, so slow stdout does not block message handling. Message arguments and tracebacks are
+rendered by the calling thread, before they can change.
+"""
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+)
+from queue import Queue
+from typing import (
+    Any,
+    Dict,
+    List,
+)
+import copy
+import json
+import logging
+import logging.config
 import os
+import random
+import weakref
 
 
 LOGGING_FORMAT = os.environ.get(
@@ -26,6 +47,8 @@ LOGGING_FORMAT = os.environ.get(
     "%(asctime)s | %(levelname)s\t | [%(processName)s]%(filename)s:%(funcName)s:%(lineno)d - %(message)s",
 )
 LOGGING_LEVEL = os.environ.get("LOGGING_LEVEL", "INFO")
+LOGGING_JSON = os.environ.get("LOGGING_JSON", "false").lower() == "true"
+LOGGING_SAMPLING = os.environ.get("LOGGING_SAMPLING", "")
 
 LOGGING_CONFIG = {
     "version": 1,
@@ -34,13 +57,139 @@ LOGGING_CONFIG = {
         "default": {
             "format": LOGGING_FORMAT,
         },
+        "json": {
+            "()": "service.logging_config.JsonFormatter",
+        },
     },
     "handlers": {
         "console": {
-            "formatter": "default",
+            "formatter": "json" if LOGGING_JSON else "default",
             "class": "logging.StreamHandler",
             "stream": "ext://sys.stdout",
         },
     },
     "loggers": {"": {"handlers": ["console"], "level": LOGGING_LEVEL}},
 }
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log record as single line JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Return JSON representation of `record`."""
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.processName,
+            "location": f"{record.filename}:{record.funcName}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass only part of records below WARNING level for loggers with configured sampling rate."""
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        """Initialize filter with `logger name: rate` mapping."""
+        super().__init__()
+        self.rates = rates
+
+    @staticmethod
+    def parse(rates: str) -> Dict[str, float]:
+        """Parse `name:rate,name:rate` string."""
+        return {name: float(rate) for name, rate in (item.split(":") for item in rates.split(",") if item)}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Check whether `record` should be logged."""
+        rate = self.rates.get(record.name)
+
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+
+        return random.random() < rate  # nosec B311
+
+
+TRACEBACK_FORMATTER = logging.Formatter()
+# handlers whose listener threads are restarted in forked processes
+HANDLERS: "weakref.WeakSet[QueueListenerHandler]" = weakref.WeakSet()
+
+
+class QueueListenerHandler(QueueHandler):
+    """Put records to queue which is processed by `handlers` in a background thread."""
+
+    def __init__(self, handlers: List[logging.Handler]) -> None:
+        """Start background listener, it is restarted in forked processes."""
+        super().__init__(Queue(-1))
+        self.handlers = handlers
+        self.listener = self.start()
+        HANDLERS.add(self)
+
+    def start(self) -> QueueListener:
+        """Start listener of the queue."""
+        listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        listener.start()
+        return listener
+
+    def restart(self) -> None:
+        """Replace listener thread, which does not exist in forked process."""
+        self.queue = Queue(-1)
+        self.listener = self.start()
+
+    def prepare(self, record: logging.LogRecord) -> Any:
+        """Merge arguments into message and render traceback of `record`, listener thread only formats it.
+
+        Arguments may be mutable objects changed by the calling thread after the record is queued.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def flush(self) -> None:
+        """Wait until all queued records are written."""
+        self.listener.stop()
+        self.listener = self.start()
+
+    def close(self) -> None:
+        """Write all queued records and stop listener."""
+        HANDLERS.discard(self)
+        self.listener.stop()
+        super().close()
+
+
+def restart_handlers() -> None:
+    """Restart listeners of all queue handlers in forked process."""
+    for handler in list(HANDLERS):
+        handler.restart()
+
+
+# registered once, every handler instance would add another hook
+os.register_at_fork(after_in_child=restart_handlers)
+
+
+def configure_logging() -> None:
+    """Configure logging, records are written to stdout by a background thread."""
+    logging.config.dictConfig(LOGGING_CONFIG)
+
+    root = logging.getLogger()
+    handler = QueueListenerHandler(root.handlers)
+    handler.addFilter(SamplingFilter(SamplingFilter.parse(LOGGING_SAMPLING)))
+    root.handlers = [handler]
+
+
+def flush_logging() -> None:
+    """Write all queued records, processes which exit without `atexit` hooks must call it."""
+    for handler in logging.getLogger().handlers:
+        handler.flush()
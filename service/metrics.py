@@ -0,0 +1,177 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Prometheus metrics of the service, shared between `Worker` processes and the Flask app."""
+from contextlib import contextmanager
+from typing import (
+    Iterator,
+    Tuple,
+)
+import os
+import time
+
+from prometheus_client import (
+    CollectorRegistry,
+    CONTENT_TYPE_LATEST,
+    Counter,
+    generate_latest,
+    Histogram,
+    REGISTRY,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STARTUP_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TURNAROUND_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0)
+
+STAGE_LATENCY = Histogram(
+    "bundlegen_service_stage_duration_seconds",
+    "Time spent in a single stage of ticket processing.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_FAILURES = Counter(
+    "bundlegen_service_stage_failures_total",
+    "Number of ticket processing stages finished with exception.",
+    ["stage"],
+)
+STATUS_MESSAGES = Counter(
+    "bundlegen_service_status_messages_total",
+    "Number of status messages sent to ABS.",
+    ["phase_code"],
+)
+WORKER_STARTUP = Histogram(
+    "bundlegen_service_worker_startup_seconds",
+    "Time from creating worker process until it is `connected` and until it handled its `first_message`.",
+    ["phase"],
+    buckets=STARTUP_BUCKETS,
+)
+RETRIES = Counter(
+    "bundlegen_service_retries_total",
+    "Number of input messages failed with transient error and scheduled for retry or dead-lettered.",
+    ["outcome"],
+)
+TEMPLATE_CACHE = Counter(
+    "bundlegen_service_template_cache_total",
+    "Number of template archives found in cache (`hit`), fetched (`miss`) or fetched by other process (`wait`).",
+    ["outcome"],
+)
+DUPLICATES = Counter(
+    "bundlegen_service_duplicate_requests_total",
+    "Number of redelivered input messages skipped because they were already sent to BundleGen.",
+)
+EXPIRED = Counter(
+    "bundlegen_service_expired_requests_total",
+    "Number of input messages dropped because their deadline passed before they were launched.",
+)
+LATE_REPLIES = Counter(
+    "bundlegen_service_late_replies_total",
+    "Number of BundleGen replies dropped because their ticket was already given up.",
+)
+DISK_ADMISSION = Counter(
+    "bundlegen_service_disk_admission_total",
+    "Number of input messages `requeued` because store volumes were full and of `reaped` store volumes.",
+    ["outcome"],
+)
+BUNDLEGEN_TURNAROUND = Histogram(
+    "bundlegen_service_bundlegen_turnaround_seconds",
+    "Time between sending ticket to BundleGen and receiving its response.",
+    buckets=TURNAROUND_BUCKETS,
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Observe duration of `stage`."""
+    STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+@contextmanager
+def measure(stage: str) -> Iterator[None]:
+    """Observe duration of `stage` and count it as failed if exception is raised."""
+    start = time.monotonic()
+    try:
+        yield
+    except Exception:
+        STAGE_FAILURES.labels(stage).inc()
+        raise
+    finally:
+        observe_stage(stage, time.monotonic() - start)
+
+
+def observe_turnaround(seconds: float) -> None:
+    """Observe BundleGen turnaround time."""
+    BUNDLEGEN_TURNAROUND.observe(seconds)
+
+
+def count_status_message(phase_code: str) -> None:
+    """Count status message sent to ABS."""
+    STATUS_MESSAGES.labels(phase_code).inc()
+
+
+def observe_startup(phase: str, seconds: float) -> None:
+    """Observe time from creating worker process until startup `phase`."""
+    WORKER_STARTUP.labels(phase).observe(seconds)
+
+
+def count_retry(outcome: str) -> None:
+    """Count retry of input message."""
+    RETRIES.labels(outcome).inc()
+
+
+def count_template_cache(outcome: str) -> None:
+    """Count lookup of template cache."""
+    TEMPLATE_CACHE.labels(outcome).inc()
+
+
+def count_duplicate() -> None:
+    """Count skipped redelivery of input message."""
+    DUPLICATES.inc()
+
+
+def count_expired() -> None:
+    """Count dropped expired input message."""
+    EXPIRED.inc()
+
+
+def count_late_reply() -> None:
+    """Count dropped reply of given up ticket."""
+    LATE_REPLIES.inc()
+
+
+def count_disk_admission(outcome: str) -> None:
+    """Count requeued input message or started reapers."""
+    DISK_ADMISSION.labels(outcome).inc()
+
+
+def get_registry() -> CollectorRegistry:
+    """Return registry aggregated over all processes if `PROMETHEUS_MULTIPROC_DIR` is set."""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+    if not path:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=path)  # type: ignore[no-untyped-call]
+    return registry
+
+
+def export() -> Tuple[bytes, str]:
+    """Return metrics in Prometheus text format together with its content type."""
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
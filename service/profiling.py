@@ -0,0 +1,208 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Opt-in time-bounded profiling of `Worker` processes, triggered by signals.
+
+Profiling is enabled by `PROFILING_DIR` environment variable. `SIGUSR1` starts sampling profiler which writes
+collapsed stacks (input of flamegraph tools) of all threads, `SIGUSR2` starts `cProfile` which writes pstats file of
+main thread only. Profile stops after `PROFILING_DURATION` seconds.
+"""
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from collections import Counter
+from types import FrameType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Optional,
+)
+import cProfile
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+
+SIGNALS = {"sampling": signal.SIGUSR1, "cprofile": signal.SIGUSR2}
+
+
+class Profiler(ABC):
+    """Base class for profilers of worker process."""
+
+    extension = ""
+
+    @abstractmethod
+    def start(self) -> None:
+        """Start profiling."""
+
+    @abstractmethod
+    def stop(self, path: str) -> None:
+        """Stop profiling and write result to `path`."""
+
+
+class CProfileProfiler(Profiler):
+    """Deterministic profiler of main thread, precise but slows down profiled code.
+
+    Pool threads of threaded mode are not profiled, use sampling profiler there.
+    """
+
+    extension = "pstats"
+
+    def __init__(self) -> None:
+        """Initialize profiler."""
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        """Start profiling."""
+        self.profile.enable()
+
+    def stop(self, path: str) -> None:
+        """Stop profiling and write pstats file."""
+        self.profile.disable()
+        self.profile.dump_stats(path)
+
+
+def collapse(frame: Optional[FrameType]) -> str:
+    """Return stack of `frame` in collapsed format, root first."""
+    names = []
+
+    while frame is not None:
+        names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler(Profiler):
+    """Sample stacks of all threads from background thread every `interval` seconds, cheap enough for real load.
+
+    In threaded mode main thread mostly waits in consume loop while pool threads handle messages.
+    """
+
+    extension = "collapsed"
+
+    def __init__(self, interval: float) -> None:
+        """Initialize profiler."""
+        self.interval = interval
+        self.stacks: Dict[str, int] = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def start(self) -> None:
+        """Start sampling thread."""
+        self.thread.start()
+
+    def sample(self) -> None:
+        """Count stacks of all threads except sampling thread until stopped."""
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():  # pylint: disable=W0212
+                if thread_id != self.thread.ident:
+                    self.stacks[collapse(frame)] += 1
+
+    def stop(self, path: str) -> None:
+        """Stop sampling thread and write collapsed stacks."""
+        self.stopped.set()
+        self.thread.join()
+
+        with open(path, "w", encoding="utf8") as out_file:
+            for stack, count in sorted(self.stacks.items()):
+                out_file.write(f"{stack} {count}\n")
+
+
+def get_profiler(key: str) -> Profiler:
+    """Get profiler by name."""
+    if key == "sampling":
+        return SamplingProfiler(float(os.environ.get("PROFILING_INTERVAL", 0.005)))
+
+    return {"cprofile": CProfileProfiler}[key]()
+
+
+class ProfilingSession:
+    """Start profiler on signal and stop it with `SIGALRM` after `duration` seconds.
+
+    Signal handlers only pass the work to `defer`, which runs it in consume loop of worker. Logging, file writes and
+    profiler setup are not safe in signal context, the interrupted thread may hold the logging queue lock.
+    """
+
+    def __init__(self, directory: str, duration: float, defer: Callable[[Callable[[], None]], None]) -> None:
+        """Initialize session."""
+        self.directory = directory
+        self.duration = duration
+        self.defer = defer
+        self.profiler: Optional[Profiler] = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def on_start(self, signum: int, _: Any) -> None:
+        """Schedule start of profiler selected by signal."""
+        self.defer(lambda: self.start(signum))
+
+    def on_stop(self, *_: Any) -> None:
+        """Schedule stop of profiler."""
+        self.defer(self.stop)
+
+    def start(self, signum: int) -> None:
+        """Start profiler selected by signal, ignore signal while profiling."""
+        if self.profiler is not None:
+            self.logger.warning("Profiling is already running, signal %s ignored", signum)
+            return
+
+        mode = {value: key for key, value in SIGNALS.items()}[signal.Signals(signum)]
+        self.profiler = get_profiler(mode)
+        self.profiler.start()
+        signal.setitimer(signal.ITIMER_REAL, self.duration)
+        self.logger.info("Started %s profiling for %s seconds", mode, self.duration)
+
+    def stop(self) -> None:
+        """Stop profiler and write result to profiling directory."""
+        if self.profiler is None:
+            return
+
+        path = os.path.join(self.directory, f"worker-{os.getpid()}-{int(time.time())}.{self.profiler.extension}")
+        self.profiler.stop(path)
+        self.profiler = None
+        self.logger.info("Profile written to `%s`", path)
+
+
+def install(defer: Callable[[Callable[[], None]], None]) -> Optional[ProfilingSession]:
+    """Install profiling signal handlers in current process if `PROFILING_DIR` is set.
+
+    Profiler is started and stopped by callbacks passed to `defer` outside of signal context.
+    """
+    directory = os.environ.get("PROFILING_DIR")
+    if not directory:
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    session = ProfilingSession(directory, float(os.environ.get("PROFILING_DURATION", 30)), defer)
+
+    for signum in SIGNALS.values():
+        signal.signal(signum, session.on_start)
+    signal.signal(signal.SIGALRM, session.on_stop)
+
+    return session
+
+
+def request_profile(pid: int, mode: str) -> None:
+    """Ask worker process `pid` to start profiling."""
+    os.kill(pid, SIGNALS[mode])
@@ -0,0 +1,137 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Delayed retries of input messages failed with transient errors, through TTL queues dead-lettering back."""
+from typing import (
+    Any,
+    Dict,
+    TYPE_CHECKING,
+)
+import logging
+
+from service.metrics import count_retry
+from service.utils import lazy_import
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pika import BasicProperties
+    from pika.adapters.blocking_connection import BlockingChannel
+
+    from service.config import Config
+
+
+pika = lazy_import("pika")
+
+
+ATTEMPT_HEADER = "x-retry-count"
+ERROR_HEADER = "x-last-error"
+
+
+class TransientError(Exception):
+    """Failure expected to disappear when the message is processed again later."""
+
+
+def is_transient(exc: Exception) -> bool:
+    """Check whether processing failed with transient error, everything else is permanent."""
+    return isinstance(exc, (TransientError, ConnectionError, TimeoutError))
+
+
+class RetryPolicy:
+    """Requeue failed input messages through delay queues with exponential backoff.
+
+    Delay queue has message TTL and dead-letters expired messages back to `worker.in_queue`, so the consumer
+    acknowledges the failed delivery right away and never sleeps. Delay queues are named after their TTL,
+    changing the backoff creates new queues instead of conflicting with declared ones.
+    """
+
+    def __init__(self, config: "Config") -> None:
+        """Read backoff from `retry` section of config, retries are disabled if `max_attempts` is 0."""
+        self.queue: str = config.get("worker.in_queue")
+        self.max_attempts: int = config.get("retry.max_attempts", 0)
+        self.delay: float = config.get("retry.delay", 1)
+        self.multiplier: float = config.get("retry.multiplier", 2)
+        self.max_delay: float = config.get("retry.max_delay", 300)
+        self.dead_letter_queue: str = config.get("retry.dead_letter_queue", f"{self.queue}.dead-letter")
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def delay_queue(self, attempt: int) -> str:
+        """Return name of delay queue for retry number `attempt` counted from 0."""
+        return f"{self.queue}.delay.{self.ttl(attempt)}"
+
+    def ttl(self, attempt: int) -> int:
+        """Return delay of retry number `attempt` in milliseconds."""
+        return int(min(self.delay * self.multiplier ** attempt, self.max_delay) * 1000)
+
+    def declare(self, channel: "BlockingChannel") -> None:
+        """Create delay queues and dead-letter queue."""
+        if not self.max_attempts:
+            return
+
+        for ttl in sorted({self.ttl(attempt) for attempt in range(self.max_attempts)}):
+            channel.queue_declare(
+                queue=f"{self.queue}.delay.{ttl}",
+                durable=True,
+                arguments={  # type: ignore[arg-type]
+                    "x-message-ttl": ttl,
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.queue,
+                },
+            )
+        channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+
+    def schedule(self, channel: "BlockingChannel", props: "BasicProperties", body: bytes, exc: Exception) -> bool:
+        """Publish failed message to delay queue, return `False` if failure has to be reported.
+
+        Messages failed with permanent error are not retried, exhausted ones are moved to dead-letter queue.
+        """
+        if not self.max_attempts or not is_transient(exc):
+            return False
+
+        attempt = int((props.headers or {}).get(ATTEMPT_HEADER, 0))
+        if attempt >= self.max_attempts:
+            self.logger.error("Giving up after %s retries, moving message to `%s`", attempt, self.dead_letter_queue)
+            self.publish(channel, self.dead_letter_queue, props, body, {ERROR_HEADER: str(exc)})
+            count_retry("exhausted")
+            return False
+
+        self.logger.warning("Retry %s of %s in %s ms", attempt + 1, self.max_attempts, self.ttl(attempt))
+        headers = {ATTEMPT_HEADER: attempt + 1, ERROR_HEADER: str(exc)}
+        self.publish(channel, self.delay_queue(attempt), props, body, headers)
+        count_retry("scheduled")
+        return True
+
+    @staticmethod
+    def publish(
+        channel: "BlockingChannel",
+        queue: str,
+        props: "BasicProperties",
+        body: bytes,
+        headers: Dict[str, Any],
+    ) -> None:
+        """Publish copy of message with extra `headers`."""
+        channel.basic_publish(
+            exchange="",
+            routing_key=queue,
+            body=body,
+            properties=pika.BasicProperties(**{
+                **vars(props),
+                "delivery_mode": 2,  # make message persistent
+                "headers": {**(props.headers or {}), **headers},
+            }),
+        )
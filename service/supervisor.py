@@ -0,0 +1,228 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Supervisor growing and shrinking the pool of `Worker` processes with the load."""
+from multiprocessing import active_children
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TYPE_CHECKING,
+)
+import logging
+import signal
+import time
+
+from pika import BlockingConnection
+from pika.adapters.blocking_connection import BlockingChannel
+from pika.exceptions import AMQPError
+
+from service.affinity import Affinity
+from service.heartbeat import (
+    get_workers_state,
+    HeartbeatSlot,
+)
+from service.utils import get_connection_parameters
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from service.config import Config
+    from service.worker import Worker
+
+
+class ScalingPolicy:
+    """Decide pool size from worker utilisation and input queue backlog.
+
+    Separate scale up and scale down thresholds and a cooldown after every change prevent flapping.
+    """
+
+    def __init__(self, config: "Config") -> None:
+        """Read bounds and thresholds from `supervisor` section of config, pool size is fixed by default."""
+        concurency = config.get("concurency")
+        self.min_workers: int = config.get("supervisor.min_workers", concurency)
+        self.max_workers: int = config.get("supervisor.max_workers", concurency)
+        self.scale_up: float = config.get("supervisor.scale_up_utilisation", 0.8)
+        self.scale_down: float = config.get("supervisor.scale_down_utilisation", 0.3)
+        self.backlog: int = config.get("supervisor.backlog_per_worker", 2)
+        self.cooldown: float = config.get("supervisor.cooldown", 60)
+        self.changed_at = float("-inf")
+
+    def pressure(self, size: int, utilisation: float, depth: Optional[int]) -> int:
+        """Return +1 if pool is overloaded, -1 if it is idle, 0 otherwise."""
+        if utilisation >= self.scale_up or (depth is not None and depth > self.backlog * size):
+            return 1
+        if utilisation <= self.scale_down and depth == 0:
+            return -1
+
+        return 0
+
+    def decide(self, size: int, utilisation: float, depth: Optional[int], now: float) -> int:
+        """Return target pool size, `depth` is `None` if input queue depth is unknown."""
+        if now - self.changed_at < self.cooldown:
+            return max(self.min_workers, min(size, self.max_workers))
+
+        target = max(self.min_workers, min(size + self.pressure(size, utilisation, depth), self.max_workers))
+        if target != size:
+            self.changed_at = now
+
+        return target
+
+
+class QueueProbe:
+    """Read total depth of queues over own RabbitMQ connection, reconnect after failure."""
+
+    def __init__(self, queues: List[str]) -> None:
+        """Initialize probe, connection is opened lazily."""
+        self.queues = queues
+        self.channel: Optional[BlockingChannel] = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def depth(self) -> Optional[int]:
+        """Return number of ready messages in queues or `None` if broker is not available."""
+        try:
+            if self.channel is None:
+                self.channel = BlockingConnection(parameters=get_connection_parameters()).channel()
+
+            frames = [self.channel.queue_declare(queue=queue, passive=True) for queue in self.queues]
+            return sum(frame.method.message_count or 0 for frame in frames)
+        except AMQPError as exc:
+            self.logger.warning("Cannot read depth of `%s`: %s", ", ".join(self.queues), exc)
+            self.channel = None
+            return None
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep and keep connection alive."""
+        if self.channel is None:
+            time.sleep(seconds)
+        else:
+            self.channel.connection.sleep(seconds)
+
+
+class Supervisor:
+    """Keep between `min_workers` and `max_workers` worker processes, one per heartbeat slot."""
+
+    def __init__(self, config: "Config", factory: Callable[[int], "Worker"]) -> None:
+        """Initialize supervisor with `factory` creating worker for heartbeat slot index."""
+        self.factory = factory
+        self.policy = ScalingPolicy(config)
+        # with template affinity the backlog waits in shard queues
+        self.probe = QueueProbe([config.get("worker.in_queue"), *Affinity(config).queues])
+        self.interval: float = config.get("supervisor.interval", 10)
+        self.shutdown_timeout: float = config.get(
+            "supervisor.shutdown_timeout",
+            config.get("worker.drain_timeout", 30) + 10,
+        )
+        self.workers: Dict[int, "Worker"] = {}
+        self.retiring: Dict[int, "Worker"] = {}
+        self.samples: Dict[int, List[float]] = {}
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def spawn(self, count: int) -> None:
+        """Start `count` workers in free slots."""
+        free = [index for index in range(self.policy.max_workers) if index not in {**self.workers, **self.retiring}]
+
+        for index in free[:count]:
+            self.workers[index] = self.factory(index)
+            self.workers[index].start()
+
+    def retire(self, count: int, slots: List[Dict[str, Any]]) -> None:
+        """Ask `count` workers to drain and exit, idle workers with highest slot index first."""
+        busy = {slot["pid"] for slot in slots if slot["in_flight"]}
+        candidates = sorted(self.workers, key=lambda index: (self.workers[index].pid in busy, -index))
+
+        for index in candidates[:count]:
+            self.retiring[index] = self.workers.pop(index)
+            self.retiring[index].terminate()
+
+    def reap(self) -> None:
+        """Collect exited workers and free their heartbeat slots."""
+        for pool in (self.workers, self.retiring):
+            for index, worker in list(pool.items()):
+                if not worker.is_alive():
+                    worker.join()
+                    HeartbeatSlot(index).clear()
+                    del pool[index]
+                    self.logger.info("Worker %s in slot %s exited with %s", worker.pid, index, worker.exitcode)
+
+    def utilisation(self, slots: List[Dict[str, Any]], now: float) -> float:
+        """Return average busy fraction of workers since previous call, relative to capacity of each worker."""
+        samples = {}
+        fractions = []
+
+        for slot in slots:
+            busy = slot["busy"] + slot["in_flight"] * (now - slot["heartbeat_at"])
+            samples[slot["pid"]] = [busy, now]
+            if slot["pid"] in self.samples:
+                previous_busy, previous_now = self.samples[slot["pid"]]
+                capacity = max(slot["capacity"], 1) * max(now - previous_now, 1e-9)
+                fractions.append(min(1.0, (busy - previous_busy) / capacity))
+
+        self.samples = samples
+        return sum(fractions) / len(fractions) if fractions else 0.0
+
+    def tick(self) -> None:
+        """Reap exited workers and resize pool."""
+        self.reap()
+        now = time.time()
+        slots = [slot for slot in get_workers_state() if slot["pid"] in {w.pid for w in self.workers.values()}]
+        size = len(self.workers)
+        target = self.policy.decide(size, self.utilisation(slots, now), self.probe.depth(), time.monotonic())
+
+        if target != size:
+            self.logger.info("Resizing worker pool from %s to %s", size, target)
+        if target > size:
+            self.spawn(target - size)
+        elif target < size:
+            self.retire(size - target, slots)
+
+    def on_terminate(self, *_: Any) -> None:
+        """Leave supervision loop, pool is shut down on the way out."""
+        self.logger.info("Received SIGTERM")
+        raise SystemExit(0)
+
+    def shutdown(self) -> None:
+        """Drain all workers, kill the ones still running after `shutdown_timeout` seconds."""
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        workers = active_children()
+        self.logger.info("Shutting down %s workers", len(workers))
+
+        for worker in workers:
+            worker.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                self.logger.warning("Worker %s did not drain in time, killing it", worker.pid)
+                worker.kill()
+                worker.join()
+
+    def run(self) -> None:
+        """Start minimal pool and supervise it until `SIGTERM`."""
+        signal.signal(signal.SIGTERM, self.on_terminate)
+        try:
+            self.spawn(self.policy.min_workers)
+
+            while True:
+                self.probe.sleep(self.interval)
+                self.tick()
+        finally:
+            self.shutdown()
@@ -0,0 +1,124 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Cache of unpacked template archives shared by `Worker` processes of a pod.
+
+Every archive is fetched once. The first process takes exclusive `fcntl` lock of the cache entry, prepares it in
+staging directory and publishes it with atomic rename. Other processes wait for the lock and reuse the entry.
+"""
+from typing import Callable
+import errno
+import fcntl
+import logging
+import os
+import shutil
+import time
+
+from service.metrics import count_template_cache
+
+
+def link_or_copy(source: str, destination: str) -> None:
+    """Hard link `source` to `destination`, copy it if they are on different filesystems."""
+    try:
+        os.link(source, destination)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        shutil.copy2(source, destination)
+
+
+class TemplateCache:
+    """Directory of unpacked template archives, entries are refetched after `ttl` seconds."""
+
+    def __init__(self, directory: str, ttl: float) -> None:
+        """Initialize cache in `directory`, it is created on first use."""
+        self.directory = directory
+        self.ttl = ttl
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def is_fresh(self, entry: str) -> bool:
+        """Return whether `entry` is published and not expired."""
+        try:
+            age = time.time() - os.stat(entry).st_mtime
+        except FileNotFoundError:
+            return False
+
+        return age < self.ttl
+
+    def populate(self, path: str, filename: str, fetch: Callable[[str], None]) -> None:
+        """Link templates of `filename` to `path`, `fetch` prepares them in given directory on cache miss.
+
+        Entry is read under shared lock, so it is not replaced while it is linked.
+        """
+        entry = os.path.join(self.directory, filename)
+        os.makedirs(self.directory, exist_ok=True)
+
+        with open(f"{entry}.lock", "a", encoding="utf8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            if self.is_fresh(entry):
+                count_template_cache("hit")
+            else:
+                # lock is released while it is upgraded, entry is checked again by `refresh()`
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self.refresh(entry, fetch)
+                fcntl.flock(lock, fcntl.LOCK_SH)
+
+            shutil.copytree(entry, path, symlinks=True, copy_function=link_or_copy, dirs_exist_ok=True)
+
+    def refresh(self, entry: str, fetch: Callable[[str], None]) -> None:
+        """Fetch and publish `entry` under exclusive lock, unless other process did it while this one waited."""
+        if self.is_fresh(entry):
+            count_template_cache("wait")
+            return
+
+        count_template_cache("miss")
+        self.logger.info("Fetching template cache entry `%s`", entry)
+        staging = f"{entry}.staging"
+        # left by process killed while fetching
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        fetch(staging)
+        os.utime(staging)
+
+        # no process reads expired entry while lock is exclusive
+        shutil.rmtree(entry, ignore_errors=True)
+        os.rename(staging, entry)
+
+    def reap(self) -> None:
+        """Remove expired entries, they are fetched again when their archive is requested."""
+        if not os.path.isdir(self.directory):
+            return
+
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if not name.endswith((".lock", ".staging")) and not self.is_fresh(entry):
+                self.reap_entry(entry)
+
+    def reap_entry(self, entry: str) -> None:
+        """Remove expired `entry` unless other process is linking or refreshing it."""
+        with open(f"{entry}.lock", "a", encoding="utf8") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            # entry could have been refreshed before the lock was taken
+            if not self.is_fresh(entry):
+                self.logger.info("Removing expired template cache entry `%s`", entry)
+                shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,85 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Threaded handler mode: run `h_request` in a thread pool while the consumer thread owns the connection."""
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Optional,
+)
+
+from pika.adapters.blocking_connection import BlockingChannel
+
+
+class ThreadsafeChannel:
+    """Part of `BlockingChannel` API used by handlers, calls are run later on the connection thread.
+
+    Calls keep their order, so status messages are published before the input message is acknowledged.
+    """
+
+    def __init__(self, channel: BlockingChannel) -> None:
+        """Wrap `channel` owned by the consumer thread."""
+        self.channel = channel
+
+    def basic_publish(self, *args: Any, **kwargs: Any) -> None:
+        """Publish message from connection thread."""
+        self.channel.connection.add_callback_threadsafe(partial(self.channel.basic_publish, *args, **kwargs))
+
+    def basic_ack(self, *args: Any, **kwargs: Any) -> None:
+        """Acknowledge message from connection thread."""
+        self.channel.connection.add_callback_threadsafe(partial(self.channel.basic_ack, *args, **kwargs))
+
+    def basic_nack(self, *args: Any, **kwargs: Any) -> None:
+        """Reject message from connection thread."""
+        self.channel.connection.add_callback_threadsafe(partial(self.channel.basic_nack, *args, **kwargs))
+
+
+class ThreadedDispatcher:
+    """Run tasks in bounded thread pool and report their completion on the connection thread."""
+
+    def __init__(self, threads: int) -> None:
+        """Initialize dispatcher, pool threads are started on demand."""
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="handler")
+        self.pending = 0
+
+    def submit(
+        self,
+        channel: BlockingChannel,
+        task: Callable[[BlockingChannel], None],
+        done: Callable[[], None],
+    ) -> None:
+        """Run `task` with thread-safe channel in pool, call `done` on connection thread once it finished."""
+        self.pending += 1
+        future = self.executor.submit(task, cast(BlockingChannel, ThreadsafeChannel(channel)))
+        future.add_done_callback(
+            lambda future: channel.connection.add_callback_threadsafe(
+                partial(self.finished, future.exception(), done),
+            ),
+        )
+
+    def finished(self, error: Optional[BaseException], done: Callable[[], None]) -> None:
+        """Account finished task and re-raise its exception on connection thread as synchronous mode does."""
+        self.pending -= 1
+        done()
+        if error is not None:
+            raise error
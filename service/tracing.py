@@ -0,0 +1,189 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Lightweight request tracing with W3C `traceparent` propagation and pluggable span exporters."""
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    Mapping,
+    Optional,
+    Tuple,
+)
+import json
+import os
+import sys
+import time
+
+
+TRACEPARENT_HEADER = "traceparent"
+
+SpanContext = Tuple[str, str]
+
+
+class Span:
+    """Single timed operation of a trace."""
+
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"] = None, parent_id: str = "") -> None:
+        """Start span."""
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.parent_id = parent.span_id if parent is not None else parent_id
+        self.attributes: Dict[str, Any] = {}
+        self.start = time.time()
+        self.end: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return span representation for exporters."""
+        end = self.end if self.end is not None else time.time()
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": end,
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter(ABC):
+    """Base class for span exporters."""
+
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        """Export finished span."""
+
+
+class NullSpanExporter(SpanExporter):
+    """Drop all spans, tracing is disabled."""
+
+    def export(self, span: Span) -> None:
+        """Do nothing."""
+
+
+class StdoutSpanExporter(SpanExporter):
+    """Write spans to stdout as JSON lines."""
+
+    def export(self, span: Span) -> None:
+        """Write `span` to stdout."""
+        sys.stdout.write(json.dumps(span.to_dict()) + "\n")
+        sys.stdout.flush()
+
+
+class FileSpanExporter(SpanExporter):
+    """Append spans to local file as JSON lines."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Initialize exporter with file path, `TRACING_FILE` is used by default."""
+        self.path = path or os.environ.get("TRACING_FILE", "spans.jsonl")
+
+    def export(self, span: Span) -> None:
+        """Append `span` to file."""
+        with open(self.path, "a", encoding="utf8") as out_file:
+            out_file.write(json.dumps(span.to_dict()) + "\n")
+
+
+def get_exporter(key: str) -> SpanExporter:
+    """Get span exporter based on config."""
+    return {"none": NullSpanExporter, "stdout": StdoutSpanExporter, "file": FileSpanExporter}[key]()
+
+
+def inject(span: Span) -> Dict[str, str]:
+    """Return headers which carry trace context of `span`."""
+    return {TRACEPARENT_HEADER: f"00-{span.trace_id}-{span.span_id}-01"}
+
+
+def extract(headers: Optional[Mapping[str, Any]]) -> Optional[SpanContext]:
+    """Return trace context `(trace_id, span_id)` from headers, if it is present and valid."""
+    parts = str((headers or {}).get(TRACEPARENT_HEADER, "")).split("-")
+
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+
+    return parts[1], parts[2]
+
+
+class Tracer:
+    """Create spans and send finished ones to exporter."""
+
+    def __init__(self, exporter: SpanExporter) -> None:
+        """Initialize tracer with exporter."""
+        self.exporter = exporter
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+    @property
+    def current_span(self) -> Optional[Span]:
+        """Return active span."""
+        return self._current.get()
+
+    def start_span(self, name: str, context: Optional[SpanContext] = None) -> Span:
+        """Start span as child of active span, remote `context` or as a root of new trace."""
+        parent = self.current_span
+
+        if parent is not None:
+            return Span(name, parent.trace_id, parent=parent)
+
+        if context is not None:
+            return Span(name, context[0], parent_id=context[1])
+
+        return Span(name, os.urandom(16).hex())
+
+    def end_span(self, span: Span, error: Optional[str] = None) -> None:
+        """Finish `span` and export it."""
+        if error is not None:
+            span.attributes["error"] = error
+
+        span.end = time.time()
+        self.exporter.export(span)
+
+    @contextmanager
+    def activate(self, span: Span) -> Iterator[Span]:
+        """Make `span` active without finishing it."""
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            self._current.reset(token)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        """Start child span of active span and finish it on exit."""
+        span = self.start_span(name)
+        error = None
+        try:
+            with self.activate(span):
+                yield span
+        except Exception as exc:
+            error = str(exc)
+            raise
+        finally:
+            self.end_span(span, error)
+
+
+tracer = Tracer(get_exporter(os.environ.get("TRACING_EXPORTER", "none")))
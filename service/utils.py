@@ -19,14 +19,45 @@
 
 """Module with utility functions."""
 from datetime import datetime
+from importlib.util import (
+    find_spec,
+    LazyLoader,
+    module_from_spec,
+)
+from types import ModuleType
 from typing import TYPE_CHECKING
 import os
+import sys
 
 
 if TYPE_CHECKING:  # pragma: no cover
+    from pika import ConnectionParameters
+
     from service.config import Config
 
 
+def lazy_import(name: str) -> ModuleType:
+    """Return module `name`, executed on first attribute access if it is not imported yet.
+
+    Keeps heavy dependencies out of processes which never use them, e.g. boto3 out of the Flask app.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named `{name}`", name=name)
+
+    spec.loader = LazyLoader(spec.loader)
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+pika = lazy_import("pika")
+
+
 def get_utc_timestamp_ms() -> int:
     """Return UTC timestamp in milliseconds."""
     return int(datetime.utcnow().timestamp() * 1000)
@@ -42,3 +73,14 @@ def create_dirs_from_envs(config: "Config") -> None:
 
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
+
+
+def get_connection_parameters() -> "ConnectionParameters":
+    """Return RabbitMQ connection parameters from environment variables."""
+    parameters: "ConnectionParameters" = pika.ConnectionParameters(
+        host=os.environ.get("RABBITMQ_HOST", "localhost"),
+        port=int(os.environ.get("RABBITMQ_PORT", 5672)),
+        connection_attempts=int(os.environ.get("RABBITMQ_CONNECTION_ATTEMPTS", 5)),
+        retry_delay=int(os.environ.get("RABBITMQ_RETRY_DELAY", 5)),
+    )
+    return parameters
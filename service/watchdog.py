@@ -0,0 +1,106 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Reply timeout watchdog: fail tickets whose BundleGen reply never comes, e.g. because BundleGen crashed."""
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
+import heapq
+import logging
+import shutil
+import threading
+import time
+
+
+if TYPE_CHECKING:  # pragma: no cover
+    from service.config import Config
+
+
+class Watchdog:
+    """Reply deadlines of outstanding tickets in a heap, disabled while no timeout is configured.
+
+    Reply timeout is `watchdog.timeouts` entry of ticket platform (`watchdog.platform_field` field of BundleGen ticket),
+    or `watchdog.timeout` seconds. Heap entries of replied tickets are dropped once they come to the top.
+    Searchpaths of expired tickets are removed in background thread, so slow store does not block consume loop.
+    """
+
+    def __init__(self, config: "Config") -> None:
+        """Read timeouts from `watchdog` section of config."""
+        self.timeout = float(config.get("watchdog.timeout", 0))
+        self.timeouts: Dict[str, float] = config.get("watchdog.timeouts", None) or {}
+        self.field: str = config.get("watchdog.platform_field", "platform")
+        self.interval = float(config.get("watchdog.interval", 5))
+        self.heap: List[Tuple[float, str]] = []
+        # searchpath of every tracked ticket waiting for reply
+        self.searchpaths: Dict[str, str] = {}
+        # tickets are tracked from handler threads in threaded mode
+        self.lock = threading.Lock()
+        self.cleaner: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def enabled(self) -> bool:
+        """Check whether any timeout is configured."""
+        return bool(self.timeout or self.timeouts)
+
+    def track(self, msg: Dict[str, Any]) -> None:
+        """Start reply timeout of BundleGen ticket `msg`."""
+        timeout = float(self.timeouts.get(str(msg.get(self.field)), self.timeout))
+        if not timeout:
+            return
+
+        with self.lock:
+            heapq.heappush(self.heap, (time.monotonic() + timeout, msg["uuid"]))
+            self.searchpaths[msg["uuid"]] = msg.get("searchpath", "")
+
+    def release(self, uuid: str) -> None:
+        """Stop reply timeout of replied ticket `uuid`."""
+        with self.lock:
+            self.searchpaths.pop(uuid, None)
+
+    def expired(self) -> List[str]:
+        """Return tickets whose reply timed out and start removal of their searchpaths, they are not tracked anymore."""
+        now = time.monotonic()
+        expired = {}
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, uuid = heapq.heappop(self.heap)
+                if uuid in self.searchpaths:
+                    expired[uuid] = self.searchpaths.pop(uuid)
+
+        for uuid in expired:
+            self.logger.warning("BundleGen did not reply to ticket `%s` in time", uuid)
+
+        searchpaths = [searchpath for searchpath in expired.values() if searchpath]
+        if searchpaths:
+            self.cleaner = threading.Thread(target=self.remove, args=(searchpaths,), name="watchdog", daemon=True)
+            self.cleaner.start()
+
+        return list(expired)
+
+    @staticmethod
+    def remove(searchpaths: List[str]) -> None:
+        """Remove searchpaths of expired tickets."""
+        for searchpath in searchpaths:
+            shutil.rmtree(searchpath, ignore_errors=True)
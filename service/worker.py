@@ -18,14 +18,24 @@
 #
 
 """Worker process class, responsible for translating RabbitMQ messages from ABS to BundleGen."""
+from functools import partial
 from multiprocessing import Process
-from typing import TYPE_CHECKING
+from typing import (
+    Any,
+    Callable,
+    List,
+    Optional,
+    TYPE_CHECKING,
+)
+import gc
 import logging
 import os
+import signal
+import time
 
 from pika import (
+    BasicProperties,
     BlockingConnection,
-    ConnectionParameters,
 )
 from pika.adapters.blocking_connection import BlockingChannel
 from pika.exceptions import (
@@ -33,16 +43,37 @@ from pika.exceptions import (
     AMQPConnectionError,
     ConnectionClosedByBroker,
 )
+from pika.spec import Basic
 
+from service.backpressure import Backpressure
 from service.config import Config
-from service.downloaders import S3Downloader
+from service.downloaders import (
+    preload as preload_boto3,
+    S3Downloader,
+)
 from service.file_structures import BundleGenFileStructure
 from service.formatter import BundleGenFormatter
 from service.handlers import BundleGenHandler
-from service.utils import create_dirs_from_envs
+from service.heartbeat import (
+    create_slots,
+    HeartbeatSlot,
+)
+from service.logging_config import (
+    configure_logging,
+    flush_logging,
+)
+from service.metrics import observe_startup
+from service.profiling import install as install_profiling
+from service.supervisor import Supervisor
+from service.threaded import ThreadedDispatcher
+from service.utils import (
+    create_dirs_from_envs,
+    get_connection_parameters,
+)
 
 
 if TYPE_CHECKING:  # pragma: no cover
+    from service.batching import Delivery
     from service.handlers import Handler
 
 
@@ -52,21 +83,28 @@ class Worker(Process):
     Transfrom to BundleGen format, send to `worker.out_queue`.
     """
 
-    def __init__(self, config: Config, handler: "Handler") -> None:
-        """Initialize worker instance with config, formatter and downloader."""
+    def __init__(self, config: Config, handler: "Handler", heartbeat: HeartbeatSlot) -> None:
+        """Initialize worker instance with config, handler and heartbeat slot."""
         super().__init__()
         self.config = config
         self.handler = handler
+        self.heartbeat = heartbeat
+        self.backpressure = Backpressure(config)
+        self.consumer_tags: List[str] = []
+        self.channel: Optional[BlockingChannel] = None
+        self.drain_deadline: Optional[float] = None
+        # cleared once first message is handled, monotonic clock is shared by parent and forked process
+        self.spawned_at: Optional[float] = time.monotonic()
+        self.dispatcher = (
+            ThreadedDispatcher(config.get("worker.threads", 4))
+            if config.get("worker.mode", "process") == "threaded"
+            else None
+        )
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def initialize_channel(self) -> BlockingChannel:
         """Initialize connection to RabbitMQ and return communication channel."""
-        params = ConnectionParameters(
-            host=os.environ.get("RABBITMQ_HOST", "localhost"),
-            port=int(os.environ.get("RABBITMQ_PORT", 5672)),
-            connection_attempts=int(os.environ.get("RABBITMQ_CONNECTION_ATTEMPTS", 5)),
-            retry_delay=int(os.environ.get("RABBITMQ_RETRY_DELAY", 5)),  # type: ignore[arg-type]
-        )
+        params = get_connection_parameters()
         connection = BlockingConnection(parameters=params)
 
         self.logger.debug("Initialize channel with and params=`%s`", params)
@@ -74,34 +112,226 @@ class Worker(Process):
         return connection.channel()
 
     def queues_declare(self, channel: BlockingChannel) -> None:
-        """Create a queue if queue doesn't exist."""
-        channel.queue_declare(queue=self.config.get("worker.in_queue"), durable=True)
-        channel.queue_declare(queue=self.config.get("worker.out_queue"), durable=True)
+        """Create a queue if queue doesn't exist, input and BundleGen queues are priority queues if configured."""
+        max_priority = self.config.get("worker.max_priority", 0)
+        arguments = {"x-max-priority": max_priority} if max_priority else None
+
+        for queue in ("worker.in_queue", "worker.out_queue"):
+            channel.queue_declare(
+                queue=self.config.get(queue),
+                durable=True,
+                arguments=arguments,  # type: ignore[arg-type]
+            )
         channel.queue_declare(queue=self.config.get("worker.status_queue"), durable=True)
+        self.handler.retry.declare(channel)
+        self.handler.affinity.declare(channel, arguments)
+
+    @property
+    def pending(self) -> int:
+        """Number of input messages handled in pool threads."""
+        return self.dispatcher.pending if self.dispatcher is not None else 0
+
+    def on_request(self, channel: BlockingChannel, method: Basic.Deliver, props: BasicProperties, body: bytes) -> None:
+        """Handle input message, collect it into batch first if batching is enabled."""
+        batch = self.handler.batch
+        if not batch.enabled:
+            self.dispatch(channel, [(method, props, body)])
+            return
+
+        if batch.add((method, props, body)):
+            batch.timer = channel.connection.call_later(batch.window, lambda: self.flush(channel))
+        if batch.full:
+            self.flush(channel)
+
+    def flush(self, channel: BlockingChannel) -> None:
+        """Close batch window and handle collected input messages."""
+        batch = self.handler.batch
+        if batch.timer is not None:
+            channel.connection.remove_timeout(batch.timer)
+        deliveries = batch.take()
+        if deliveries:
+            self.dispatch(channel, deliveries)
+
+    def dispatch(self, channel: BlockingChannel, deliveries: List["Delivery"]) -> None:
+        """Handle input messages, in pool thread in threaded mode, and track them in heartbeat slot.
+
+        Batch is tracked as single message, its handling time is counted in `busy` seconds once.
+        """
+        self.heartbeat.message_started()
+        if self.dispatcher is not None:
+            self.dispatcher.submit(
+                channel,
+                lambda proxy: self.handle(proxy, deliveries),
+                lambda: self.on_request_done(channel),
+            )
+            return
 
-    def run(self) -> None:
-        """Process all messages from ABS to BundleGen."""
         try:
-            self.logger.info("Trying to connect to RabbitMQ...")
+            self.handle(channel, deliveries)
+        finally:
+            self.on_request_done(channel)
 
-            channel = self.initialize_channel()
+    def handle(self, channel: BlockingChannel, deliveries: List["Delivery"]) -> None:
+        """Pass single input message to `h_request`, batch to `h_batch`."""
+        if len(deliveries) == 1:
+            self.handler.h_request(channel, *deliveries[0])
+        else:
+            self.handler.h_batch(channel, deliveries)
 
-            self.queues_declare(channel)
+    def on_route(self, channel: BlockingChannel, method: Basic.Deliver, props: BasicProperties, body: bytes) -> None:
+        """Move input message to shard queue of its template archive."""
+        self.handler.affinity.route(channel, self.handler.affinity_key(body, props), props, body)
+        channel.basic_ack(delivery_tag=method.delivery_tag)  # type: ignore[arg-type]
 
-            # start consuming from multiple queues
+    def on_request_done(self, channel: BlockingChannel) -> None:
+        """Track handled input message, called on connection thread."""
+        self.heartbeat.message_finished()
+        self.regulate(channel)
+        if self.spawned_at is not None:
+            observe_startup("first_message", time.monotonic() - self.spawned_at)
+            self.spawned_at = None
+
+    def on_response(self, channel: BlockingChannel, method: Basic.Deliver, props: BasicProperties, body: bytes) -> None:
+        """Handle BundleGen reply, resume input as soon as enough replies arrived."""
+        try:
+            self.handler.h_response(channel, method, props, body)
+        finally:
+            self.regulate(channel)
+
+    def beat(self, connection: BlockingConnection) -> None:
+        """Update heartbeat slot and schedule next beat from consume loop."""
+        self.heartbeat.update()
+        connection.call_later(float(os.environ.get("HEARTBEAT_INTERVAL", 5)), lambda: self.beat(connection))
+
+    def subscribe(self, channel: BlockingChannel) -> None:
+        """Start consuming from input queue, with template affinity input is routed to shard queues consumed too."""
+        self.consumer_tags = [
             channel.basic_consume(
                 queue=self.config.get("worker.in_queue"),
-                on_message_callback=self.handler.h_request,
+                on_message_callback=self.on_route if self.handler.affinity.enabled else self.on_request,
+            ),
+            *self.handler.affinity.subscribe(channel, self.on_request),
+        ]
+
+    def unsubscribe(self, channel: BlockingChannel) -> None:
+        """Stop consuming from input and shard queues."""
+        for consumer_tag in self.consumer_tags:
+            channel.basic_cancel(consumer_tag)
+        self.consumer_tags = []
+
+    def regulate(self, channel: BlockingChannel) -> None:
+        """Pause or resume consuming from input queue when backpressure state changes."""
+        self.backpressure.disk_full = self.handler.disk.full()
+        if not self.backpressure.update(self.handler.outstanding) or self.drain_deadline is not None:
+            return
+
+        if self.backpressure.paused:
+            self.logger.warning(
+                "BundleGen is behind or disk is full (queue depth %s, outstanding replies %s, disk usage %s%%), "
+                "pausing input",
+                self.backpressure.queue_depth,
+                self.handler.outstanding,
+                self.handler.disk.usage,
             )
-            channel.basic_consume(
-                queue="amq.rabbitmq.reply-to",
-                on_message_callback=self.handler.h_response,
-                auto_ack=True,
+            self.unsubscribe(channel)
+        else:
+            self.logger.info("BundleGen caught up and store volumes have space, resuming input")
+            self.subscribe(channel)
+
+    def watch(self, channel: BlockingChannel) -> None:
+        """Poll depth of BundleGen queue and schedule next poll from consume loop."""
+        frame = channel.queue_declare(queue=self.config.get("worker.out_queue"), passive=True)
+        self.backpressure.queue_depth = frame.method.message_count or 0
+        self.regulate(channel)
+        channel.connection.call_later(self.backpressure.interval, lambda: self.watch(channel))
+
+    def expire(self, channel: BlockingChannel) -> None:
+        """Fail tickets whose BundleGen reply timed out and schedule next check from consume loop."""
+        uuids = self.handler.watchdog.expired()
+        if uuids:
+            self.handler.abort_outstanding(channel, "BundleGen did not reply in time", uuids)
+            self.regulate(channel)
+        channel.connection.call_later(self.handler.watchdog.interval, lambda: self.expire(channel))
+
+    def call_threadsafe(self, callback: Callable[[], None]) -> None:
+        """Run `callback` from consume loop, it is safe to call from signal handler and dropped before connecting."""
+        if self.channel is not None:
+            self.channel.connection.add_callback_threadsafe(callback)
+
+    def on_terminate(self, *_: Any) -> None:
+        """Start draining from consume loop, channel must not be used from signal handler directly."""
+        channel = self.channel
+        if channel is None:
+            raise SystemExit(0)
+
+        channel.connection.add_callback_threadsafe(lambda: self.drain(channel))
+
+    def drain(self, channel: BlockingChannel) -> None:
+        """Stop taking requests, wait for requests in pool threads and outstanding BundleGen replies.
+
+        Waits at most `worker.drain_timeout` seconds, unacknowledged requests are redelivered to other workers.
+        """
+        if self.drain_deadline is None:
+            self.drain_deadline = time.monotonic() + float(self.config.get("worker.drain_timeout", 30))
+            self.logger.info(
+                "Draining, waiting for %s requests and %s outstanding replies",
+                self.pending,
+                self.handler.outstanding,
             )
+            self.unsubscribe(channel)
+            self.flush(channel)
+
+        if not self.handler.outstanding and not self.pending:
+            channel.stop_consuming()
+        elif time.monotonic() < self.drain_deadline:
+            channel.connection.call_later(0.5, lambda: self.drain(channel))
+        else:
+            # replies to this connection are lost once it is closed, tell ABS instead of leaving tickets hanging
+            self.logger.warning("Drain timeout, aborting %s outstanding tickets", self.handler.outstanding)
+            self.handler.abort_outstanding(channel, "Worker shut down before BundleGen reply")
+            channel.stop_consuming()
 
-            self.logger.info("Connected to RabbitMQ broker. Waiting for messages...")
+    def consume(self, channel: BlockingChannel) -> None:
+        """Subscribe handler to input and reply-to queues and run consume loop until worker is drained."""
+        self.channel = channel
+        # without prefetch limit broker pushes whole queue to consumer and priorities have no effect,
+        # in threaded mode it also bounds number of requests waiting for pool thread
+        prefetch_count = self.config.get("worker.prefetch_count", self.dispatcher.threads if self.dispatcher else 0)
+        if prefetch_count:
+            channel.basic_qos(prefetch_count=prefetch_count)
 
-            channel.start_consuming()
+        # start consuming from multiple queues
+        self.subscribe(channel)
+        channel.basic_consume(
+            queue="amq.rabbitmq.reply-to",
+            on_message_callback=self.on_response,
+            auto_ack=True,
+        )
+
+        self.logger.info("Connected to RabbitMQ broker. Waiting for messages...")
+
+        self.heartbeat.set_connected(True)
+        if self.spawned_at is not None:
+            observe_startup("connected", time.monotonic() - self.spawned_at)
+        self.beat(channel.connection)
+        if self.backpressure.enabled or self.handler.disk.enabled:
+            self.watch(channel)
+        if self.handler.watchdog.enabled:
+            self.expire(channel)
+        channel.start_consuming()
+        # flush acks and status messages of drained worker before exit
+        channel.connection.close()
+
+    def run(self) -> None:
+        """Process all messages from ABS to BundleGen."""
+        self.started()
+        try:
+            self.logger.info("Trying to connect to RabbitMQ...")
+
+            channel = self.initialize_channel()
+
+            self.queues_declare(channel)
+            self.consume(channel)
         except ConnectionClosedByBroker as exc:
             self.logger.error("Connection was closed by broker: %s", exc)
             self.close()
@@ -111,29 +341,42 @@ class Worker(Process):
         except AMQPConnectionError as exc:
             self.logger.error("Lost connection to rabbitmq: %s", exc)
             self.close()
+        finally:
+            self.stopped()
+
+    def started(self) -> None:
+        """Occupy heartbeat slot and install signal handlers, `SIGTERM` drains worker."""
+        self.heartbeat.start(self.dispatcher.threads if self.dispatcher is not None else 1)
+        install_profiling(self.call_threadsafe)
+        signal.signal(signal.SIGTERM, self.on_terminate)
+
+    def stopped(self) -> None:
+        """Mark worker as disconnected and write queued logs, process exits without `atexit` hooks."""
+        self.heartbeat.set_connected(False)
+        flush_logging()
+
+
+def create_worker(config: Config, index: int) -> Worker:
+    """Create worker for heartbeat slot `index`, handler is prepared before fork so its pages are shared."""
+    formatter = BundleGenFormatter(config)
+    formatter.compile()
+    handler = BundleGenHandler(config, formatter, BundleGenFileStructure(config, S3Downloader(config)))
+    handler.preload()
+
+    return Worker(config, handler, HeartbeatSlot(index))
 
 
 def main() -> None:
-    """Run `concurency` number of Worker."""
+    """Run pool of Worker processes, `concurency` workers unless autoscaling is configured."""
+    configure_logging()
     config = Config(os.environ.get("BUNDLE_CONFIG_FILE", "config_dev.json"))
     create_dirs_from_envs(config)
-    workers = [
-        Worker(
-            config,
-            BundleGenHandler(
-                config,
-                BundleGenFormatter(config),
-                BundleGenFileStructure(config, S3Downloader(config)),
-            ),
-        )
-        for _ in range(config.get("concurency"))
-    ]
-
-    for worker in workers:
-        worker.start()
-
-    for worker in workers:
-        worker.join()
+    preload_boto3(config)
+    supervisor = Supervisor(config, partial(create_worker, config))
+    create_slots(supervisor.policy.max_workers)
+    # keep garbage collector of forked workers from writing to pages of preloaded objects
+    gc.freeze()
+    supervisor.run()
 
 
 if __name__ == "__main__":  # pragma: no cover
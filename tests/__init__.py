@@ -18,3 +18,23 @@
 #
 
 """Unit tests for `service` package."""
+from typing import Any
+from unittest import mock
+
+from service.handlers import BundleGenHandler
+
+
+POLICIES = ("RetryPolicy", "Affinity", "Batch", "RecentTickets", "DiskSpace", "Deadlines", "Watchdog")
+
+
+def get_handler(file_structure: Any, **policies: Any) -> BundleGenHandler:
+    """Create BundleGenHandler with mocked config, formatter and policies, `policies` are instances by class name."""
+    # by default tickets have no deadline, are not redelivered duplicates and disk has space
+    policies.setdefault("Deadlines", mock.MagicMock(**{"deadline.return_value": None, "expired.return_value": False}))
+    policies.setdefault("RecentTickets", mock.MagicMock(**{"seen.return_value": False}))
+    policies.setdefault("DiskSpace", mock.MagicMock(**{"admit.return_value": True}))
+    with mock.patch.multiple(
+        "service.handlers",
+        **{name: mock.MagicMock(name=name, return_value=policies.get(name, mock.MagicMock())) for name in POLICIES},
+    ):
+        return BundleGenHandler(mock.MagicMock(name="Config"), mock.MagicMock(name="Formatter"), file_structure)
@@ -0,0 +1,122 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for template affinity."""
+from collections import Counter
+from functools import partial
+from unittest import (
+    mock,
+    TestCase,
+)
+
+from service.affinity import (
+    Affinity,
+    stable_hash,
+)
+
+
+def make_affinity(shards: int, pod: str = "pod-a") -> Affinity:
+    """Return affinity of `pod` for input queue `in` with `shards` shard queues."""
+    config_mock = mock.MagicMock(name="Config")
+    config_mock.get.side_effect = {"worker.in_queue": "in", "affinity.shards": shards}.get
+    return Affinity(config_mock, pod)
+
+
+class TestAffinity(TestCase):
+    """Test cases for `Affinity` class."""
+
+    def test_disabled(self) -> None:
+        """Test affinity is disabled by default and has no shard queues."""
+        config_mock = mock.MagicMock(name="Config")
+        config_mock.get.side_effect = lambda key, default=None: default
+        channel_mock = mock.MagicMock(name="Channel")
+
+        with mock.patch("service.affinity.socket.gethostname", return_value="host"):
+            affinity = Affinity(config_mock)
+
+        self.assertFalse(affinity.enabled)
+        self.assertEqual(affinity.pod, "host")
+        self.assertListEqual(affinity.queues, [])
+        affinity.declare(channel_mock, None)
+        self.assertListEqual(affinity.subscribe(channel_mock, mock.MagicMock()), [])
+        channel_mock.queue_declare.assert_not_called()
+
+    def test_stable_hash(self) -> None:
+        """Test hash does not depend on process."""
+        self.assertEqual(stable_hash("rpi4_1.0.0_dac_configs.tgz"), 39219303)
+
+    def test_declare(self) -> None:
+        """Test shard queues are declared with arguments of input queue."""
+        affinity = make_affinity(2)
+        channel_mock = mock.MagicMock(name="Channel")
+
+        affinity.declare(channel_mock, {"x-max-priority": 10})
+
+        self.assertTrue(affinity.enabled)
+        self.assertListEqual(
+            channel_mock.queue_declare.call_args_list,
+            [
+                mock.call(queue="in.shard.0", durable=True, arguments={"x-max-priority": 10}),
+                mock.call(queue="in.shard.1", durable=True, arguments={"x-max-priority": 10}),
+            ],
+        )
+
+    def test_subscribe(self) -> None:
+        """Test all shard queues are consumed with priorities of the pod."""
+        affinity = make_affinity(3)
+        channel_mock = mock.MagicMock(name="Channel")
+        channel_mock.basic_consume.side_effect = ["tag0", "tag1", "tag2"]
+        on_message = mock.MagicMock(name="on_message")
+
+        self.assertListEqual(affinity.subscribe(channel_mock, on_message), ["tag0", "tag1", "tag2"])
+        for shard, call in enumerate(channel_mock.basic_consume.call_args_list):
+            self.assertEqual(
+                call,
+                mock.call(
+                    queue=f"in.shard.{shard}",
+                    on_message_callback=on_message,
+                    arguments={"x-priority": affinity.priority(shard)},
+                ),
+            )
+
+    def test_priority(self) -> None:
+        """Test every pod ranks highest for about the same number of shards."""
+        pods = [make_affinity(64, f"bundlegen-service-{index}") for index in range(4)]
+
+        owners = Counter(max(pods, key=partial(Affinity.priority, shard=shard)).pod for shard in range(64))
+
+        self.assertEqual(len(owners), 4)
+        self.assertLessEqual(max(owners.values()), 32)
+        for pod in pods:
+            for shard in range(64):
+                self.assertTrue(0 <= pod.priority(shard) < 2**15)
+
+    def test_route(self) -> None:
+        """Test message is published as it is to shard queue of its key."""
+        affinity = make_affinity(4)
+        channel_mock = mock.MagicMock(name="Channel")
+        props_mock = mock.MagicMock(name="Props")
+
+        affinity.route(channel_mock, "key", props_mock, b"body")
+        affinity.route(channel_mock, "key", props_mock, b"other")
+
+        first, second = channel_mock.basic_publish.call_args_list
+        queue = f"in.shard.{stable_hash('key') % 4}"
+        self.assertEqual(first, mock.call(exchange="", routing_key=queue, body=b"body", properties=props_mock))
+        self.assertEqual(second[1]["routing_key"], first[1]["routing_key"])
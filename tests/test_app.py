@@ -0,0 +1,167 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for monitoring endpoints of Flask app."""
+from unittest import (
+    mock,
+    TestCase,
+)
+import os
+import tempfile
+
+from prometheus_client import values
+
+from service.heartbeat import (
+    create_slots,
+    HeartbeatSlot,
+)
+from service.metrics import observe_stage
+
+
+# app configures logging of the whole process on import
+with mock.patch("service.logging_config.configure_logging"):
+    from service.app import app
+
+
+class TestApp(TestCase):
+    """Base TestCase for Flask app."""
+
+    def setUp(self) -> None:
+        """Set up test client and heartbeat file before each test."""
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.path = os.path.join(self.tmp_dir.name, "heartbeat")
+        env_patcher = mock.patch.dict("service.heartbeat.os.environ", {"HEARTBEAT_FILE": self.path})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        self.client = app.test_client()
+
+    def tearDown(self) -> None:
+        """Clean up env after each test."""
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def test_healthz(self) -> None:
+        """Test health stub."""
+        response = self.client.get("/healthz")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(as_text=True), "OK")
+
+    def test_info(self) -> None:
+        """Test info endpoint returns app info."""
+        response = self.client.get("/info")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertSetEqual(
+            set(response.json),  # type: ignore[arg-type]
+            {
+                "APP_START_TIME",
+                "HOST_NAME",
+                "APP_BRANCH",
+                "APP_NAME",
+                "APP_BUILD_TIME",
+                "APP_VERSION",
+                "STACK_NAME",
+                "APP_REVISION",
+            },
+        )
+
+    def test_probes_ready(self) -> None:
+        """Test probes succeed while worker is connected and its heartbeat is fresh."""
+        create_slots(1, self.path)
+        slot = HeartbeatSlot(0, self.path)
+        slot.start()
+        slot.set_connected(True)
+
+        for url, key in [("/readyz", "ready"), ("/livez", "live")]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.json[key])  # type: ignore[index]
+                self.assertEqual(response.json["workers"][0]["pid"], os.getpid())  # type: ignore[index]
+
+    def test_probes_stale(self) -> None:
+        """Test probes fail once heartbeat of worker is stale."""
+        create_slots(1, self.path)
+        slot = HeartbeatSlot(0, self.path)
+        slot.start()
+        slot.set_connected(True)
+
+        with mock.patch("service.heartbeat.time.time", return_value=10**10):
+            for url, key in [("/readyz", "ready"), ("/livez", "live")]:
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 503)
+                    self.assertFalse(response.json[key])  # type: ignore[index]
+                    self.assertFalse(response.json["workers"][0]["alive"])  # type: ignore[index]
+
+    def test_probes_missing_slot(self) -> None:
+        """Test probes fail without heartbeat file or occupied slot."""
+        for create in [False, True]:
+            if create:
+                create_slots(1, self.path)
+            for url in ["/readyz", "/livez"]:
+                with self.subTest(url=url, create=create):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 503)
+                    self.assertListEqual(response.json["workers"], [])  # type: ignore[index]
+
+    def test_profile(self) -> None:
+        """Test profiling is requested only from alive worker in known mode when it is enabled."""
+        create_slots(1, self.path)
+        HeartbeatSlot(0, self.path).start()
+        pid = os.getpid()
+        started = {"pid": pid, "mode": "cprofile", "directory": "/profiles"}
+        inputs = [
+            ("", f"/profile/{pid}", 404, {"error": "Profiling is disabled"}),
+            ("/profiles", f"/profile/{pid}?mode=perf", 400, {"error": "Unknown profiling mode `perf`"}),
+            ("/profiles", f"/profile/{pid + 1}", 404, {"error": f"No alive worker with pid {pid + 1}"}),
+            ("/profiles", f"/profile/{pid}?mode=cprofile", 202, started),
+        ]
+
+        for directory, url, status, body in inputs:
+            with self.subTest(url=url, directory=directory):
+                with mock.patch.dict("service.app.os.environ", {"PROFILING_DIR": directory}):
+                    with mock.patch("service.app.request_profile") as request_mock:
+                        response = self.client.post(url)
+
+                self.assertEqual(response.status_code, status)
+                self.assertDictEqual(response.json, body)  # type: ignore[arg-type]
+                self.assertEqual(request_mock.called, status == 202)
+
+        request_mock.assert_called_once_with(pid, "cprofile")
+
+    def test_metrics(self) -> None:
+        """Test metrics are aggregated from multiprocess directory of workers."""
+        env = {"PROMETHEUS_MULTIPROC_DIR": self.tmp_dir.name}
+        with mock.patch.dict("service.metrics.os.environ", env):
+            # metric values of worker processes are written to multiprocess directory
+            value_class = values.MultiProcessValue()  # type: ignore[no-untyped-call]
+            with mock.patch("prometheus_client.metrics.values.ValueClass", value_class):
+                observe_stage("app_test", 0.2)
+
+            response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        self.assertIn(
+            'bundlegen_service_stage_duration_seconds_bucket{le="0.25",stage="app_test"} 1.0',
+            response.get_data(as_text=True),
+        )
@@ -0,0 +1,98 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for backpressure watermarks."""
+from unittest import (
+    mock,
+    TestCase,
+)
+
+from service.backpressure import (
+    Backpressure,
+    Watermark,
+)
+
+
+class TestBackpressure(TestCase):
+    """Base TestCase for backpressure functionality."""
+
+    def setUp(self) -> None:
+        """Set up env before each test."""
+        super().setUp()
+        self.config = {
+            "backpressure.queue_high": 100,
+            "backpressure.queue_low": 50,
+            "backpressure.outstanding_high": 10,
+            "backpressure.outstanding_low": 5,
+        }
+        self.config_mock = mock.MagicMock(name="Config")
+        self.config_mock.get.side_effect = lambda key, default=None: self.config.get(key, default)
+
+    def test_watermark(self) -> None:
+        """Test hysteresis of `Watermark`."""
+        watermark = Watermark(10, 5)
+        inputs = [
+            ((9, False), False),
+            ((10, False), True),
+            ((6, True), True),
+            ((5, True), False),
+        ]
+
+        for (value, paused), exceeded in inputs:
+            with self.subTest(value=value, paused=paused):
+                self.assertEqual(watermark.exceeded(value, paused), exceeded)
+
+        self.assertFalse(Watermark(0, 0).exceeded(1000, False))
+
+    def test_init(self) -> None:
+        """Test watermarks are read from config."""
+        backpressure = Backpressure(self.config_mock)
+
+        self.assertEqual((backpressure.queue.high, backpressure.queue.low), (100, 50))
+        self.assertEqual((backpressure.outstanding.high, backpressure.outstanding.low), (10, 5))
+        self.assertEqual(backpressure.interval, 5.0)
+        self.assertTrue(backpressure.enabled)
+        self.assertFalse(backpressure.paused)
+
+        self.config.clear()
+        self.assertFalse(Backpressure(self.config_mock).enabled)
+
+    def test_update(self) -> None:
+        """Test worker pauses when any watermark is crossed and resumes when both are below low watermarks."""
+        backpressure = Backpressure(self.config_mock)
+        inputs = [
+            ((0, 9), False, False),
+            ((0, 10), True, True),
+            ((0, 5), True, False),
+            ((100, 0), True, True),
+            ((60, 0), False, True),
+            ((50, 6), False, True),
+            ((50, 5), True, False),
+        ]
+
+        for (queue_depth, outstanding), changed, paused in inputs:
+            with self.subTest(queue_depth=queue_depth, outstanding=outstanding):
+                backpressure.queue_depth = queue_depth
+
+                self.assertEqual(backpressure.update(outstanding), changed)
+                self.assertEqual(backpressure.paused, paused)
+
+        backpressure.disk_full = True
+        self.assertTrue(backpressure.update(0))
+        self.assertTrue(backpressure.paused)
@@ -0,0 +1,165 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for micro-batching of input messages."""
+from typing import (
+    Any,
+    Dict,
+    List,
+)
+from unittest import (
+    mock,
+    TestCase,
+)
+
+from tests import get_handler
+
+from service.batching import (
+    Batch,
+    Delivery,
+)
+
+
+class TestBatch(TestCase):
+    """TestCase for Batch class."""
+
+    def test_batch(self) -> None:
+        """Test batch is filled up to `batch.max_size` and emptied by `take()`."""
+        config_mock = mock.MagicMock(name="Config")
+        config_mock.get.side_effect = {"batch.max_size": 2, "batch.window": "0.05"}.get
+        batch = Batch(config_mock)
+        deliveries = [(mock.MagicMock(name="Method"), mock.MagicMock(name="Props"), body) for body in (b"a", b"b")]
+
+        self.assertTrue(batch.enabled)
+        self.assertEqual(batch.window, 0.05)
+        self.assertTrue(batch.add(deliveries[0]))
+        self.assertFalse(batch.full)
+        self.assertFalse(batch.add(deliveries[1]))
+        self.assertTrue(batch.full)
+
+        batch.timer = "timer"
+        self.assertListEqual(batch.take(), deliveries)
+        self.assertListEqual(batch.deliveries, [])
+        self.assertIsNone(batch.timer)
+
+    def test_disabled(self) -> None:
+        """Test batching is disabled by default."""
+        config_mock = mock.MagicMock(name="Config")
+        config_mock.get.side_effect = lambda key, default: default
+
+        batch = Batch(config_mock)
+
+        self.assertFalse(batch.enabled)
+        self.assertEqual(batch.window, 0.0)
+
+
+class TestBatchHandling(TestCase):
+    """TestCase for `BundleGenHandler.h_batch()`."""
+
+    def setUp(self) -> None:
+        """Set up handler with tickets `a`, `b` sharing template archive `t1`, `c` using `t2` and broken `d`."""
+        super().setUp()
+
+        self.file_structure_mock = mock.MagicMock(name="FileStructure")
+        self.retry_mock = mock.MagicMock(name="RetryPolicy")
+        self.retry_mock.schedule.return_value = False
+        self.channel = mock.MagicMock(name="Channel")
+        self.deliveries: List[Delivery] = [
+            (mock.MagicMock(name=f"Method-{uuid}"), mock.MagicMock(name="Props", headers={"x-request-id": uuid}), body)
+            for uuid, body in (("a", b"t1"), ("b", b"t1"), ("c", b"t2"), ("d", b""))
+        ]
+
+        self.handler = get_handler(self.file_structure_mock, RetryPolicy=self.retry_mock)
+
+        patcher = mock.patch.multiple(
+            self.handler,
+            make_src_msg=mock.MagicMock(side_effect=self.make_src_msg),
+            make_dst_msg=mock.MagicMock(side_effect=self.make_dst_msg),
+            get_template_filename=mock.MagicMock(side_effect=lambda msg: msg["template"]),
+            get_priority=mock.DEFAULT,
+            prepare_outputdir=mock.DEFAULT,
+            send_bundlegen_msg=mock.DEFAULT,
+            send_success_msg=mock.DEFAULT,
+            send_error_msg=mock.DEFAULT,
+        )
+        self.mocks: Dict[str, Any] = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def make_src_msg(body: bytes, props: mock.MagicMock) -> Dict[str, str]:
+        """Decode input message, empty body is broken."""
+        if not body:
+            raise KeyError("template")
+        return {"id": props.headers["x-request-id"], "template": body.decode()}
+
+    @staticmethod
+    def make_dst_msg(msg: Dict[str, str]) -> Dict[str, str]:
+        """Format BundleGen ticket."""
+        return {"uuid": msg["id"], "searchpath": f"/search/{msg['id']}", "outputdir": f"/output/{msg['id']}"}
+
+    def launched(self) -> List[str]:
+        """Return uuids of tickets sent to BundleGen."""
+        return [args[1]["uuid"] for args, _ in self.mocks["send_bundlegen_msg"].call_args_list]
+
+    def test_h_batch(self) -> None:
+        """Test template directory is prepared once per template archive and every message is acknowledged."""
+        self.handler.h_batch(self.channel, self.deliveries)
+
+        self.assertListEqual(
+            self.file_structure_mock.create_structure_for.call_args_list,
+            [mock.call("/search/a", "t1"), mock.call("/search/c", "t2")],
+        )
+        self.file_structure_mock.clone_structure.assert_called_once_with("/search/a", "/search/b")
+        self.mocks["prepare_outputdir"].assert_has_calls([mock.call(f"/output/{uuid}") for uuid in "abc"])
+        self.assertListEqual(self.launched(), ["a", "b", "c"])
+        self.mocks["send_error_msg"].assert_called_once_with(self.channel, str(KeyError("template")), "d")
+        self.assertListEqual(
+            self.channel.basic_ack.call_args_list,
+            [mock.call(delivery_tag=self.deliveries[index][0].delivery_tag) for index in (3, 0, 1, 2)],
+        )
+
+    def test_h_batch_template_error(self) -> None:
+        """Test failed template archive fails or retries every ticket of its group."""
+        exc = TimeoutError("S3")
+        self.file_structure_mock.create_structure_for.side_effect = [exc, None]
+        self.retry_mock.schedule.side_effect = [False, True, False]
+
+        self.handler.h_batch(self.channel, self.deliveries)
+
+        self.file_structure_mock.clone_structure.assert_not_called()
+        self.assertListEqual(self.launched(), ["c"])
+        self.assertListEqual(
+            self.retry_mock.schedule.call_args_list[1:],
+            [mock.call(self.channel, props, body, exc) for _, props, body in self.deliveries[:2]],
+        )
+        self.assertListEqual(
+            self.mocks["send_error_msg"].call_args_list,
+            [mock.call(self.channel, str(KeyError("template")), "d"), mock.call(self.channel, "S3", "b")],
+        )
+        self.assertEqual(self.channel.basic_ack.call_count, 4)
+
+    def test_h_batch_clone_error(self) -> None:
+        """Test failure of one ticket of a group does not affect the other tickets."""
+        self.file_structure_mock.clone_structure.side_effect = OSError("No space left on device")
+
+        self.handler.h_batch(self.channel, self.deliveries[:3])
+
+        self.assertListEqual(self.launched(), ["a", "c"])
+        self.mocks["send_error_msg"].assert_called_once_with(self.channel, "No space left on device", "b")
+        self.assertEqual(self.channel.basic_ack.call_count, 3)
@@ -90,6 +90,19 @@ class TestConfigs(TestCase):
                     with self.assertRaises(KeyError):
                         config.get(key)
 
+    def test_config_get_default(self) -> None:
+        """Test `get()` returns `default` for missing key/path."""
+        for key in ["key0", "key1.key3", "key1.key2.key4"]:
+            with self.subTest(key=key):
+                config = Config()
+
+                with mock.patch("service.config.Config.config", new_callable=mock.PropertyMock) as config_mock:
+                    config_mock.return_value = self.data
+
+                    self.assertEqual(config.get(key, 0), 0)
+                    self.assertIsNone(config.get(key, None))
+                    self.assertEqual(config.get("key1.key2.key3", "default"), "value3")
+
     def test_lru_cache(self) -> None:
         """Test `@lru_cache` work."""
         config = Config()
@@ -0,0 +1,144 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for deadlines of tickets."""
+from typing import Any
+from unittest import (
+    mock,
+    TestCase,
+)
+
+from tests import get_handler
+
+from service.deadline import (
+    Deadlines,
+    milliseconds,
+)
+
+
+def get_deadlines(**values: Any) -> Deadlines:
+    """Get Deadlines configured with `values`."""
+    config_mock = mock.MagicMock(name="Config")
+    config_mock.get.side_effect = {f"deadline.{key}": value for key, value in values.items()}.get
+    return Deadlines(config_mock)
+
+
+class TestDeadlines(TestCase):
+    """TestCase for Deadlines class."""
+
+    def test_milliseconds(self) -> None:
+        """Test header values are converted to seconds and invalid ones are ignored."""
+        inputs = [(1500, 1.5), ("2500", 2.5), (b"500", 0.5), (None, None), ("soon", None)]
+
+        for value, expected in inputs:
+            with self.subTest(value=value):
+                self.assertEqual(milliseconds(value), expected)
+
+    def test_deadline(self) -> None:
+        """Test deadline is the earliest of deadline header, TTL header and maximum age."""
+        deadlines = get_deadlines(max_age=60)
+        inputs = [
+            ({}, None, None),
+            ({}, 1000, 1060.0),
+            ({"x-ttl": 30000}, 1000, 1030.0),
+            ({"x-deadline": 1010000, "x-ttl": 30000}, 1000, 1010.0),
+            ({"x-deadline": 1010000, "x-ttl": 30000}, None, 1010.0),
+            ({"x-ttl": 30000}, None, None),
+        ]
+
+        for headers, timestamp, expected in inputs:
+            with self.subTest(headers=headers, timestamp=timestamp):
+                props = mock.MagicMock(name="Properties", headers=headers, timestamp=timestamp)
+                self.assertEqual(deadlines.deadline(props), expected)
+
+        self.assertIsNone(get_deadlines().deadline(mock.MagicMock(headers=None, timestamp=1000)))
+
+    def test_expired(self) -> None:
+        """Test deadline in the past is expired, no deadline never expires."""
+        with mock.patch("service.deadline.time.time", return_value=1000.0):
+            self.assertTrue(Deadlines.expired(1000.0))
+            self.assertFalse(Deadlines.expired(1000.5))
+            self.assertFalse(Deadlines.expired(None))
+
+    def test_forward(self) -> None:
+        """Test deadline is forwarded in headers and remaining time in configured field of BundleGen ticket."""
+        deadlines = get_deadlines(header="x-expires", field="timeout_ms")
+        msg = {"uuid": "uuid"}
+
+        with mock.patch("service.deadline.time.time", return_value=1000.0):
+            get_deadlines().stamp(msg, 1001.5)
+            deadlines.stamp(msg, None)
+            self.assertDictEqual(msg, {"uuid": "uuid"})
+            deadlines.stamp(msg, 1001.5)
+            self.assertDictEqual(msg, {"uuid": "uuid", "timeout_ms": 1500})
+            deadlines.stamp(msg, 999.0)
+            self.assertDictEqual(msg, {"uuid": "uuid", "timeout_ms": 0})
+
+        self.assertDictEqual(deadlines.headers(None), {})
+        self.assertDictEqual(deadlines.headers(1001.5), {"x-expires": 1001500})
+
+
+class TestDeadlineHandling(TestCase):
+    """TestCase for deadlines in BundleGenHandler."""
+
+    def setUp(self) -> None:
+        """Set up handler with real deadlines."""
+        super().setUp()
+        self.channel = mock.MagicMock(name="Channel")
+        self.handler = get_handler(mock.MagicMock(name="FileStructure"), Deadlines=get_deadlines(field="timeout_ms"))
+
+    def test_h_request_expired(self) -> None:
+        """Test expired ticket is reported with distinct error before it is prepared."""
+        method = mock.MagicMock(name="Method")
+        props = mock.MagicMock(name="Properties", headers={"x-request-id": "id", "x-deadline": 999000}, timestamp=None)
+        self.handler.request_id_map["id"] = "id"
+
+        with mock.patch.multiple(self.handler, prepare_ticket=mock.DEFAULT, send_error_msg=mock.DEFAULT) as mocks:
+            with mock.patch("service.deadline.time.time", return_value=1000.0):
+                with mock.patch("service.handlers.count_expired") as count_mock:
+                    self.handler.h_request(self.channel, method, props, b"body")
+
+        mocks["prepare_ticket"].assert_not_called()
+        mocks["send_error_msg"].assert_called_once_with(
+            self.channel,
+            "Ticket expired before it was launched",
+            "id",
+            "DEADLINE_EXCEEDED",
+        )
+        count_mock.assert_called_once_with()
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=method.delivery_tag)
+        self.assertDictEqual(self.handler.request_id_map, {})
+
+    def test_h_request_forwarded(self) -> None:
+        """Test deadline of launched ticket is forwarded to BundleGen."""
+        props = mock.MagicMock(name="Properties", headers={"x-deadline": 1001500}, timestamp=None)
+
+        with mock.patch.multiple(
+            self.handler,
+            prepare_ticket=mock.MagicMock(return_value=({"id": "id"}, {"uuid": "id"})),
+            get_priority=mock.MagicMock(return_value=None),
+            send_success_msg=mock.DEFAULT,
+        ):
+            with mock.patch("service.handlers.BundleGenHandler.out_encoder") as out_encoder_mock:
+                with mock.patch("service.deadline.time.time", return_value=1000.0):
+                    self.handler.h_request(self.channel, mock.MagicMock(name="Method"), props, b"body")
+
+        properties = self.channel.basic_publish.call_args[1]["properties"]
+        self.assertEqual(properties.headers["x-deadline"], 1001500)
+        out_encoder_mock.encode.assert_called_once_with({"uuid": "id", "timeout_ms": 1500})
@@ -58,7 +58,7 @@ class TestDecoder(TestCase):
         loads_mock.assert_called_once_with(string_to_decode)
         self.assertEqual(result, loads_mock())
 
-    @mock.patch("service.decoders.unpackb")
+    @mock.patch("service.decoders.msgpack.unpackb")
     def test_msgpack_decoder(self, unpackb_mock: mock.MagicMock) -> None:
         """Test `MsgPackDecoder` decoder."""
         string_to_decode = b"some string"
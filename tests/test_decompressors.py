@@ -0,0 +1,181 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for Decompressor class hierarchy."""
+from tempfile import TemporaryDirectory
+from unittest import (
+    mock,
+    TestCase,
+)
+import gzip
+import io
+import os
+import shutil
+# only constants are used, Popen is mocked
+import subprocess  # nosec B404
+import sys
+
+from service.decompressors import (
+    Decompressor,
+    DECOMPRESSORS,
+    detect_format,
+    get_decompressors,
+    ProcessDecompressor,
+    select_decompressor,
+    StdlibDecompressor,
+    ZstandardDecompressor,
+)
+
+
+class TestDecompressor(TestCase):
+    """Base TestCase for Decompressor classes."""
+
+    def setUp(self) -> None:
+        """Set up temporary directory with archive."""
+        super().setUp()
+        self.directory = TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+        self.archive = os.path.join(self.directory.name, "archive")
+
+    def write_archive(self, data: bytes) -> None:
+        """Write `data` to archive file."""
+        with open(self.archive, "wb") as archive:
+            archive.write(data)
+
+    def test_abstract_methods(self) -> None:
+        """Test set of abstract methods in class."""
+        self.assertSetEqual(set(["available", "stream"]), Decompressor.__dict__["__abstractmethods__"])
+
+    def test_detect_format(self) -> None:
+        """Test `detect_format()` recognises compressed archives by magic number."""
+        inputs = [
+            (gzip.compress(b"data"), "gzip"),
+            (b"\x28\xb5\x2f\xfd" + b"\x00" * 8, "zstd"),
+            (b"BZh91AY&SY", "bzip2"),
+            (b"\xfd7zXZ\x00\x00", "xz"),
+            (b"templates/\x00" + b"\x00" * 500, "tar"),
+            (b"", "tar"),
+        ]
+
+        for data, expected in inputs:
+            with self.subTest(expected=expected):
+                self.write_archive(data)
+                self.assertEqual(detect_format(self.archive), expected)
+
+    def test_get_decompressors(self) -> None:
+        """Test `get_decompressors()` keeps order of preference."""
+        decompressors = get_decompressors(["zstandard", "pigz", "stdlib"])
+
+        self.assertListEqual([decompressor.name for decompressor in decompressors], ["zstandard", "pigz", "stdlib"])
+        self.assertSetEqual(set(DECOMPRESSORS), {"pigz", "zstd", "zstandard", "stdlib"})
+
+    def test_select_decompressor(self) -> None:
+        """Test `select_decompressor()` skips decompressors of other formats and unavailable ones."""
+        pigz = mock.MagicMock(name="pigz", formats=("gzip",), available=mock.MagicMock(return_value=False))
+        zstd = mock.MagicMock(name="zstd", formats=("zstd",), available=mock.MagicMock(return_value=True))
+        stdlib = mock.MagicMock(name="stdlib", formats=("gzip", "tar"), available=mock.MagicMock(return_value=True))
+
+        self.assertEqual(select_decompressor([pigz, zstd, stdlib], "gzip"), stdlib)
+        self.assertEqual(select_decompressor([pigz, zstd, stdlib], "zstd"), zstd)
+        with self.assertRaisesRegex(shutil.ReadError, "No decompressor available for xz archive"):
+            select_decompressor([pigz, zstd, stdlib], "xz")
+
+    @mock.patch("service.decompressors.shutil.which")
+    def test_process_available(self, which_mock: mock.MagicMock) -> None:
+        """Test process decompressor is available when its command is installed."""
+        decompressor = ProcessDecompressor(("gzip",), ("pigz", "-dc"))
+
+        which_mock.return_value = "/usr/bin/pigz"
+        self.assertTrue(decompressor.available())
+        which_mock.return_value = None
+        self.assertTrue(decompressor.available())
+        self.assertFalse(ProcessDecompressor(("gzip",), ("pigz", "-dc")).available())
+        self.assertEqual(which_mock.call_args_list, [mock.call("pigz")] * 2)
+
+    def test_process_stream(self) -> None:
+        """Test process decompressor yields stdout of command."""
+        self.write_archive(b"data")
+        decompressor = ProcessDecompressor(("tar",), (sys.executable, "-c", "import sys; print(sys.argv[1])"))
+
+        with decompressor.stream(self.archive) as stream:
+            self.assertEqual(stream.read(), f"{self.archive}\n".encode())
+
+    def test_process_stream_chatty(self) -> None:
+        """Test process decompressor does not block command writing more to stderr than pipe buffer holds."""
+        script = "import sys; sys.stderr.write('warning\\n' * 100000); print('data')"
+        decompressor = ProcessDecompressor(("tar",), (sys.executable, "-c", script))
+
+        with decompressor.stream("archive") as stream:
+            self.assertEqual(stream.read(), b"data\n")
+
+    def test_process_stream_failed(self) -> None:
+        """Test process decompressor raises error with stderr of failed command."""
+        decompressor = ProcessDecompressor(("tar",), (sys.executable, "-c", "import sys; sys.exit('corrupted')"))
+
+        with self.assertRaisesRegex(shutil.ReadError, "failed to decompress `archive`: corrupted"):
+            with decompressor.stream("archive") as stream:
+                stream.read()
+
+    def test_process_stream_interrupted(self) -> None:
+        """Test process decompressor kills command when reading fails."""
+        decompressor = ProcessDecompressor(("tar",), ("command",))
+
+        with mock.patch("service.decompressors.subprocess.Popen") as popen_mock:
+            process_mock = popen_mock.return_value.__enter__.return_value
+            with self.assertRaises(KeyError):
+                with decompressor.stream("archive"):
+                    raise KeyError("tar")
+
+        popen_mock.assert_called_once_with(["command", "archive"], stdout=subprocess.PIPE, stderr=mock.ANY)
+        process_mock.kill.assert_called_once_with()
+        process_mock.communicate.assert_called_once_with()
+
+    @mock.patch("service.decompressors.find_spec")
+    def test_zstandard_available(self, find_spec_mock: mock.MagicMock) -> None:
+        """Test zstandard decompressor is available when library is installed."""
+        find_spec_mock.return_value = None
+        self.assertFalse(ZstandardDecompressor().available())
+
+        find_spec_mock.return_value = mock.MagicMock(name="ModuleSpec")
+        self.assertTrue(ZstandardDecompressor().available())
+        find_spec_mock.assert_called_with("zstandard")
+
+    @mock.patch("service.decompressors.import_module")
+    def test_zstandard_stream(self, import_module_mock: mock.MagicMock) -> None:
+        """Test zstandard decompressor yields stream reader of archive."""
+        self.write_archive(b"data")
+        reader = io.BytesIO(b"tar")
+        stream_reader_mock = import_module_mock.return_value.ZstdDecompressor.return_value.stream_reader
+        stream_reader_mock.return_value = reader
+
+        with ZstandardDecompressor().stream(self.archive) as stream:
+            self.assertEqual(stream.read(), b"tar")
+
+        import_module_mock.assert_called_once_with("zstandard")
+        self.assertEqual(stream_reader_mock.call_args[0][0].name, self.archive)
+        self.assertTrue(reader.closed)
+
+    def test_stdlib(self) -> None:
+        """Test stdlib decompressor returns archive as it is."""
+        self.write_archive(b"data")
+        decompressor = StdlibDecompressor()
+
+        self.assertTrue(decompressor.available())
+        with decompressor.stream(self.archive) as stream:
+            self.assertEqual(stream.read(), b"data")
@@ -0,0 +1,181 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for deduplication of redelivered input messages."""
+from tempfile import TemporaryDirectory
+from typing import (
+    Any,
+    Dict,
+    List,
+)
+from unittest import (
+    mock,
+    TestCase,
+)
+import os
+
+from tests import get_handler
+
+from service.batching import Delivery
+from service.dedup import RecentTickets
+from service.handlers import Statuses
+
+
+class TestRecentTickets(TestCase):
+    """TestCase for RecentTickets class."""
+
+    def setUp(self) -> None:
+        """Set up temporary marker directory."""
+        super().setUp()
+        self.directory = TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+        self.markers = os.path.join(self.directory.name, "markers")
+
+    def _get_recent(self, **values: Any) -> RecentTickets:
+        """Get RecentTickets configured with `values`."""
+        config_mock = mock.MagicMock(name="Config")
+        config_mock.get.side_effect = {f"dedup.{key}": value for key, value in values.items()}.get
+        return RecentTickets(config_mock)
+
+    def test_disabled(self) -> None:
+        """Test deduplication is disabled by default."""
+        recent = self._get_recent()
+
+        recent.record("a")
+
+        self.assertFalse(recent.enabled)
+        self.assertFalse(recent.seen("a"))
+        self.assertEqual(len(recent.recent), 0)
+        with self.assertRaisesRegex(ValueError, "`dedup.dir` shared by all workers is required"):
+            self._get_recent(size=2)
+
+    def test_memory(self) -> None:
+        """Test the last `dedup.size` request ids are remembered in memory, other ones through markers."""
+        recent = self._get_recent(size=2, dir=self.markers)
+
+        for request_id in ("a", "b", "", "a", "c"):
+            recent.record(request_id)
+        os.remove(recent.marker("b"))
+
+        self.assertListEqual([recent.seen(request_id) for request_id in "abc"], [True, False, True])
+        self.assertFalse(recent.seen(""))
+
+    def test_markers(self) -> None:
+        """Test request ids are shared through marker files, which expire after `dedup.ttl` seconds."""
+        self._get_recent(size=10, dir=self.markers).record("a/b")
+        recent = self._get_recent(size=10, dir=self.markers, ttl=60)
+
+        self.assertTrue(recent.seen("a/b"))
+        self.assertFalse(recent.seen("c"))
+        with mock.patch("service.dedup.time.time", return_value=os.stat(recent.marker("a/b")).st_mtime + 60):
+            self.assertFalse(recent.seen("a/b"))
+
+    def test_prune(self) -> None:
+        """Test expired markers are removed after every `dedup.size` recorded tickets."""
+        recent = self._get_recent(size=2, dir=self.markers, ttl=60)
+        recent.record("a")
+        expired = recent.marker("a")
+        os.utime(expired, (0, 0))
+
+        recent.record("b")
+
+        self.assertFalse(os.path.exists(expired))
+        self.assertTrue(os.path.exists(recent.marker("b")))
+
+    def test_prune_race(self) -> None:
+        """Test marker removed by another worker while pruning is ignored."""
+        recent = self._get_recent(size=1, dir=self.markers, ttl=60)
+        recent.record("a")
+        os.utime(recent.marker("a"), (0, 0))
+
+        with mock.patch("service.dedup.os.remove", side_effect=FileNotFoundError) as remove_mock:
+            recent.prune()
+
+        remove_mock.assert_called_once_with(recent.marker("a"))
+
+
+class TestDuplicateHandling(TestCase):
+    """TestCase for skipping redelivered input messages in BundleGenHandler."""
+
+    def setUp(self) -> None:
+        """Set up handler which already sent ticket `a` to BundleGen."""
+        super().setUp()
+        self.recent_mock = mock.MagicMock(name="RecentTickets")
+        self.recent_mock.seen.side_effect = lambda request_id: request_id == "a"
+        self.channel = mock.MagicMock(name="Channel")
+
+        self.handler = get_handler(mock.MagicMock(), RecentTickets=self.recent_mock)
+
+        patcher = mock.patch.multiple(
+            self.handler,
+            prepare_ticket=mock.MagicMock(return_value=({"id": "b"}, {"uuid": "b"})),
+            get_priority=mock.DEFAULT,
+            send_bundlegen_msg=mock.DEFAULT,
+            send_error_msg=mock.DEFAULT,
+            send_success_msg=mock.DEFAULT,
+        )
+        self.mocks: Dict[str, Any] = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_h_request(self) -> None:
+        """Test redelivered message of launched ticket is acknowledged and reported as launched with lost reply."""
+        for request_id, redelivered, launched in (("a", True, False), ("a", False, True), ("b", True, True)):
+            self.channel.reset_mock()
+            for mock_ in self.mocks.values():
+                mock_.reset_mock()
+            method = mock.MagicMock(name="Method", redelivered=redelivered)
+            props = mock.MagicMock(name="Props", headers={"x-request-id": request_id})
+
+            with self.subTest(request_id=request_id, redelivered=redelivered):
+                with mock.patch("service.handlers.count_duplicate") as count_mock:
+                    self.handler.h_request(self.channel, method, props, b"body")
+
+                self.assertEqual(self.mocks["send_bundlegen_msg"].called, launched)
+                self.assertEqual(count_mock.called, not launched)
+                self.assertEqual(self.mocks["send_error_msg"].called, not launched)
+                self.channel.basic_ack.assert_called_once_with(delivery_tag=method.delivery_tag)
+
+        self.assertListEqual(self.recent_mock.record.call_args_list, [mock.call("a"), mock.call("b")])
+
+    def test_skipped_status(self) -> None:
+        """Test skipped redelivery gets launched and lost reply statuses."""
+        method = mock.MagicMock(name="Method", redelivered=True)
+        props = mock.MagicMock(name="Props", headers={"x-request-id": "a"})
+
+        self.handler.h_request(self.channel, method, props, b"body")
+
+        self.mocks["send_success_msg"].assert_called_once_with(self.channel, Statuses.GENERATION_LAUNCHED, "a")
+        self.mocks["send_error_msg"].assert_called_once_with(self.channel, mock.ANY, "a", "REPLY_LOST")
+        self.mocks["send_bundlegen_msg"].assert_not_called()
+
+    def test_h_batch(self) -> None:
+        """Test redelivered message of launched ticket is left out of batch."""
+        deliveries: List[Delivery] = [
+            (mock.MagicMock(name="Method", redelivered=True), mock.MagicMock(headers={"x-request-id": request_id}), b"")
+            for request_id in "ab"
+        ]
+
+        with mock.patch.object(self.handler, "launch_group") as launch_mock:
+            with mock.patch.object(self.handler, "format_ticket", return_value=({"id": "b"}, {"uuid": "b"})):
+                with mock.patch.object(self.handler, "get_template_filename", return_value="template"):
+                    self.handler.h_batch(self.channel, deliveries)
+
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=deliveries[0][0].delivery_tag)
+        tickets = launch_mock.call_args[0][2]
+        self.assertListEqual([ticket.request_id for ticket in tickets], ["b"])
@@ -0,0 +1,167 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for disk space admission control."""
+from typing import (
+    Any,
+    cast,
+)
+from unittest import (
+    mock,
+    TestCase,
+)
+import threading
+
+from tests import get_handler
+
+from service.disk import (
+    DiskSpace,
+    used_percent,
+)
+
+
+class TestDiskSpace(TestCase):
+    """TestCase for DiskSpace class."""
+
+    def setUp(self) -> None:
+        """Set up store directory environment variables."""
+        super().setUp()
+        patcher = mock.patch.dict("service.disk.os.environ", {"BUNDLE_STORE_DIR": "/bundles", "NGINX_STORE_DIR": ""})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _get_disk(**values: Any) -> DiskSpace:
+        """Get DiskSpace configured with `values`."""
+        config_mock = mock.MagicMock(name="Config")
+        config_mock.get.side_effect = {
+            "envs": ["BUNDLE_STORE_DIR", "NGINX_STORE_DIR"],
+            **{f"disk.{key}": value for key, value in values.items()},
+        }.get
+        return DiskSpace(config_mock)
+
+    def test_used_percent(self) -> None:
+        """Test used percentage is the higher of space and inodes, volume without inode limit counts space only."""
+        inputs = [
+            ((100, 20, 1000, 100), 90),
+            ((100, 20, 0, 0), 80),
+            ((0, 0, 0, 0), 0),
+        ]
+
+        for (blocks, bavail, files, favail), expected in inputs:
+            stat = mock.MagicMock(f_blocks=blocks, f_bavail=bavail, f_files=files, f_favail=favail)
+            with self.subTest(stat=stat):
+                with mock.patch("service.disk.os.statvfs", return_value=stat) as statvfs_mock:
+                    self.assertEqual(used_percent("/bundles"), expected)
+
+                statvfs_mock.assert_called_once_with("/bundles")
+
+    def test_disabled(self) -> None:
+        """Test admission control is disabled by default."""
+        disk = self._get_disk()
+
+        with mock.patch("service.disk.used_percent") as used_mock:
+            self.assertFalse(disk.enabled)
+            self.assertFalse(disk.full())
+
+        used_mock.assert_not_called()
+
+    def test_poll(self) -> None:
+        """Test volumes are polled once per interval and reapers are started above soft watermark."""
+        disk = self._get_disk(soft=80, hard=95, interval=5)
+        inputs = [(0.0, 70, 70), (4.0, 99, 70), (5.0, 85, 85), (10.0, 99, 99)]
+
+        with mock.patch.object(disk, "reap") as reap_mock:
+            for now, used, expected in inputs:
+                with self.subTest(now=now):
+                    with mock.patch("service.disk.time.monotonic", return_value=now):
+                        with mock.patch("service.disk.used_percent", return_value=used) as used_mock:
+                            self.assertEqual(disk.full(), expected >= 95)
+
+                    self.assertEqual(disk.usage, expected)
+                    self.assertIn(used_mock.call_args_list, ([], [mock.call("/bundles")]))
+
+        self.assertEqual(reap_mock.call_count, 2)
+
+    def test_admit(self) -> None:
+        """Test input message is requeued while volumes are full."""
+        disk = self._get_disk(hard=95)
+        channel_mock = mock.MagicMock(name="Channel")
+        method_mock = mock.MagicMock(name="Method")
+
+        with mock.patch("service.disk.count_disk_admission") as count_mock:
+            with mock.patch.object(disk, "full", side_effect=[False, True]):
+                self.assertTrue(disk.admit(channel_mock, method_mock))
+                self.assertFalse(disk.admit(channel_mock, method_mock))
+
+        count_mock.assert_called_once_with("requeued")
+        channel_mock.basic_nack.assert_called_once_with(delivery_tag=method_mock.delivery_tag, requeue=True)
+
+    def test_reap(self) -> None:
+        """Test reapers run in single background thread and failing reaper does not stop the others."""
+        disk = self._get_disk(soft=80)
+        release = threading.Event()
+        disk.reapers = [mock.MagicMock(side_effect=release.wait), mock.MagicMock(side_effect=OSError), mock.MagicMock()]
+
+        with mock.patch("service.disk.count_disk_admission") as count_mock:
+            disk.reap()
+            disk.reap()
+            release.set()
+            self.assertIsNotNone(disk.reaper)
+            cast(threading.Thread, disk.reaper).join()
+
+        count_mock.assert_called_once_with("reaped")
+        for reaper in disk.reapers:
+            reaper.assert_called_once_with()  # type: ignore[attr-defined]
+
+
+class TestDiskAdmissionHandling(TestCase):
+    """TestCase for requeueing input messages of BundleGenHandler while store volumes are full."""
+
+    def setUp(self) -> None:
+        """Set up handler with full store volumes."""
+        super().setUp()
+        self.disk_mock = mock.MagicMock(name="DiskSpace")
+        self.disk_mock.admit.return_value = False
+        self.recent_mock = mock.MagicMock(name="RecentTickets", directory="/dedup")
+        self.file_structure_mock = mock.MagicMock(name="FileStructure")
+
+        self.handler = get_handler(self.file_structure_mock, RecentTickets=self.recent_mock, DiskSpace=self.disk_mock)
+
+    def test_reapers(self) -> None:
+        """Test template cache and dedup markers are reaped."""
+        self.assertListEqual(self.disk_mock.reapers.append.call_args_list, [
+            mock.call(self.file_structure_mock.reap),
+            mock.call(self.recent_mock.prune),
+        ])
+
+    def test_requeue(self) -> None:
+        """Test requeued input messages are neither prepared nor acknowledged."""
+        channel_mock = mock.MagicMock(name="Channel")
+        method_mock = mock.MagicMock(name="Method")
+
+        with mock.patch.object(self.handler, "prepare_ticket") as prepare_mock:
+            with mock.patch.object(self.handler, "launch_group") as launch_mock:
+                self.handler.h_request(channel_mock, method_mock, mock.MagicMock(name="Props"), b"body")
+                self.handler.h_batch(channel_mock, [(method_mock, mock.MagicMock(name="Props"), b"body")] * 2)
+
+        self.assertListEqual(self.disk_mock.admit.call_args_list, [mock.call(channel_mock, method_mock)] * 3)
+        prepare_mock.assert_not_called()
+        launch_mock.assert_not_called()
+        channel_mock.basic_ack.assert_not_called()
@@ -18,15 +18,34 @@
 #
 
 """Test cases for Downloader class hierarchy."""
+from typing import (
+    Any,
+    cast,
+)
 from unittest import (
     mock,
     TestCase,
 )
 
+from boto3.exceptions import S3TransferFailedError
+from botocore.exceptions import (
+    ClientError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
 from service.downloaders import (
     Downloader,
+    preload,
     S3Downloader,
 )
+from service.retry import TransientError
+
+
+def make_client_error(code: str, status: int) -> ClientError:
+    """Return S3 error response."""
+    response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+    return ClientError(cast(Any, response), "GetObject")
 
 
 class TestDownloader(TestCase):
@@ -40,19 +59,33 @@ class TestDownloader(TestCase):
         """Test set of abstract methods in class."""
         self.assertSetEqual(set(["download"]), Downloader.__dict__["__abstractmethods__"])
 
-    @mock.patch("service.downloaders.client")
+    @mock.patch("service.downloaders.boto3.client")
+    @mock.patch("service.downloaders.os.environ.get")
+    def test_preload(self, os_get_mock: mock.MagicMock, client_mock: mock.MagicMock) -> None:
+        """Test `preload()` creates client of configured storage in default session."""
+        preload(self.config_mock)
+
+        self.config_mock.get.assert_called_once_with("storage.type")
+        client_mock.assert_called_once_with(self.config_mock.get(), region_name=os_get_mock("S3_REGION"))
+
+    @mock.patch("service.downloaders.boto3.client")
     @mock.patch("service.downloaders.os.environ.get")
     def test_s3downloader_initialization(self, os_get_mock: mock.MagicMock, client_mock: mock.MagicMock) -> None:
-        """Test S3Downloader initialization."""
+        """Test S3Downloader creates boto3 client on first use."""
         downloader = S3Downloader(self.config_mock)
 
         self.assertEqual(downloader.config, self.config_mock)
+        client_mock.assert_not_called()
+
+        self.assertEqual(downloader.client, client_mock.return_value)
+        self.assertEqual(downloader.client, client_mock.return_value)
+
         self.config_mock.get.assert_called_once_with("storage.type")
         os_get_mock.assert_called_once_with("S3_REGION")
         client_mock.assert_called_once_with(self.config_mock.get(), region_name=os_get_mock())
 
     @mock.patch("service.downloaders.os")
-    @mock.patch("service.downloaders.client")
+    @mock.patch("service.downloaders.boto3.client")
     def test_s3downloader_download(self, client_mock: mock.MagicMock, os_mock: mock.MagicMock) -> None:
         """Test S3Downloader `download()`."""
         S3Downloader(self.config_mock).download("path", "filename")
@@ -74,3 +107,23 @@ class TestDownloader(TestCase):
             "filename",
             os_mock.path.join(),
         )
+
+    @mock.patch("service.downloaders.boto3.client")
+    def test_s3downloader_download_errors(self, client_mock: mock.MagicMock) -> None:
+        """Test S3Downloader `download()` raises `TransientError` for failures worth retrying."""
+        downloader = S3Downloader(self.config_mock)
+
+        for exc, expected in [
+            (EndpointConnectionError(endpoint_url="url"), TransientError),
+            (ReadTimeoutError(endpoint_url="url"), TransientError),
+            (S3TransferFailedError("failed"), TransientError),
+            (make_client_error("InternalError", 503), TransientError),
+            (make_client_error("SlowDown", 503), TransientError),
+            (make_client_error("Throttling", 400), TransientError),
+            (make_client_error("404", 404), ClientError),
+        ]:
+            with self.subTest(exc=exc):
+                client_mock().download_file.side_effect = exc
+
+                with self.assertRaises(expected):
+                    downloader.download("path", "filename")
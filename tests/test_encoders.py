@@ -59,7 +59,7 @@ class TestEncoders(TestCase):
         dumps_mock().encode.assert_called_once_with(encoding="utf8")
         self.assertEqual(result, dumps_mock().encode())
 
-    @mock.patch("service.encoders.packb")
+    @mock.patch("service.encoders.msgpack.packb")
     def test_msgpack_encoder(self, packb_mock: mock.MagicMock) -> None:
         """Test MsgPack encoder."""
         dict_to_encode = {"some": "dict"}
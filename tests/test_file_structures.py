@@ -19,15 +19,45 @@
 
 
 """Test cases for FileStructure class hierarchy."""
+from tempfile import TemporaryDirectory
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
 from unittest import (
     mock,
     TestCase,
 )
+import io
+import os
+import shutil
+import stat
+import tarfile
+import time
 
 from service.file_structures import (
     BundleGenFileStructure,
+    DEFAULT_DECOMPRESSORS,
     FileStructure,
+    TarExtractor,
+    UnsafeArchiveError,
+    write_file,
 )
+from service.template_cache import link_or_copy
+
+
+Member = Tuple[tarfile.TarInfo, bytes]
+
+
+def make_member(name: str, data: bytes = b"", kind: bytes = tarfile.REGTYPE, link: str = "") -> Member:
+    """Return tar member with its content."""
+    member = tarfile.TarInfo(name)
+    member.type = kind
+    member.size = len(data)
+    member.linkname = link
+    member.mode = 0o4755 if name.endswith(".sh") else 0o644
+    return member, data
 
 
 class TestBundleGenFileStructure(TestCase):
@@ -45,7 +75,21 @@ class TestBundleGenFileStructure(TestCase):
         self.config_mock.reset_mock(return_value=True, side_effect=True)
         self.downloader_mock.reset_mock(return_value=True, side_effect=True)
 
-        return BundleGenFileStructure(self.config_mock, self.downloader_mock)
+        with mock.patch.multiple(
+            "service.file_structures",
+            get_decompressors=mock.DEFAULT,
+            TarExtractor=mock.DEFAULT,
+            TemplateCache=mock.DEFAULT,
+        ) as mocks:
+            fstructure = BundleGenFileStructure(self.config_mock, self.downloader_mock)
+
+        mocks["get_decompressors"].assert_called_once_with(self.config_mock.get.return_value)
+        mocks["TarExtractor"].assert_called_once_with(self.config_mock.get.return_value)
+        mocks["TemplateCache"].assert_called_once_with(
+            self.config_mock.get.return_value,
+            self.config_mock.get.return_value,
+        )
+        return fstructure
 
     def test_init(self) -> None:
         """Test handler initialization."""
@@ -53,11 +97,29 @@ class TestBundleGenFileStructure(TestCase):
 
         self.assertEqual(fstructure.config, self.config_mock)
         self.assertEqual(fstructure.downloader, self.downloader_mock)
+        self.assertListEqual(
+            self.config_mock.get.call_args_list,
+            [
+                mock.call("unpack.decompressors", DEFAULT_DECOMPRESSORS),
+                mock.call("unpack.threads", 4),
+                mock.call("template_cache.dir", None),
+                mock.call("template_cache.ttl", 300),
+            ],
+        )
+
+    def test_init_without_cache(self) -> None:
+        """Test template cache is disabled by default."""
+        self.config_mock.get.side_effect = lambda key, default: default
+
+        with mock.patch("service.file_structures.TarExtractor"):
+            fstructure = BundleGenFileStructure(self.config_mock, self.downloader_mock)
+
+        self.assertIsNone(fstructure.cache)
 
     def test_abstract_methods(self) -> None:
         """Test set of abstract methods in class."""
         self.assertSetEqual(
-            set(["create_structure_for"]),
+            set(["create_structure_for", "clone_structure", "reap"]),
             FileStructure.__dict__["__abstractmethods__"],
         )
 
@@ -84,15 +146,33 @@ class TestBundleGenFileStructure(TestCase):
     def test_unpack_template_archive(self) -> None:
         """Test `unpack_template_archive()` method."""
         fstructure = self._get_file_structure()
+        fstructure.extractor = extractor_mock = mock.MagicMock(name="TarExtractor")
 
-        with mock.patch("service.file_structures.shutil") as shutil_mock:
+        with mock.patch.multiple(
+            "service.file_structures",
+            detect_format=mock.DEFAULT,
+            select_decompressor=mock.DEFAULT,
+            tarfile=mock.DEFAULT,
+        ) as mocks:
             fstructure.unpack_template_archive("path", "filename")
 
-            shutil_mock.unpack_archive.assert_called_once_with("path/filename", "path")
+        mocks["detect_format"].assert_called_once_with("path/filename")
+        mocks["select_decompressor"].assert_called_once_with(fstructure.decompressors, mocks["detect_format"]())
+        decompressor_mock = mocks["select_decompressor"].return_value
+        decompressor_mock.stream.assert_called_once_with("path/filename")
+        mocks["tarfile"].open.assert_called_once_with(
+            fileobj=decompressor_mock.stream.return_value.__enter__.return_value,
+            mode="r|*",
+        )
+        extractor_mock.extract.assert_called_once_with(
+            mocks["tarfile"].open.return_value.__enter__.return_value,
+            "path",
+        )
 
     def test_create_structure_for(self) -> None:
         """Test `create_structure_for()` method."""
         fstructure = self._get_file_structure()
+        fstructure.cache = None
 
         with mock.patch.object(fstructure, "create_template_directory") as ctd_mock:
             with mock.patch.object(fstructure, "download_template_archive") as dta_mock:
@@ -102,3 +182,176 @@ class TestBundleGenFileStructure(TestCase):
                     ctd_mock.assert_called_once_with("path")
                     dta_mock.assert_called_once_with("path", "filename")
                     uta_mock.assert_called_once_with("path", "filename")
+
+    def test_create_structure_for_cached(self) -> None:
+        """Test `create_structure_for()` links templates from cache, which fetches them on miss."""
+        fstructure = self._get_file_structure()
+        fstructure.cache = cache_mock = mock.MagicMock(name="TemplateCache")
+
+        with mock.patch.object(fstructure, "create_template_directory") as ctd_mock:
+            with mock.patch.object(fstructure, "fetch_template") as fetch_template_mock:
+                fstructure.create_structure_for("path", "filename")
+
+                ctd_mock.assert_called_once_with("path")
+                path, filename, fetch = cache_mock.populate.call_args[0]
+                self.assertEqual((path, filename), ("path", "filename"))
+                fetch_template_mock.assert_not_called()
+
+                fetch("staging")
+                fetch_template_mock.assert_called_once_with("staging", "filename")
+
+    def test_clone_structure(self) -> None:
+        """Test `clone_structure()` links template files of another ticket."""
+        fstructure = self._get_file_structure()
+
+        with mock.patch("service.file_structures.shutil.copytree") as copytree_mock:
+            fstructure.clone_structure("source", "path")
+
+        copytree_mock.assert_called_once_with(
+            "source",
+            "path",
+            symlinks=True,
+            copy_function=link_or_copy,
+            dirs_exist_ok=True,
+        )
+
+    def test_reap(self) -> None:
+        """Test `reap()` removes expired entries of template cache, if it is configured."""
+        fstructure = self._get_file_structure()
+        cache_mock = fstructure.cache
+
+        fstructure.reap()
+        fstructure.cache = None
+        fstructure.reap()
+
+        cache_mock.reap.assert_called_once_with()  # type: ignore[union-attr]
+
+
+class TestTarExtractor(TestCase):
+    """TestCase for `TarExtractor` class."""
+
+    def setUp(self) -> None:
+        """Set up temporary directory with destination."""
+        super().setUp()
+        self.directory = TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(self.directory.cleanup)
+        self.destination = os.path.join(self.directory.name, "destination")
+        os.makedirs(self.destination)
+
+    def extract(self, members: List[Member], threads: int = 2) -> None:
+        """Write `members` to tar stream and extract it to destination."""
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for member, data in members:
+                tar.addfile(member, io.BytesIO(data) if member.isfile() else None)
+
+        buffer.seek(0)
+        with tarfile.open(fileobj=buffer, mode="r|") as tar:
+            TarExtractor(threads).extract(tar, self.destination)
+
+    def read(self, name: str) -> Optional[bytes]:
+        """Return content of extracted file, `None` if it does not exist."""
+        path = os.path.join(self.destination, name)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "rb") as in_file:
+            return in_file.read()
+
+    def test_extract(self) -> None:
+        """Test files, directories and links are extracted, files of missing directories included."""
+        members = [make_member("templates", kind=tarfile.DIRTYPE)]
+        members += [make_member(f"templates/{index}.json", str(index).encode()) for index in range(10)]
+        members += [
+            make_member("nested/deep/run.sh", b"run"),
+            make_member("templates/link.json", kind=tarfile.SYMTYPE, link="1.json"),
+            make_member("hard/2.json", kind=tarfile.LNKTYPE, link="templates/2.json"),
+        ]
+
+        self.extract(members, threads=1)
+
+        for index in range(10):
+            self.assertEqual(self.read(f"templates/{index}.json"), str(index).encode())
+        self.assertEqual(self.read("nested/deep/run.sh"), b"run")
+        self.assertEqual(os.readlink(os.path.join(self.destination, "templates/link.json")), "1.json")
+        self.assertEqual(self.read("templates/link.json"), b"1")
+        self.assertEqual(self.read("hard/2.json"), b"2")
+        mode = os.stat(os.path.join(self.destination, "nested/deep/run.sh")).st_mode
+        self.assertFalse(mode & stat.S_ISUID)
+
+    def test_extract_unsafe(self) -> None:
+        """Test unsafe member stops extraction before it is written, files read before are finished."""
+        up = make_member("d/up", kind=tarfile.SYMTYPE, link="..")
+        escape = make_member("d/x", kind=tarfile.SYMTYPE, link="up/..")
+        # link redirected outside of destination by link created after it
+        redirected = [
+            make_member("link", kind=tarfile.SYMTYPE, link="b/c/../.."),
+            make_member("b", kind=tarfile.SYMTYPE, link="."),
+        ]
+        inputs = [
+            ([make_member("/etc/absolute.json", b"x")], "is outside of destination"),
+            ([make_member("templates/../../escape.json", b"x")], "is outside of destination"),
+            ([make_member("device", kind=tarfile.CHRTYPE)], "is not a file, directory or link"),
+            ([make_member("fifo", kind=tarfile.FIFOTYPE)], "is not a file, directory or link"),
+            ([make_member("link", kind=tarfile.SYMTYPE, link="../escape.json")], "points outside of destination"),
+            ([make_member("link", kind=tarfile.SYMTYPE, link="/etc/passwd")], "points outside of destination"),
+            ([make_member("link", kind=tarfile.LNKTYPE, link="../escape.json")], "points outside of destination"),
+            ([up, escape, make_member("h", kind=tarfile.LNKTYPE, link="d/x/escape.json")], "points outside"),
+            ([up, make_member("link", kind=tarfile.LNKTYPE, link="d/up/../escape.json")], "points outside"),
+            (redirected, "points outside of destination"),
+            ([*redirected, make_member("link/x", kind=tarfile.LNKTYPE, link="first.json")], "points outside"),
+        ]
+
+        for members, message in inputs:
+            with self.subTest(member=members[-1][0].name, message=message):
+                shutil.rmtree(self.destination)
+                os.makedirs(self.destination)
+                with self.assertRaisesRegex(UnsafeArchiveError, message):
+                    self.extract([make_member("first.json", b"first"), *members])
+
+                self.assertEqual(self.read("first.json"), b"first")
+                self.assertFalse(os.path.lexists(os.path.join(self.directory.name, "escape.json")))
+                for name in ("link", "h", "d/x"):
+                    self.assertFalse(os.path.lexists(os.path.join(self.destination, name)))
+
+    def test_extract_symlinked_directory(self) -> None:
+        """Test files are not written through link extracted from the same archive."""
+        members = [
+            make_member("templates", kind=tarfile.SYMTYPE, link="."),
+            make_member("templates/1.json", b"1"),
+        ]
+
+        with self.assertRaises(FileExistsError):
+            self.extract(members)
+
+        self.assertTrue(os.path.isdir(os.path.join(self.destination, "templates")))
+
+    def test_extract_duplicate_members(self) -> None:
+        """Test last of members with the same name wins even if earlier write is slower."""
+        def slow_first(target: str, data: bytes, mode: int) -> None:
+            if data == b"0":
+                time.sleep(0.05)
+            write_file(target, data, mode)
+
+        with mock.patch("service.file_structures.write_file", side_effect=slow_first):
+            self.extract([make_member("1.json", str(index).encode()) for index in range(3)], threads=3)
+
+        self.assertEqual(self.read("1.json"), b"2")
+
+    def test_extract_write_error(self) -> None:
+        """Test error of file write in pool thread is raised."""
+        with mock.patch("service.file_structures.write_file", side_effect=OSError("No space left on device")):
+            with self.assertRaisesRegex(OSError, "No space left on device"):
+                self.extract([make_member("1.json", b"1")])
+
+    def test_extract_creates_directory_once(self) -> None:
+        """Test existing directories are not looked up again for every file."""
+        members = [make_member(f"templates/{index}.json", b"{}") for index in range(5)]
+
+        with mock.patch("service.file_structures.os.makedirs") as makedirs_mock:
+            with mock.patch("service.file_structures.write_file") as write_file_mock:
+                self.extract(members)
+
+        self.assertEqual(write_file_mock.call_count, 5)
+        templates = os.path.join(os.path.realpath(self.destination), "templates")
+        makedirs_mock.assert_called_once_with(templates, exist_ok=True)
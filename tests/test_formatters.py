@@ -105,6 +105,7 @@ class TestFormatter(TestCase):
         config_mock.get.return_value = self.rules
 
         msg = formatter.format(self.in_msg)
+        formatter.format(self.in_msg)
 
         config_mock.get.assert_called_once_with("message")
         self.assertDictEqual(msg, self.out_msg)
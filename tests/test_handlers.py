@@ -41,6 +41,7 @@ class TestBundleGenHandlers(TestCase):
         self.config_mock = mock.MagicMock(name="Config")
         self.formatter_mock = mock.MagicMock(name="Formatter")
         self.file_structure_mock = mock.MagicMock(name="FileStructure")
+        self.retry_mock = mock.MagicMock(name="RetryPolicy")
 
         self.body = b"body"
 
@@ -55,7 +56,34 @@ class TestBundleGenHandlers(TestCase):
         self.formatter_mock.reset_mock(return_value=True, side_effect=True)
         self.file_structure_mock.reset_mock(return_value=True, side_effect=True)
 
-        return BundleGenHandler(self.config_mock, self.formatter_mock, self.file_structure_mock)
+        self.retry_mock.reset_mock(return_value=True, side_effect=True)
+        self.retry_mock.schedule.return_value = False
+
+        retry_policy_mock = mock.MagicMock(name="RetryPolicy", return_value=self.retry_mock)
+        with mock.patch.multiple(
+            "service.handlers",
+            RetryPolicy=retry_policy_mock,
+            Affinity=mock.DEFAULT,
+            Batch=mock.DEFAULT,
+            RecentTickets=mock.DEFAULT,
+            DiskSpace=mock.DEFAULT,
+            Deadlines=mock.DEFAULT,
+            Watchdog=mock.DEFAULT,
+        ) as mocks:
+            handler = BundleGenHandler(self.config_mock, self.formatter_mock, self.file_structure_mock)
+
+        retry_policy_mock.assert_called_once_with(self.config_mock)
+        mocks["Affinity"].assert_called_once_with(self.config_mock)
+        mocks["Batch"].assert_called_once_with(self.config_mock)
+        mocks["RecentTickets"].assert_called_once_with(self.config_mock)
+        mocks["RecentTickets"].return_value.seen.return_value = False
+        mocks["DiskSpace"].assert_called_once_with(self.config_mock)
+        mocks["DiskSpace"].return_value.admit.return_value = True
+        mocks["Deadlines"].assert_called_once_with(self.config_mock)
+        mocks["Deadlines"].return_value.expired.return_value = False
+        mocks["Deadlines"].return_value.deadline.return_value = None
+        mocks["Watchdog"].assert_called_once_with(self.config_mock)
+        return handler
 
     def test_init(self) -> None:
         """Test handler initialization."""
@@ -70,10 +98,32 @@ class TestBundleGenHandlers(TestCase):
     def test_abstract_methods(self) -> None:
         """Test set of abstract methods in class."""
         self.assertSetEqual(
-            set(["make_src_msg", "make_dst_msg", "h_request", "h_response"]),
+            set(["make_src_msg", "make_dst_msg", "h_request", "h_response", "abort_outstanding", "affinity_key",
+                 "h_batch"]),
             Handler.__dict__["__abstractmethods__"],
         )
 
+    def test_outstanding(self) -> None:
+        """Test `outstanding` property counts tickets waiting for reply."""
+        handler = self._get_handler()
+        handler.launch_times = {"uuid1": 1.0, "uuid2": 2.0}
+
+        self.assertEqual(handler.outstanding, 2)
+        self.assertEqual(Handler.outstanding.fget(handler), 0)  # type: ignore[attr-defined]
+
+    def test_preload(self) -> None:
+        """Test `preload()` creates all codecs."""
+        handler = self._get_handler()
+
+        with mock.patch("service.handlers.get_decoder") as decoder_mock:
+            with mock.patch("service.handlers.get_encoder") as encoder_mock:
+                handler.preload()
+
+        self.assertEqual(decoder_mock.call_count, 2)
+        self.assertEqual(encoder_mock.call_count, 2)
+        self.assertEqual(set(handler.decoders), {"in_decoder", "status_decoder"})
+        self.assertEqual(set(handler.encoders), {"out_encoder", "status_encoder"})
+
     def test_encoder_properties(self) -> None:
         """Test `*_encoder` properties."""
         inputs = [
@@ -148,12 +198,14 @@ class TestBundleGenHandlers(TestCase):
         """Test `_send_status_message()` method."""
         handler = self._get_handler()
         channel_mock = mock.MagicMock(name="BlockingChannel")
-        msg = {"some": "message"}
+        msg = {"phaseCode": Statuses.GENERATION_LAUNCHED.value}
 
         with mock.patch("service.handlers.BundleGenHandler.status_encoder") as status_encoder_mock:
             with mock.patch("service.handlers.BasicProperties") as bp_mock:
-                handler._send_status_message(channel_mock, msg, "uuid")  # pylint: disable=W0212
+                with mock.patch("service.handlers.count_status_message") as count_mock:
+                    handler._send_status_message(channel_mock, msg, "uuid")  # pylint: disable=W0212
 
+                count_mock.assert_called_once_with(Statuses.GENERATION_LAUNCHED.value)
                 self.config_mock.get.assert_called_once_with("worker.status_queue")
                 status_encoder_mock.encode.assert_called_once_with(msg)
                 bp_mock.assert_called_once_with(
@@ -212,21 +264,57 @@ class TestBundleGenHandlers(TestCase):
                     uuid,
                 )
 
+    def test_get_priority(self) -> None:
+        """Test `get_priority()` method."""
+        handler = self._get_handler()
+        config = {"worker.max_priority": 10, "priority.header": "x-priority", "priority.field": "priority"}
+        self.config_mock.get.side_effect = lambda key, default=None: config.get(key, default)
+        inputs = [
+            ((None, None, None), 0),
+            ((3, "7", 8), 3),
+            ((None, "7", 8), 7),
+            ((None, None, 8), 8),
+            ((None, None, 42), 10),
+            ((None, "-1", None), 0),
+            ((None, "urgent", None), 0),
+        ]
+
+        for (prop, header, field), priority in inputs:
+            with self.subTest(prop=prop, header=header, field=field):
+                props = mock.MagicMock(name="Properties", priority=prop)
+                props.headers = {"x-priority": header} if header is not None else None
+                msg = {"priority": field} if field is not None else {}
+
+                self.assertEqual(handler.get_priority(msg, props), priority)
+
+        config["worker.max_priority"] = 0
+        self.assertIsNone(handler.get_priority({"priority": 5}, self.properties))
+
     def test_send_bundlegen_msg(self) -> None:
         """Test `send_bundlegen_msg()` method."""
         handler = self._get_handler()
         channel_mock = mock.MagicMock(name="BlockingChannel")
-        msg = {"some": "message"}
+        msg = {"uuid": "uuid"}
 
         with mock.patch("service.handlers.BundleGenHandler.out_encoder") as out_encoder_mock:
             with mock.patch("service.handlers.BasicProperties") as bp_mock:
-                handler.send_bundlegen_msg(channel_mock, msg)
-
+                with mock.patch("service.handlers.time.monotonic", return_value=42.0):
+                    with mock.patch("service.handlers.tracer") as tracer_mock:
+                        with mock.patch("service.handlers.inject") as inject_mock:
+                            handler.send_bundlegen_msg(channel_mock, msg, 5)
+
+                tracer_mock.start_span.assert_called_once_with("bundlegen")
+                tracer_mock.span.assert_called_once_with("publish")
+                inject_mock.assert_called_once_with(tracer_mock.start_span())
+                self.assertDictEqual(handler.launch_times, {"uuid": 42.0})
+                self.assertDictEqual(handler.pending_spans, {"uuid": tracer_mock.start_span()})
                 self.config_mock.get.assert_called_once_with("worker.out_queue")
                 out_encoder_mock.encode.assert_called_once_with(msg)
                 bp_mock.assert_called_once_with(
                     delivery_mode=2,  # make message persistent
                     reply_to="amq.rabbitmq.reply-to",
+                    headers=inject_mock(),
+                    priority=5,
                 )
                 channel_mock.basic_publish.assert_called_once_with(
                     exchange="",
@@ -238,6 +326,7 @@ class TestBundleGenHandlers(TestCase):
     def test_h_request_error(self) -> None:
         """Test `h_request()` method for error."""
         handler = self._get_handler()
+        handler.request_id_map[self.properties.headers["x-request-id"]] = "id"
 
         with mock.patch.object(handler, "make_src_msg") as prepare_mock:
             with mock.patch.object(handler, "send_error_msg") as send_mock:
@@ -255,10 +344,62 @@ class TestBundleGenHandlers(TestCase):
                 self.channel.basic_ack.assert_called_once_with(
                     delivery_tag=self.method.delivery_tag,
                 )
+                self.assertDictEqual(handler.request_id_map, {})
+
+    def test_h_request_retry(self) -> None:
+        """Test `h_request()` method does not report failure of message scheduled for retry."""
+        handler = self._get_handler()
+        exc = TimeoutError("S3")
+        self.retry_mock.schedule.return_value = True
+
+        with mock.patch.object(handler, "make_src_msg", side_effect=exc):
+            with mock.patch.object(handler, "send_error_msg") as send_mock:
+                handler.h_request(self.channel, self.method, self.properties, self.body)
+
+        self.retry_mock.schedule.assert_called_once_with(self.channel, self.properties, self.body, exc)
+        send_mock.assert_not_called()
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=self.method.delivery_tag)
+
+    def test_h_request_error_ends_ticket_span(self) -> None:
+        """Test `h_request()` method finishes ticket span with error."""
+        handler = self._get_handler()
+
+        with mock.patch.object(handler, "make_src_msg"):
+            with mock.patch.object(handler, "send_error_msg"):
+                with mock.patch("service.handlers.tracer") as tracer_mock:
+                    self.formatter_mock.format.side_effect = KeyError("key")
+
+                    handler.h_request(self.channel, self.method, self.properties, self.body)
+
+                    tracer_mock.start_span.assert_called_once_with("ticket", None)
+                    tracer_mock.end_span.assert_called_once_with(tracer_mock.start_span(), str(KeyError("key")))
+
+    def test_end_ticket_span(self) -> None:
+        """Test `end_ticket_span()` method finishes BundleGen span and its parents."""
+        handler = self._get_handler()
+        ticket_span = mock.MagicMock(name="TicketSpan")
+        ticket_span.parent = None
+        bundlegen_span = mock.MagicMock(name="BundleGenSpan")
+        bundlegen_span.parent = ticket_span
+        handler.pending_spans["uuid"] = bundlegen_span
+
+        with mock.patch("service.handlers.tracer") as tracer_mock:
+            handler.end_ticket_span("uuid", "error")
+            handler.end_ticket_span("uuid", "error")
+
+            tracer_mock.end_span.assert_has_calls(
+                [
+                    mock.call(bundlegen_span, "error"),
+                    mock.call(ticket_span, "error"),
+                ],
+            )
+            self.assertEqual(tracer_mock.end_span.call_count, 2)
+            self.assertDictEqual(handler.pending_spans, {})
 
     def test_h_request_error_without_header(self) -> None:
         """Test `h_request()` method for error."""
         handler = self._get_handler()
+        handler.request_id_map[self.properties.headers["x-request-id"]] = "id"
 
         with mock.patch.object(handler, "make_src_msg") as prepare_mock:
             with mock.patch.object(handler, "send_error_msg") as send_mock:
@@ -281,6 +422,7 @@ class TestBundleGenHandlers(TestCase):
     def test_h_request_error_headers_none(self) -> None:
         """Test `h_request()` method for error."""
         handler = self._get_handler()
+        handler.request_id_map[self.properties.headers["x-request-id"]] = "id"
 
         with mock.patch.object(handler, "make_src_msg") as prepare_mock:
             with mock.patch.object(handler, "send_error_msg") as send_mock:
@@ -308,7 +450,9 @@ class TestBundleGenHandlers(TestCase):
             with mock.patch.object(handler, "get_template_filename") as gtf_mock:
                 with mock.patch.object(handler, "send_bundlegen_msg") as publish_mock:
                     with mock.patch.object(handler, "send_success_msg") as send_mock:
-                        with mock.patch("service.handlers.os") as os_mock:
+                        with mock.patch("service.handlers.os") as os_mock, mock.patch.object(
+                            handler, "get_priority"
+                        ) as priority_mock:
                             os_mock.path.exists.return_value = False
                             handler.h_request(self.channel, self.method, self.properties, self.body)
 
@@ -318,7 +462,6 @@ class TestBundleGenHandlers(TestCase):
                                 [
                                     mock.call("searchpath"),
                                     mock.call("outputdir"),
-                                    mock.call("outputdir"),
                                 ],
                             )
                             self.file_structure_mock.create_structure_for.assert_called_once_with(
@@ -334,6 +477,8 @@ class TestBundleGenHandlers(TestCase):
                             publish_mock.assert_called_once_with(
                                 self.channel,
                                 self.formatter_mock.format(),
+                                priority_mock(),
+                                None,
                             )
                             prepare_mock().__getitem__.assert_called_once_with("id")
                             send_mock.assert_called_once_with(
@@ -345,9 +490,25 @@ class TestBundleGenHandlers(TestCase):
                                 delivery_tag=self.method.delivery_tag,
                             )
 
+    def test_h_request_priority(self) -> None:
+        """Test `h_request()` sends ticket with priority of source message."""
+        handler = self._get_handler()
+
+        with mock.patch.object(handler, "prepare_ticket", return_value=({"id": "id"}, {"uuid": "id"})):
+            with mock.patch.object(handler, "get_priority", return_value=7) as priority_mock:
+                with mock.patch.object(handler, "send_bundlegen_msg") as publish_mock:
+                    with mock.patch.object(handler, "send_success_msg"):
+                        handler.h_request(self.channel, self.method, self.properties, self.body)
+
+        priority_mock.assert_called_once_with({"id": "id"}, self.properties)
+        publish_mock.assert_called_once_with(self.channel, {"uuid": "id"}, 7, None)
+
     def test_h_response_with_success_response(self) -> None:
         """Test `h_response()` method with success response."""
         handler = self._get_handler()
+        handler.request_id_map["uuid"] = "id"
+        handler.launch_times["uuid"] = 1.0
+        watchdog_mock = handler.watchdog = mock.MagicMock(name="Watchdog")
 
         with mock.patch.object(handler, "decode_status_message") as decode_mock:
             with mock.patch.object(handler, "send_success_msg") as send_mock:
@@ -361,18 +522,69 @@ class TestBundleGenHandlers(TestCase):
                     Statuses.GENERATION_COMPLETED,
                     decode_mock()["uuid"],
                 )
+                watchdog_mock.release.assert_called_once_with("uuid")
+                self.assertDictEqual(handler.request_id_map, {})
+
+    def test_h_response_observes_turnaround(self) -> None:
+        """Test `h_response()` method observes BundleGen turnaround for launched tickets and drops late replies."""
+        handler = self._get_handler()
+        handler.launch_times["uuid"] = 10.0
+
+        with mock.patch.object(handler, "decode_status_message") as decode_mock:
+            with mock.patch.object(handler, "send_success_msg") as send_mock:
+                with mock.patch("service.handlers.observe_turnaround") as turnaround_mock:
+                    with mock.patch("service.handlers.count_late_reply") as late_mock:
+                        with mock.patch("service.handlers.time.monotonic", return_value=15.0):
+                            decode_mock.return_value = {"success": True, "uuid": "uuid"}
+
+                            handler.h_response(self.channel, self.method, self.properties, self.body)
+                            handler.h_response(self.channel, self.method, self.properties, self.body)
+
+        turnaround_mock.assert_called_once_with(5.0)
+        send_mock.assert_called_once()
+        late_mock.assert_called_once_with()
+        self.assertDictEqual(handler.launch_times, {})
+
+    def test_abort_outstanding(self) -> None:
+        """Test `abort_outstanding()` reports tickets waiting for reply as failed."""
+        handler = self._get_handler()
+        handler.launch_times = {"uuid1": 1.0, "uuid2": 2.0}
+
+        with mock.patch.object(handler, "send_error_msg") as send_mock:
+            with mock.patch.object(handler, "end_ticket_span") as end_span_mock:
+                handler.abort_outstanding(self.channel, "shutdown")
+
+        self.assertDictEqual(handler.launch_times, {})
+        end_span_mock.assert_has_calls([mock.call("uuid1", "shutdown"), mock.call("uuid2", "shutdown")])
+        send_mock.assert_has_calls([
+            mock.call(self.channel, "shutdown", "uuid1"),
+            mock.call(self.channel, "shutdown", "uuid2"),
+        ])
+
+        handler.launch_times = {"uuid1": 1.0, "uuid2": 2.0}
+        handler.request_id_map = {"uuid1": "id1", "uuid2": "id2"}
+        with mock.patch.object(handler, "send_error_msg") as send_mock:
+            with mock.patch.object(handler, "end_ticket_span"):
+                handler.abort_outstanding(self.channel, "timeout", ["uuid2", "uuid3"])
+
+        self.assertDictEqual(handler.launch_times, {"uuid1": 1.0})
+        self.assertDictEqual(handler.request_id_map, {"uuid1": "id1"})
+        send_mock.assert_called_once_with(self.channel, "timeout", "uuid2")
 
     def test_h_response_with_fail_response(self) -> None:
         """Test `h_response()` method with fail response."""
         handler = self._get_handler()
+        handler.launch_times["uuid"] = 1.0
 
         with mock.patch.object(handler, "decode_status_message") as decode_mock:
             with mock.patch.object(handler, "send_error_msg") as send_mock:
-                decode_mock.return_value = {"success": False, "uuid": "uuid"}
+                with mock.patch.object(handler, "end_ticket_span") as end_span_mock:
+                    decode_mock.return_value = {"success": False, "uuid": "uuid"}
 
-                handler.h_response(self.channel, self.method, self.properties, self.body)
+                    handler.h_response(self.channel, self.method, self.properties, self.body)
 
                 decode_mock.assert_called_once_with(self.body)
+                end_span_mock.assert_called_once_with("uuid", "Got error from BundleGen")
                 send_mock.assert_called_once_with(
                     self.channel,
                     "Got error from BundleGen",
@@ -400,7 +612,7 @@ class TestBundleGenHandlers(TestCase):
             self.assertDictEqual(out, {**msg, **env, **headers})
 
     def test_get_template_filename(self) -> None:
-        """Test `get_template_filename()` method."""
+        """Test `get_template_filename()` and `affinity_key()` methods."""
         handler = self._get_handler()
         msg = {"some": "message"}
 
@@ -409,6 +621,25 @@ class TestBundleGenHandlers(TestCase):
         self.config_mock.get.assert_called_once_with("templates_archive_name")
         self.config_mock.get().format.assert_called_once_with(**msg)
 
+        # affinity key is template archive name of extended input message, empty if message is invalid
+        self.properties.headers = None
+
+        with mock.patch.multiple(
+            handler,
+            decode_input_message=mock.DEFAULT,
+            extend_message=mock.DEFAULT,
+            get_template_filename=mock.DEFAULT,
+        ) as mocks:
+            key = handler.affinity_key(self.body, self.properties)
+
+            self.assertEqual(key, mocks["get_template_filename"].return_value)
+            mocks["decode_input_message"].assert_called_once_with(self.body)
+            mocks["extend_message"].assert_called_once_with(mocks["decode_input_message"].return_value, {})
+            mocks["get_template_filename"].assert_called_once_with(mocks["extend_message"].return_value)
+
+            mocks["get_template_filename"].side_effect = KeyError("platformName")
+            self.assertEqual(handler.affinity_key(self.body, self.properties), "")
+
     def test_make_src_msg(self) -> None:
         """Test `make_src_msg()` method."""
         handler = self._get_handler()
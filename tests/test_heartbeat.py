@@ -0,0 +1,151 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for heartbeat slots and health probes."""
+from unittest import (
+    mock,
+    TestCase,
+)
+import os
+import tempfile
+
+from service.heartbeat import (
+    create_slots,
+    get_heartbeat_path,
+    get_workers_state,
+    HeartbeatSlot,
+    is_live,
+    is_ready,
+    pid_exists,
+    read_slots,
+)
+
+
+class TestHeartbeat(TestCase):
+    """Base TestCase for heartbeat functionality."""
+
+    def setUp(self) -> None:
+        """Set up env before each test."""
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.path = os.path.join(self.tmp_dir.name, "heartbeat")
+
+    def tearDown(self) -> None:
+        """Clean up env after each test."""
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def test_get_heartbeat_path(self) -> None:
+        """Test `get_heartbeat_path()` function."""
+        with mock.patch.dict("service.heartbeat.os.environ", {"HEARTBEAT_FILE": "path"}):
+            self.assertEqual(get_heartbeat_path(), "path")
+
+    def test_empty_slots(self) -> None:
+        """Test free slots are not reported."""
+        create_slots(3, self.path)
+
+        self.assertEqual(os.path.getsize(self.path), 3 * 64)
+        self.assertListEqual(read_slots(self.path), [])
+
+    def test_slot_lifecycle(self) -> None:
+        """Test slot updates are visible for readers."""
+        create_slots(2, self.path)
+        slot = HeartbeatSlot(1, self.path)
+
+        slot.start()
+        slot.set_connected(True)
+        slot.message_started()
+        slot.message_started()
+        slot.message_finished()
+
+        slots = read_slots(self.path)
+
+        self.assertEqual(len(slots), 1)
+        self.assertEqual(slots[0]["pid"], os.getpid())
+        self.assertEqual(slots[0]["connected"], 1)
+        self.assertEqual(slots[0]["in_flight"], 1)
+        self.assertGreater(slots[0]["last_message_at"], 0)
+        self.assertGreaterEqual(slots[0]["heartbeat_at"], slots[0]["started_at"])
+        self.assertGreaterEqual(slots[0]["busy"], 0)
+
+    def test_busy(self) -> None:
+        """Test duration of every message is accumulated in `busy`, also when messages overlap."""
+        create_slots(1, self.path)
+        slot = HeartbeatSlot(0, self.path)
+        slot.start(2)
+        events = [(100.0, slot.message_started), (102.5, slot.message_finished), (110.0, slot.message_started)]
+        events += [(111.0, slot.message_started), (112.0, slot.update), (113.0, slot.message_finished)]
+
+        for now, event in events + [(116.0, slot.message_finished)]:
+            with mock.patch("service.heartbeat.time.time", return_value=now):
+                event()
+
+        self.assertEqual(read_slots(self.path)[0]["busy"], 2.5 + 6.0 + 2.0)
+        self.assertEqual(read_slots(self.path)[0]["capacity"], 2)
+
+    def test_clear(self) -> None:
+        """Test cleared slot is free."""
+        create_slots(2, self.path)
+        HeartbeatSlot(0, self.path).start()
+        HeartbeatSlot(1, self.path).start()
+
+        HeartbeatSlot(0, self.path).clear()
+
+        self.assertEqual(len(read_slots(self.path)), 1)
+
+    def test_pid_exists(self) -> None:
+        """Test `pid_exists()` function."""
+        self.assertTrue(pid_exists(os.getpid()))
+
+        with mock.patch("service.heartbeat.os.kill", side_effect=ProcessLookupError()):
+            self.assertFalse(pid_exists(1))
+
+        with mock.patch("service.heartbeat.os.kill", side_effect=PermissionError()):
+            self.assertTrue(pid_exists(1))
+
+    def test_get_workers_state(self) -> None:
+        """Test `get_workers_state()` marks stalled workers as not alive."""
+        self.assertListEqual(get_workers_state(self.path), [])
+
+        create_slots(1, self.path)
+        HeartbeatSlot(0, self.path).start()
+
+        with mock.patch.dict("service.heartbeat.os.environ", {"HEARTBEAT_TIMEOUT": "60"}):
+            self.assertTrue(get_workers_state(self.path)[0]["alive"])
+
+            with mock.patch("service.heartbeat.time.time", return_value=10**10):
+                self.assertFalse(get_workers_state(self.path)[0]["alive"])
+
+    def test_probes(self) -> None:
+        """Test `is_ready()` and `is_live()` functions."""
+        connected = {"alive": True, "connected": 1}
+        disconnected = {"alive": True, "connected": 0}
+        dead = {"alive": False, "connected": 1}
+        inputs = [
+            ([], False, False),
+            ([connected], True, True),
+            ([disconnected], False, True),
+            ([connected, dead], True, False),
+            ([dead], False, False),
+        ]
+
+        for workers, ready, live in inputs:
+            with self.subTest(workers=workers):
+                self.assertEqual(is_ready(workers), ready)
+                self.assertEqual(is_live(workers), live)
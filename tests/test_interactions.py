@@ -39,7 +39,7 @@ class TestIntegrationWithRabbit(TestCase):
     def setUp(self) -> None:
         """Set up inner state of Worker."""
         super().setUp()
-        self.source_message = {"id": "uuid", "searchpath": "searchpath", "outputdir": "outputdir"}
+        self.source_message = {"id": "uuid", "uuid": "uuid", "searchpath": "searchpath", "outputdir": "outputdir"}
         self.generation_message = {
             "id": "uuid",
             "phaseCode": Statuses.GENERATION_LAUNCHED,
@@ -81,7 +81,7 @@ class TestIntegrationWithRabbit(TestCase):
                                     handler.h_request(
                                         channel_mock,
                                         mock.MagicMock(name="Method"),
-                                        mock.MagicMock(name="Properties"),
+                                        mock.MagicMock(name="Properties", headers={}, timestamp=None),
                                         json.dumps(self.source_message).encode("utf8"),
                                     )
                                     handler.h_response(
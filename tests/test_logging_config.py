@@ -0,0 +1,150 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for logging configuration."""
+from unittest import (
+    mock,
+    TestCase,
+)
+import json
+import logging
+import sys
+
+from service.logging_config import (
+    configure_logging,
+    flush_logging,
+    HANDLERS,
+    JsonFormatter,
+    QueueListenerHandler,
+    restart_handlers,
+    SamplingFilter,
+)
+
+
+class TestLoggingConfig(TestCase):
+    """Base TestCase for logging configuration."""
+
+    @staticmethod
+    def _record(name: str = "logger", level: int = logging.INFO, msg: str = "message %s") -> logging.LogRecord:
+        """Create log record."""
+        return logging.LogRecord(name, level, "path/file.py", 10, msg, ("arg",), None, "func")
+
+    def test_json_formatter(self) -> None:
+        """Test `JsonFormatter` output."""
+        data = json.loads(JsonFormatter().format(self._record()))
+
+        self.assertEqual(data["level"], "INFO")
+        self.assertEqual(data["logger"], "logger")
+        self.assertEqual(data["location"], "file.py:func:10")
+        self.assertEqual(data["message"], "message arg")
+        self.assertNotIn("exception", data)
+
+        try:
+            raise KeyError("key")
+        except KeyError:
+            record = self._record()
+            record.exc_info = sys.exc_info()
+
+        self.assertIn("KeyError", json.loads(JsonFormatter().format(record))["exception"])
+
+    def test_sampling_filter_parse(self) -> None:
+        """Test parsing of sampling rates."""
+        self.assertDictEqual(SamplingFilter.parse(""), {})
+        self.assertDictEqual(
+            SamplingFilter.parse("Config:0,BundleGenHandler:0.5"),
+            {"Config": 0.0, "BundleGenHandler": 0.5},
+        )
+
+    def test_sampling_filter(self) -> None:
+        """Test records are sampled only for configured loggers below WARNING level."""
+        sampling = SamplingFilter({"sampled": 0.5})
+
+        with mock.patch("service.logging_config.random.random", side_effect=[0.4, 0.6]):
+            self.assertTrue(sampling.filter(self._record("other")))
+            self.assertTrue(sampling.filter(self._record("sampled", logging.ERROR)))
+            self.assertTrue(sampling.filter(self._record("sampled")))
+            self.assertFalse(sampling.filter(self._record("sampled")))
+
+    def test_queue_listener_handler(self) -> None:
+        """Test records are handled by background listener."""
+        target = mock.MagicMock(name="Handler", level=logging.NOTSET)
+        record = self._record()
+
+        handler = QueueListenerHandler([target])
+
+        handler.handle(record)
+        handler.flush()
+        target.handle.assert_called_once()
+        self.assertEqual(target.handle.call_args[0][0].getMessage(), "message arg")
+
+        queue = handler.queue
+        restart_handlers()
+        self.assertIsNot(handler.queue, queue)
+
+        handler.handle(record)
+        handler.close()
+        self.assertEqual(target.handle.call_count, 2)
+        self.assertNotIn(handler, HANDLERS)
+
+    def test_queue_listener_handler_prepare(self) -> None:
+        """Test arguments are merged into message in calling thread and traceback is rendered there."""
+        handler = QueueListenerHandler([])
+        self.addCleanup(handler.close)
+        args = {"status": "queued"}
+        record = logging.LogRecord("logger", logging.INFO, "path/file.py", 10, "ticket %s", (args,), None, "func")
+
+        prepared = handler.prepare(record)
+        args["status"] = "changed"
+
+        self.assertEqual(prepared.msg, "ticket {'status': 'queued'}")
+        self.assertIsNone(prepared.args)
+        self.assertIs(record.args, args)
+
+        try:
+            raise KeyError("key")
+        except KeyError:
+            record.exc_info = sys.exc_info()
+
+        prepared = handler.prepare(record)
+        self.assertIsNone(prepared.exc_info)
+        self.assertIn("KeyError", logging.Formatter().format(prepared))
+        self.assertIn("KeyError", json.loads(JsonFormatter().format(prepared))["exception"])
+
+    @mock.patch("service.logging_config.logging.config.dictConfig")
+    @mock.patch("service.logging_config.QueueListenerHandler")
+    def test_configure_logging(self, handler_mock: mock.MagicMock, dict_config_mock: mock.MagicMock) -> None:
+        """Test root logger writes through queue handler."""
+        root = logging.getLogger()
+        handlers = root.handlers
+
+        try:
+            root.handlers = [mock.MagicMock(name="console")]
+            console = root.handlers[0]
+
+            configure_logging()
+
+            dict_config_mock.assert_called_once()
+            handler_mock.assert_called_once_with([console])
+            handler_mock().addFilter.assert_called_once()
+            self.assertListEqual(root.handlers, [handler_mock()])
+
+            flush_logging()
+            handler_mock().flush.assert_called_once_with()
+        finally:
+            root.handlers = handlers
@@ -23,37 +23,71 @@ from unittest import (
     TestCase,
 )
 
-from service.worker import main
+from service.worker import (
+    create_worker,
+    main,
+)
 
 
 class TestMain(TestCase):
     """Base TestCase for `main` function tests."""
 
-    def setUp(self) -> None:
-        """Set up env before each test."""
-        super().setUp()
-        self.num_process = 2
-
     @mock.patch("service.worker.create_dirs_from_envs")
     @mock.patch("service.worker.Config")
-    @mock.patch("service.worker.Worker")
-    @mock.patch("service.worker.S3Downloader")
+    @mock.patch("service.worker.Supervisor")
     @mock.patch("service.worker.os.environ.get")
     def test_main(
         self,
         os_get_mock: mock.MagicMock,
-        _: mock.MagicMock,
-        worker_mock: mock.MagicMock,
+        supervisor_mock: mock.MagicMock,
         config_mock: mock.MagicMock,
         create_dirs_mock: mock.MagicMock,
     ) -> None:
         """Test calls inside main function."""
-        config_mock().get.return_value = self.num_process
+        supervisor_mock.return_value.policy.max_workers = 4
+
+        with mock.patch("service.worker.create_slots") as create_slots_mock:
+            with mock.patch.multiple(
+                "service.worker",
+                configure_logging=mock.DEFAULT,
+                preload_boto3=mock.DEFAULT,
+                gc=mock.DEFAULT,
+            ) as mocks:
+                main()
 
-        main()
+        mocks["configure_logging"].assert_called_once_with()
+        mocks["preload_boto3"].assert_called_once_with(config_mock.return_value)
+        mocks["gc"].freeze.assert_called_once_with()
 
-        create_dirs_mock.assert_called_once_with(config_mock())
-        config_mock().get.assert_called_once_with("concurency")
         os_get_mock.assert_called_once_with("BUNDLE_CONFIG_FILE", "config_dev.json")
-        self.assertEqual(worker_mock().start.call_count, self.num_process)
-        self.assertEqual(worker_mock().join.call_count, self.num_process)
+        create_dirs_mock.assert_called_once_with(config_mock.return_value)
+        config, factory = supervisor_mock.call_args[0]
+        self.assertEqual(config, config_mock.return_value)
+        self.assertEqual(factory.func, create_worker)
+        self.assertEqual(factory.args, (config_mock.return_value,))
+        create_slots_mock.assert_called_once_with(4)
+        supervisor_mock.return_value.run.assert_called_once_with()
+
+    @mock.patch("service.worker.BundleGenFileStructure")
+    @mock.patch("service.worker.BundleGenFormatter")
+    @mock.patch("service.worker.BundleGenHandler")
+    @mock.patch("service.worker.HeartbeatSlot")
+    @mock.patch("service.worker.Worker")
+    def test_create_worker(
+        self,
+        worker_mock: mock.MagicMock,
+        heartbeat_slot_mock: mock.MagicMock,
+        handler_mock: mock.MagicMock,
+        formatter_mock: mock.MagicMock,
+        _: mock.MagicMock,
+    ) -> None:
+        """Test worker is created with preloaded handler and heartbeat slot of given index."""
+        config_mock = mock.MagicMock(name="Config")
+
+        worker = create_worker(config_mock, 3)
+
+        self.assertEqual(worker, worker_mock.return_value)
+        formatter_mock.return_value.compile.assert_called_once_with()
+        handler_mock.return_value.preload.assert_called_once_with()
+        heartbeat_slot_mock.assert_called_once_with(3)
+        worker_mock.assert_called_once_with(config_mock, handler_mock.return_value, heartbeat_slot_mock.return_value)
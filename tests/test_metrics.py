@@ -0,0 +1,163 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for metrics module."""
+from unittest import (
+    mock,
+    TestCase,
+)
+
+from prometheus_client import REGISTRY
+
+from service.metrics import (
+    count_disk_admission,
+    count_duplicate,
+    count_expired,
+    count_late_reply,
+    count_retry,
+    count_status_message,
+    count_template_cache,
+    export,
+    get_registry,
+    measure,
+    observe_startup,
+    observe_turnaround,
+)
+
+
+class TestMetrics(TestCase):
+    """Base TestCase for metrics functions."""
+
+    @staticmethod
+    def _sample(name: str, **labels: str) -> float:
+        """Get current value of sample from default registry."""
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_measure_success(self) -> None:
+        """Test `measure()` observes duration of stage."""
+        before = self._sample("bundlegen_service_stage_duration_seconds_count", stage="decode")
+
+        with measure("decode"):
+            pass
+
+        self.assertEqual(self._sample("bundlegen_service_stage_duration_seconds_count", stage="decode"), before + 1)
+
+    def test_measure_failure(self) -> None:
+        """Test `measure()` counts failed stage and reraises exception."""
+        before = self._sample("bundlegen_service_stage_failures_total", stage="unpack")
+
+        with self.assertRaises(KeyError):
+            with measure("unpack"):
+                raise KeyError()
+
+        self.assertEqual(self._sample("bundlegen_service_stage_failures_total", stage="unpack"), before + 1)
+
+    def test_observe_turnaround(self) -> None:
+        """Test `observe_turnaround()` function."""
+        before = self._sample("bundlegen_service_bundlegen_turnaround_seconds_sum")
+
+        observe_turnaround(2.5)
+
+        self.assertEqual(self._sample("bundlegen_service_bundlegen_turnaround_seconds_sum"), before + 2.5)
+
+    def test_count_status_message(self) -> None:
+        """Test `count_status_message()` function."""
+        before = self._sample("bundlegen_service_status_messages_total", phase_code="BUNDLE_ERROR")
+
+        count_status_message("BUNDLE_ERROR")
+
+        self.assertEqual(self._sample("bundlegen_service_status_messages_total", phase_code="BUNDLE_ERROR"), before + 1)
+
+    def test_observe_startup(self) -> None:
+        """Test `observe_startup()` function."""
+        before = self._sample("bundlegen_service_worker_startup_seconds_count", phase="connected")
+
+        observe_startup("connected", 0.3)
+
+        self.assertEqual(self._sample("bundlegen_service_worker_startup_seconds_count", phase="connected"), before + 1)
+
+    def test_count_retry(self) -> None:
+        """Test `count_retry()` function."""
+        before = self._sample("bundlegen_service_retries_total", outcome="scheduled")
+
+        count_retry("scheduled")
+
+        self.assertEqual(self._sample("bundlegen_service_retries_total", outcome="scheduled"), before + 1)
+
+    def test_count_template_cache(self) -> None:
+        """Test `count_template_cache()` function."""
+        before = self._sample("bundlegen_service_template_cache_total", outcome="hit")
+
+        count_template_cache("hit")
+
+        self.assertEqual(self._sample("bundlegen_service_template_cache_total", outcome="hit"), before + 1)
+
+    def test_count_duplicate(self) -> None:
+        """Test `count_duplicate()` function."""
+        before = self._sample("bundlegen_service_duplicate_requests_total")
+
+        count_duplicate()
+
+        self.assertEqual(self._sample("bundlegen_service_duplicate_requests_total"), before + 1)
+
+    def test_count_disk_admission(self) -> None:
+        """Test `count_disk_admission()` function."""
+        before = self._sample("bundlegen_service_disk_admission_total", outcome="requeued")
+
+        count_disk_admission("requeued")
+
+        self.assertEqual(self._sample("bundlegen_service_disk_admission_total", outcome="requeued"), before + 1)
+
+    def test_count_expired(self) -> None:
+        """Test `count_expired()` function."""
+        before = self._sample("bundlegen_service_expired_requests_total")
+
+        count_expired()
+
+        self.assertEqual(self._sample("bundlegen_service_expired_requests_total"), before + 1)
+
+    def test_count_late_reply(self) -> None:
+        """Test `count_late_reply()` function."""
+        before = self._sample("bundlegen_service_late_replies_total")
+
+        count_late_reply()
+
+        self.assertEqual(self._sample("bundlegen_service_late_replies_total"), before + 1)
+
+    def test_get_registry(self) -> None:
+        """Test `get_registry()` for single and multiple processes."""
+        with mock.patch.dict("service.metrics.os.environ", {"PROMETHEUS_MULTIPROC_DIR": ""}):
+            self.assertIs(get_registry(), REGISTRY)
+
+        with mock.patch.dict("service.metrics.os.environ", {"PROMETHEUS_MULTIPROC_DIR": "path"}):
+            with mock.patch("service.metrics.MultiProcessCollector") as collector_mock:
+                registry = get_registry()
+
+                self.assertIsNot(registry, REGISTRY)
+                collector_mock.assert_called_once_with(registry, path="path")
+
+    def test_export(self) -> None:
+        """Test `export()` function."""
+        with mock.patch("service.metrics.get_registry") as registry_mock:
+            with mock.patch("service.metrics.generate_latest") as generate_mock:
+                data, content_type = export()
+
+                generate_mock.assert_called_once_with(registry_mock())
+                self.assertEqual(data, generate_mock())
+                self.assertTrue(content_type.startswith("text/plain"))
@@ -0,0 +1,179 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for profiling of worker processes."""
+from typing import (
+    Callable,
+    cast,
+    List,
+)
+from unittest import (
+    mock,
+    TestCase,
+)
+import os
+import pstats
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from service.profiling import (
+    collapse,
+    CProfileProfiler,
+    get_profiler,
+    install,
+    ProfilingSession,
+    request_profile,
+    SamplingProfiler,
+)
+
+
+def busy(seconds: float) -> None:
+    """Burn CPU in current thread."""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+class TestProfiling(TestCase):
+    """Base TestCase for profiling functionality."""
+
+    def setUp(self) -> None:
+        """Set up env before each test."""
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.path = os.path.join(self.tmp_dir.name, "profile")
+
+    def tearDown(self) -> None:
+        """Clean up env after each test."""
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def test_collapse(self) -> None:
+        """Test stack is collapsed from root to current frame."""
+        stack = collapse(sys._getframe())  # pylint: disable=W0212
+
+        self.assertTrue(stack.endswith(";test_profiling.py:test_collapse"))
+        self.assertEqual(collapse(None), "")
+
+    def test_cprofile(self) -> None:
+        """Test `CProfileProfiler` writes pstats file."""
+        profiler = CProfileProfiler()
+
+        profiler.start()
+        busy(0.01)
+        profiler.stop(self.path)
+
+        functions = [function for _, _, function in pstats.Stats(self.path).stats]  # type: ignore[attr-defined]
+        self.assertIn("busy", functions)
+
+    def test_sampling(self) -> None:
+        """Test `SamplingProfiler` writes collapsed stacks of main and pool threads, but not its own."""
+        profiler = SamplingProfiler(0.001)
+        thread = threading.Thread(target=busy, args=(0.1,), name="handler_0")
+
+        profiler.start()
+        thread.start()
+        busy(0.1)
+        thread.join()
+        profiler.stop(self.path)
+
+        with open(self.path, encoding="utf8") as in_file:
+            lines = in_file.read().splitlines()
+
+        self.assertTrue(any("test_profiling.py:busy " in line and "test_sampling" in line for line in lines))
+        self.assertTrue(any("threading.py:run;test_profiling.py:busy " in line for line in lines))
+        self.assertFalse(any("profiling.py:sample" in line for line in lines))
+        for line in lines:
+            self.assertGreater(int(line.rsplit(" ", 1)[1]), 0)
+
+    def test_get_profiler(self) -> None:
+        """Test `get_profiler()` function."""
+        with mock.patch.dict("service.profiling.os.environ", {"PROFILING_INTERVAL": "0.1"}):
+            profiler = get_profiler("sampling")
+
+        self.assertIsInstance(profiler, SamplingProfiler)
+        self.assertEqual(profiler.interval, 0.1)  # type: ignore[attr-defined]
+        self.assertIsInstance(get_profiler("cprofile"), CProfileProfiler)
+        with self.assertRaises(KeyError):
+            get_profiler("unknown")
+
+    def test_session(self) -> None:
+        """Test session starts profiler on signal and stops it on alarm outside of signal handler."""
+        callbacks: List[Callable[[], None]] = []
+        session = ProfilingSession(self.tmp_dir.name, 10, callbacks.append)
+
+        with mock.patch("service.profiling.signal.setitimer") as setitimer_mock:
+            with mock.patch("service.profiling.get_profiler") as get_profiler_mock:
+                get_profiler_mock.return_value.extension = "pstats"
+
+                session.on_start(signal.SIGUSR2, None)
+                session.on_start(signal.SIGUSR1, None)
+                session.on_stop(signal.SIGALRM, None)
+                session.on_stop(signal.SIGALRM, None)
+                get_profiler_mock.assert_not_called()
+
+                for callback in callbacks:
+                    callback()
+
+        self.assertEqual(len(callbacks), 4)
+        get_profiler_mock.assert_called_once_with("cprofile")
+        get_profiler_mock().start.assert_called_once_with()
+        setitimer_mock.assert_called_once_with(signal.ITIMER_REAL, 10)
+        get_profiler_mock().stop.assert_called_once()
+        path = os.path.join(self.tmp_dir.name, f"worker-{os.getpid()}-")
+        self.assertRegex(get_profiler_mock().stop.call_args[0][0], rf"^{re.escape(path)}\d+\.pstats$")
+        self.assertIsNone(session.profiler)
+
+    def test_install(self) -> None:
+        """Test signal handlers are installed only when profiling directory is set."""
+        directory = os.path.join(self.tmp_dir.name, "profiles")
+        defer_mock = mock.MagicMock(name="defer")
+
+        with mock.patch("service.profiling.signal.signal") as signal_mock:
+            with mock.patch.dict("service.profiling.os.environ", {"PROFILING_DIR": ""}):
+                self.assertIsNone(install(defer_mock))
+            signal_mock.assert_not_called()
+
+            env = {"PROFILING_DIR": directory, "PROFILING_DURATION": "5"}
+            with mock.patch.dict("service.profiling.os.environ", env):
+                session = install(defer_mock)
+
+        self.assertIsNotNone(session)
+        session = cast(ProfilingSession, session)
+        self.assertTrue(os.path.isdir(directory))
+        self.assertEqual(session.duration, 5)
+        self.assertIs(session.defer, defer_mock)
+        signal_mock.assert_has_calls(
+            [
+                mock.call(signal.SIGUSR1, session.on_start),
+                mock.call(signal.SIGUSR2, session.on_start),
+                mock.call(signal.SIGALRM, session.on_stop),
+            ]
+        )
+
+    def test_request_profile(self) -> None:
+        """Test `request_profile()` function."""
+        with mock.patch("service.profiling.os.kill") as kill_mock:
+            request_profile(42, "cprofile")
+
+        kill_mock.assert_called_once_with(42, signal.SIGUSR2)
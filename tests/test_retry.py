@@ -0,0 +1,123 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for retries of input messages."""
+from unittest import (
+    mock,
+    TestCase,
+)
+
+from pika import BasicProperties
+
+from service.retry import (
+    is_transient,
+    RetryPolicy,
+    TransientError,
+)
+
+
+class TestRetry(TestCase):
+    """Test cases for `RetryPolicy` class."""
+
+    def setUp(self) -> None:
+        """Set up policy retrying 4 times after 1, 2, 4 and 5 seconds."""
+        super().setUp()
+        values = {"worker.in_queue": "in", "retry.max_attempts": 4, "retry.max_delay": 5}
+        self.config_mock = mock.MagicMock(name="Config")
+        self.config_mock.get.side_effect = lambda key, default=None: values.get(key, default)
+        self.channel_mock = mock.MagicMock(name="BlockingChannel")
+        self.policy = RetryPolicy(self.config_mock)
+
+    def test_is_transient(self) -> None:
+        """Test classification of failures."""
+        for exc, expected in [
+            (TransientError("S3"), True),
+            (TimeoutError(), True),
+            (ConnectionResetError(), True),
+            (KeyError("appId"), False),
+            (FileNotFoundError(), False),
+        ]:
+            with self.subTest(exc=exc):
+                self.assertEqual(is_transient(exc), expected)
+
+    def test_defaults(self) -> None:
+        """Test retries are disabled by default."""
+        config_mock = mock.MagicMock(name="Config")
+        config_mock.get.side_effect = lambda key, default=None: "in" if key == "worker.in_queue" else default
+        policy = RetryPolicy(config_mock)
+
+        self.assertEqual(policy.max_attempts, 0)
+        self.assertEqual(policy.dead_letter_queue, "in.dead-letter")
+        policy.declare(self.channel_mock)
+        self.assertFalse(policy.schedule(self.channel_mock, BasicProperties(), b"body", TransientError()))
+        self.channel_mock.assert_not_called()
+        self.channel_mock.queue_declare.assert_not_called()
+
+    def test_delay_queue(self) -> None:
+        """Test exponential backoff capped by `max_delay`."""
+        self.assertListEqual(
+            [self.policy.delay_queue(attempt) for attempt in range(4)],
+            ["in.delay.1000", "in.delay.2000", "in.delay.4000", "in.delay.5000"],
+        )
+
+    def test_declare(self) -> None:
+        """Test delay queues dead-letter back to input queue."""
+        self.policy.max_attempts = 5
+
+        self.policy.declare(self.channel_mock)
+
+        self.assertEqual(self.channel_mock.queue_declare.call_count, 5)
+        self.channel_mock.queue_declare.assert_any_call(
+            queue="in.delay.5000",
+            durable=True,
+            arguments={"x-message-ttl": 5000, "x-dead-letter-exchange": "", "x-dead-letter-routing-key": "in"},
+        )
+        self.channel_mock.queue_declare.assert_called_with(queue="in.dead-letter", durable=True)
+
+    def test_schedule(self) -> None:
+        """Test transient failure is published to delay queue with attempt count."""
+        props = BasicProperties(headers={"x-request-id": "id", "x-retry-count": 1}, priority=3)
+
+        self.assertTrue(self.policy.schedule(self.channel_mock, props, b"body", TransientError("S3")))
+
+        kwargs = self.channel_mock.basic_publish.call_args[1]
+        self.assertEqual(kwargs["routing_key"], "in.delay.2000")
+        self.assertEqual(kwargs["body"], b"body")
+        self.assertEqual(kwargs["properties"].priority, 3)
+        self.assertEqual(kwargs["properties"].delivery_mode, 2)
+        self.assertDictEqual(
+            kwargs["properties"].headers,
+            {"x-request-id": "id", "x-retry-count": 2, "x-last-error": "S3"},
+        )
+
+    def test_schedule_permanent(self) -> None:
+        """Test permanent failure is not retried."""
+        self.assertFalse(self.policy.schedule(self.channel_mock, BasicProperties(), b"body", KeyError("appId")))
+
+        self.channel_mock.basic_publish.assert_not_called()
+
+    def test_schedule_exhausted(self) -> None:
+        """Test message is dead-lettered after last attempt."""
+        props = BasicProperties(headers={"x-retry-count": 4})
+
+        self.assertFalse(self.policy.schedule(self.channel_mock, props, b"body", TimeoutError("S3")))
+
+        kwargs = self.channel_mock.basic_publish.call_args[1]
+        self.assertEqual(kwargs["routing_key"], "in.dead-letter")
+        self.assertDictEqual(kwargs["properties"].headers, {"x-retry-count": 4, "x-last-error": "S3"})
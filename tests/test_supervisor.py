@@ -0,0 +1,288 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for pool supervisor."""
+from typing import (
+    Any,
+    Dict,
+)
+from unittest import (
+    mock,
+    TestCase,
+)
+import signal
+
+from pika.exceptions import AMQPError
+
+from service.supervisor import (
+    QueueProbe,
+    ScalingPolicy,
+    Supervisor,
+)
+
+
+def make_config(values: Dict[str, Any]) -> mock.MagicMock:
+    """Return config mock returning `values` or default."""
+    config_mock = mock.MagicMock(name="Config")
+    config_mock.get.side_effect = lambda key, default=None: values.get(key, default)
+    return config_mock
+
+
+def make_slot(
+    pid: int, busy: float, in_flight: int = 0, heartbeat_at: float = 0.0, capacity: int = 1
+) -> Dict[str, Any]:
+    """Return heartbeat slot state."""
+    return {"pid": pid, "busy": busy, "in_flight": in_flight, "heartbeat_at": heartbeat_at, "capacity": capacity}
+
+
+class TestScalingPolicy(TestCase):
+    """Test cases for `ScalingPolicy` class."""
+
+    def setUp(self) -> None:
+        """Set up policy scaling between 1 and 3 workers."""
+        super().setUp()
+        self.policy = ScalingPolicy(make_config({
+            "concurency": 2,
+            "supervisor.min_workers": 1,
+            "supervisor.max_workers": 3,
+            "supervisor.cooldown": 60,
+        }))
+
+    def test_defaults(self) -> None:
+        """Test pool size is fixed to `concurency` without `supervisor` section."""
+        policy = ScalingPolicy(make_config({"concurency": 2}))
+
+        self.assertEqual((policy.min_workers, policy.max_workers), (2, 2))
+        self.assertEqual((policy.scale_up, policy.scale_down, policy.backlog), (0.8, 0.3, 2))
+
+    def test_pressure(self) -> None:
+        """Test pressure from utilisation and backlog, pool is not scaled down while depth is unknown."""
+        for utilisation, depth, expected in [
+            (0.9, 0, 1),
+            (0.5, 5, 1),
+            (0.5, 4, 0),
+            (0.5, None, 0),
+            (0.2, 1, 0),
+            (0.2, 0, -1),
+            (0.2, None, 0),
+        ]:
+            with self.subTest(utilisation=utilisation, depth=depth):
+                self.assertEqual(self.policy.pressure(2, utilisation, depth), expected)
+
+    def test_decide(self) -> None:
+        """Test pool is resized by one worker at most once per cooldown."""
+        self.assertEqual(self.policy.decide(2, 0.9, 0, 100.0), 3)
+        self.assertEqual(self.policy.changed_at, 100.0)
+        self.assertEqual(self.policy.decide(3, 0.0, 0, 120.0), 3)
+        self.assertEqual(self.policy.decide(3, 0.0, 0, 160.0), 2)
+        self.assertEqual(self.policy.decide(2, 0.5, 0, 300.0), 2)
+        self.assertEqual(self.policy.changed_at, 160.0)
+
+    def test_decide_bounds(self) -> None:
+        """Test target is clamped to bounds."""
+        self.assertEqual(self.policy.decide(3, 1.0, 100, 0.0), 3)
+        self.assertEqual(self.policy.decide(1, 0.0, 0, 0.0), 1)
+        self.assertEqual(self.policy.decide(5, 0.5, 0, 0.0), 3)
+        self.assertEqual(self.policy.decide(0, 0.5, 0, 0.0), 1)
+
+
+class TestQueueProbe(TestCase):
+    """Test cases for `QueueProbe` class."""
+
+    @mock.patch("service.supervisor.get_connection_parameters")
+    @mock.patch("service.supervisor.BlockingConnection")
+    def test_depth(self, blocking_conn_mock: mock.MagicMock, params_mock: mock.MagicMock) -> None:
+        """Test depth is read with passive declare over lazily opened connection."""
+        channel_mock = blocking_conn_mock.return_value.channel.return_value
+        channel_mock.queue_declare.return_value.method.message_count = 7
+        probe = QueueProbe(["in", "in.shard.0"])
+
+        self.assertEqual(probe.depth(), 14)
+        self.assertEqual(probe.depth(), 14)
+
+        blocking_conn_mock.assert_called_once_with(parameters=params_mock.return_value)
+        channel_mock.queue_declare.assert_has_calls(
+            [mock.call(queue="in", passive=True), mock.call(queue="in.shard.0", passive=True)],
+        )
+
+    @mock.patch("service.supervisor.get_connection_parameters")
+    @mock.patch("service.supervisor.BlockingConnection")
+    def test_depth_error(self, blocking_conn_mock: mock.MagicMock, _: mock.MagicMock) -> None:
+        """Test unknown depth and reconnect after broker error."""
+        channel_mock = blocking_conn_mock.return_value.channel.return_value
+        channel_mock.queue_declare.side_effect = AMQPError("gone")
+        probe = QueueProbe(["in"])
+
+        self.assertIsNone(probe.depth())
+        self.assertIsNone(probe.channel)
+        self.assertIsNone(probe.depth())
+        self.assertEqual(blocking_conn_mock.call_count, 2)
+
+    @mock.patch("service.supervisor.time.sleep")
+    def test_sleep(self, sleep_mock: mock.MagicMock) -> None:
+        """Test sleep keeps open connection alive."""
+        probe = QueueProbe(["in"])
+
+        probe.sleep(1.0)
+        sleep_mock.assert_called_once_with(1.0)
+
+        probe.channel = mock.MagicMock(name="Channel")
+        probe.sleep(2.0)
+        probe.channel.connection.sleep.assert_called_once_with(2.0)
+
+
+class TestSupervisor(TestCase):
+    """Test cases for `Supervisor` class."""
+
+    def setUp(self) -> None:
+        """Set up supervisor with mocked workers and probe."""
+        super().setUp()
+        self.created: Dict[int, mock.MagicMock] = {}
+        self.factory_mock = mock.MagicMock(name="factory", side_effect=self._create_worker)
+
+        with mock.patch("service.supervisor.QueueProbe") as probe_mock:
+            self.supervisor = Supervisor(
+                make_config({"concurency": 2, "supervisor.min_workers": 1, "supervisor.max_workers": 3}),
+                self.factory_mock,
+            )
+        self.probe_mock = probe_mock.return_value
+
+    def _create_worker(self, index: int) -> mock.MagicMock:
+        """Create worker mock and remember it."""
+        self.created[index] = mock.MagicMock(name=f"Worker{index}", pid=100 + index)
+        return self.created[index]
+
+    def test_spawn(self) -> None:
+        """Test workers are started in free slots only."""
+        self.supervisor.retiring[0] = mock.MagicMock(name="Retiring")
+
+        self.supervisor.spawn(5)
+
+        self.assertEqual(sorted(self.supervisor.workers), [1, 2])
+        for worker in self.created.values():
+            worker.start.assert_called_once_with()
+
+    def test_retire(self) -> None:
+        """Test idle workers with highest slot index are retired first."""
+        self.supervisor.spawn(3)
+        slots = [make_slot(100, 0), make_slot(101, 0), make_slot(102, 0, in_flight=1)]
+
+        self.supervisor.retire(2, slots)
+
+        self.assertEqual(list(self.supervisor.workers), [2])
+        self.assertEqual(sorted(self.supervisor.retiring), [0, 1])
+        self.created[0].terminate.assert_called_once_with()
+        self.created[1].terminate.assert_called_once_with()
+        self.created[2].terminate.assert_not_called()
+
+    @mock.patch("service.supervisor.HeartbeatSlot")
+    def test_reap(self, heartbeat_slot_mock: mock.MagicMock) -> None:
+        """Test exited workers are joined and their slots cleared."""
+        self.supervisor.spawn(2)
+        self.supervisor.retire(1, [])
+        self.created[0].is_alive.return_value = False
+        self.created[1].is_alive.return_value = True
+
+        self.supervisor.reap()
+        self.assertEqual((list(self.supervisor.workers), list(self.supervisor.retiring)), ([], [1]))
+
+        self.created[1].is_alive.return_value = False
+        self.supervisor.reap()
+        self.assertEqual(self.supervisor.retiring, {})
+
+        heartbeat_slot_mock.assert_has_calls([mock.call(0), mock.call().clear(), mock.call(1), mock.call().clear()])
+
+    def test_utilisation(self) -> None:
+        """Test utilisation is busy time fraction of worker capacity since previous sample."""
+        slots = [make_slot(1, 0.0), make_slot(2, 5.0), make_slot(4, 0.0, capacity=4)]
+        self.assertEqual(self.supervisor.utilisation(slots, 100.0), 0.0)
+
+        utilisation = self.supervisor.utilisation(
+            [
+                make_slot(1, 5.0),
+                make_slot(2, 5.0, in_flight=1, heartbeat_at=105.0),
+                make_slot(3, 0.0),
+                make_slot(4, 10.0, in_flight=2, heartbeat_at=105.0, capacity=4),
+            ],
+            110.0,
+        )
+
+        self.assertEqual(utilisation, 0.5)
+        self.assertEqual(sorted(self.supervisor.samples), [1, 2, 3, 4])
+
+    @mock.patch("service.supervisor.get_workers_state")
+    def test_tick(self, get_workers_state_mock: mock.MagicMock) -> None:
+        """Test pool is resized to policy target."""
+        self.supervisor.spawn(2)
+        get_workers_state_mock.return_value = [make_slot(100, 0.0), make_slot(101, 0.0), make_slot(999, 0.0)]
+
+        for target, expected in [(3, [0, 1, 2]), (3, [0, 1, 2]), (2, [0, 1])]:
+            with mock.patch.object(self.supervisor, "reap"):
+                with mock.patch.object(self.supervisor.policy, "decide", return_value=target) as decide_mock:
+                    self.supervisor.tick()
+
+            self.assertEqual(sorted(self.supervisor.workers), expected)
+            self.assertEqual(decide_mock.call_args[0][2], self.probe_mock.depth.return_value)
+
+        self.assertEqual(decide_mock.call_args[0][0], 3)
+
+    @mock.patch("service.supervisor.signal.signal")
+    def test_run(self, signal_mock: mock.MagicMock) -> None:
+        """Test minimal pool is started, supervised every interval and shut down on exit."""
+        with mock.patch.object(self.supervisor, "tick", side_effect=[None, SystemExit]) as tick_mock:
+            with mock.patch.object(self.supervisor, "shutdown") as shutdown_mock:
+                with self.assertRaises(SystemExit):
+                    self.supervisor.run()
+
+        signal_mock.assert_called_once_with(signal.SIGTERM, self.supervisor.on_terminate)
+        self.assertEqual(list(self.supervisor.workers), [0])
+        self.probe_mock.sleep.assert_has_calls([mock.call(10), mock.call(10)])
+        self.assertEqual(tick_mock.call_count, 2)
+        shutdown_mock.assert_called_once_with()
+
+    def test_on_terminate(self) -> None:
+        """Test `SIGTERM` leaves supervision loop."""
+        with self.assertRaises(SystemExit):
+            self.supervisor.on_terminate(signal.SIGTERM, None)
+
+    @mock.patch("service.supervisor.time.monotonic", return_value=100.0)
+    @mock.patch("service.supervisor.signal.signal")
+    @mock.patch("service.supervisor.active_children")
+    def test_shutdown(
+        self,
+        active_children_mock: mock.MagicMock,
+        signal_mock: mock.MagicMock,
+        _: mock.MagicMock,
+    ) -> None:
+        """Test all workers are drained and stragglers killed after timeout."""
+        drained, stuck = mock.MagicMock(name="drained"), mock.MagicMock(name="stuck")
+        drained.is_alive.return_value = False
+        stuck.is_alive.return_value = True
+        active_children_mock.return_value = [drained, stuck]
+
+        self.supervisor.shutdown()
+
+        signal_mock.assert_called_once_with(signal.SIGTERM, signal.SIG_IGN)
+        self.assertEqual(self.supervisor.shutdown_timeout, 40)
+        for worker in (drained, stuck):
+            worker.terminate.assert_called_once_with()
+        drained.join.assert_called_once_with(40)
+        drained.kill.assert_not_called()
+        stuck.join.assert_has_calls([mock.call(40), mock.call()])
+        stuck.kill.assert_called_once_with()
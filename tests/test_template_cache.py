@@ -0,0 +1,167 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for `TemplateCache` class."""
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from typing import List
+from unittest import (
+    mock,
+    TestCase,
+)
+import errno
+import fcntl
+import os
+import time
+
+from service.template_cache import (
+    link_or_copy,
+    TemplateCache,
+)
+
+
+class TestTemplateCache(TestCase):
+    """TestCase for `TemplateCache` class."""
+
+    def setUp(self) -> None:
+        """Set up temporary directories of cache and tickets."""
+        super().setUp()
+        directory = TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.cache = TemplateCache(os.path.join(self.root, "cache"), 60)
+        self.fetched: List[str] = []
+        patcher = mock.patch("service.template_cache.count_template_cache")
+        self.count_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, directory: str) -> None:
+        """Write templates to `directory` slowly, so concurrent callers overlap."""
+        self.fetched.append(directory)
+        time.sleep(0.05)
+        os.makedirs(os.path.join(directory, "templates"))
+        with open(os.path.join(directory, "templates", "1.json"), "w", encoding="utf8") as out_file:
+            out_file.write(str(len(self.fetched)))
+        os.symlink("1.json", os.path.join(directory, "templates", "link.json"))
+
+    def populate(self, name: str) -> str:
+        """Populate ticket directory `name` and return content of its template."""
+        path = os.path.join(self.root, name)
+        os.makedirs(path)
+        self.cache.populate(path, "archive.tgz", self.fetch)
+
+        with open(os.path.join(path, "templates", "link.json"), encoding="utf8") as in_file:
+            return in_file.read()
+
+    def test_populate(self) -> None:
+        """Test archive is fetched once and linked to every ticket directory."""
+        self.assertEqual(self.populate("ticket1"), "1")
+        self.assertEqual(self.populate("ticket2"), "1")
+
+        self.assertEqual(len(self.fetched), 1)
+        self.assertEqual(self.fetched[0], os.path.join(self.root, "cache", "archive.tgz.staging"))
+        self.assertListEqual(sorted(os.listdir(self.cache.directory)), ["archive.tgz", "archive.tgz.lock"])
+        cached = os.stat(os.path.join(self.cache.directory, "archive.tgz", "templates", "1.json"))
+        self.assertEqual(os.stat(os.path.join(self.root, "ticket2", "templates", "1.json")).st_ino, cached.st_ino)
+        self.assertTrue(os.path.islink(os.path.join(self.root, "ticket2", "templates", "link.json")))
+        self.assertListEqual(self.count_mock.call_args_list, [mock.call("miss"), mock.call("hit")])
+
+    def test_populate_concurrent(self) -> None:
+        """Test concurrent callers wait for the first one and reuse its entry."""
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(self.populate, [f"ticket{index}" for index in range(4)]))
+
+        self.assertListEqual(results, ["1"] * 4)
+        self.assertEqual(len(self.fetched), 1)
+        self.assertEqual(self.count_mock.call_args_list.count(mock.call("miss")), 1)
+
+    def test_populate_expired(self) -> None:
+        """Test expired entry is fetched again, tickets keep their templates."""
+        self.assertEqual(self.populate("ticket1"), "1")
+        entry = os.path.join(self.cache.directory, "archive.tgz")
+        os.utime(entry, (time.time() - 61, time.time() - 61))
+
+        self.assertEqual(self.populate("ticket2"), "2")
+
+        self.assertEqual(len(self.fetched), 2)
+        with open(os.path.join(self.root, "ticket1", "templates", "1.json"), encoding="utf8") as in_file:
+            self.assertEqual(in_file.read(), "1")
+
+    def test_populate_failed(self) -> None:
+        """Test failed fetch publishes nothing and next caller fetches again."""
+        with mock.patch.object(self, "fetch", side_effect=OSError("S3 failed")):
+            with self.assertRaisesRegex(OSError, "S3 failed"):
+                self.populate("ticket1")
+
+        self.assertEqual(self.populate("ticket2"), "1")
+        self.assertListEqual(sorted(os.listdir(self.cache.directory)), ["archive.tgz", "archive.tgz.lock"])
+
+    def test_refresh_waited(self) -> None:
+        """Test entry published while lock was upgraded is reused."""
+        entry = os.path.join(self.root, "entry")
+        os.makedirs(entry)
+        fetch_mock = mock.MagicMock(name="fetch")
+
+        self.cache.refresh(entry, fetch_mock)
+
+        fetch_mock.assert_not_called()
+        self.count_mock.assert_called_once_with("wait")
+
+    def test_link_or_copy(self) -> None:
+        """Test file is hard linked, copied to other filesystem and other errors are raised."""
+        source = os.path.join(self.root, "source")
+        with open(source, "w", encoding="utf8") as out_file:
+            out_file.write("data")
+
+        link_or_copy(source, os.path.join(self.root, "link"))
+        self.assertEqual(os.stat(os.path.join(self.root, "link")).st_nlink, 2)
+
+        with mock.patch("service.template_cache.os.link", side_effect=OSError(errno.EXDEV, "Cross-device link")):
+            link_or_copy(source, os.path.join(self.root, "copy"))
+        self.assertEqual(os.stat(os.path.join(self.root, "copy")).st_nlink, 1)
+
+        with self.assertRaises(FileExistsError):
+            link_or_copy(source, os.path.join(self.root, "link"))
+
+    def test_reap(self) -> None:
+        """Test expired entries are removed unless other process holds their lock or refreshed them."""
+        self.cache.reap()
+        for name in ("expired", "locked", "fresh"):
+            self.cache.populate(os.path.join(self.root, name), name, self.fetch)
+        for name in ("expired", "locked"):
+            os.utime(os.path.join(self.cache.directory, name), (time.time() - 61, time.time() - 61))
+
+        with open(os.path.join(self.cache.directory, "locked.lock"), encoding="utf8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            self.cache.reap()
+
+        self.assertListEqual(
+            sorted(os.listdir(self.cache.directory)),
+            ["expired.lock", "fresh", "fresh.lock", "locked", "locked.lock"],
+        )
+
+    def test_reap_refreshed(self) -> None:
+        """Test entry refreshed before its lock was taken is kept."""
+        entry = os.path.join(self.cache.directory, "entry")
+        os.makedirs(entry)
+
+        with mock.patch.object(self.cache, "is_fresh", side_effect=[False, True]):
+            self.cache.reap()
+
+        self.assertTrue(os.path.isdir(entry))
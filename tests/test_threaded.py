@@ -0,0 +1,103 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for threaded handler mode."""
+from typing import (
+    Callable,
+    List,
+)
+from unittest import (
+    mock,
+    TestCase,
+)
+import threading
+
+from service.threaded import (
+    ThreadedDispatcher,
+    ThreadsafeChannel,
+)
+
+
+class TestThreaded(TestCase):
+    """Test cases for `ThreadsafeChannel` and `ThreadedDispatcher` classes."""
+
+    def setUp(self) -> None:
+        """Set up channel running thread-safe callbacks immediately."""
+        super().setUp()
+        self.channel_mock = mock.MagicMock(name="BlockingChannel")
+        self.callbacks: List[Callable[[], None]] = []
+        self.channel_mock.connection.add_callback_threadsafe.side_effect = self.callbacks.append
+
+    def run_callbacks(self) -> None:
+        """Run callbacks scheduled on connection thread."""
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+    def test_threadsafe_channel(self) -> None:
+        """Test publishes and acks are run on connection thread in order."""
+        channel = ThreadsafeChannel(self.channel_mock)
+
+        channel.basic_publish(exchange="", routing_key="status", body=b"body")
+        channel.basic_ack(delivery_tag=1)
+        channel.basic_nack(delivery_tag=2, requeue=True)
+
+        self.channel_mock.basic_publish.assert_not_called()
+        self.run_callbacks()
+        self.assertListEqual(
+            self.channel_mock.method_calls[-3:],
+            [
+                mock.call.basic_publish(exchange="", routing_key="status", body=b"body"),
+                mock.call.basic_ack(delivery_tag=1),
+                mock.call.basic_nack(delivery_tag=2, requeue=True),
+            ],
+        )
+
+    def test_submit(self) -> None:
+        """Test task runs in pool thread and completion is reported on connection thread."""
+        dispatcher = ThreadedDispatcher(2)
+        threads = []
+        done_mock = mock.MagicMock(name="done")
+
+        dispatcher.submit(
+            self.channel_mock,
+            lambda channel: threads.append((threading.current_thread().name, channel)),
+            done_mock,
+        )
+        self.assertEqual(dispatcher.pending, 1)
+        dispatcher.executor.shutdown(wait=True)
+
+        self.assertTrue(threads[0][0].startswith("handler"))
+        self.assertIsInstance(threads[0][1], ThreadsafeChannel)
+        done_mock.assert_not_called()
+        self.run_callbacks()
+        done_mock.assert_called_once_with()
+        self.assertEqual(dispatcher.pending, 0)
+
+    def test_submit_error(self) -> None:
+        """Test exception of task is raised on connection thread after completion is reported."""
+        dispatcher = ThreadedDispatcher(1)
+        done_mock = mock.MagicMock(name="done")
+
+        dispatcher.submit(self.channel_mock, mock.MagicMock(side_effect=KeyError("key")), done_mock)
+        dispatcher.executor.shutdown(wait=True)
+
+        with self.assertRaises(KeyError):
+            self.run_callbacks()
+        done_mock.assert_called_once_with()
+        self.assertEqual(dispatcher.pending, 0)
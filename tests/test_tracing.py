@@ -0,0 +1,170 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for tracing module."""
+from unittest import (
+    mock,
+    TestCase,
+)
+import json
+
+from service.tracing import (
+    extract,
+    FileSpanExporter,
+    get_exporter,
+    inject,
+    NullSpanExporter,
+    Span,
+    SpanExporter,
+    StdoutSpanExporter,
+    Tracer,
+)
+
+
+class TestTracing(TestCase):
+    """Base TestCase for tracing functionality."""
+
+    def setUp(self) -> None:
+        """Set up env before each test."""
+        super().setUp()
+        self.exporter_mock = mock.MagicMock(name="SpanExporter")
+        self.tracer = Tracer(self.exporter_mock)
+
+    def test_abstract_methods(self) -> None:
+        """Test set of abstract methods in class."""
+        self.assertSetEqual(set(["export"]), SpanExporter.__dict__["__abstractmethods__"])
+
+    def test_get_exporter(self) -> None:
+        """Test success case of `get_exporter()`."""
+        inputs = [
+            ("none", NullSpanExporter),
+            ("stdout", StdoutSpanExporter),
+            ("file", FileSpanExporter),
+        ]
+
+        for exporter_type, exporter_cls in inputs:
+            with self.subTest(exporter_type=exporter_type, exporter_cls=exporter_cls):
+                self.assertIsInstance(get_exporter(exporter_type), exporter_cls)
+
+        with self.assertRaises(KeyError):
+            get_exporter("unknown")
+
+    def test_span_to_dict(self) -> None:
+        """Test `Span.to_dict()` method."""
+        with mock.patch("service.tracing.time.time", side_effect=[10.0, 10.5]):
+            span = Span("name", "trace", parent_id="parent")
+            span.attributes["key"] = "value"
+
+            self.assertDictEqual(
+                span.to_dict(),
+                {
+                    "trace_id": "trace",
+                    "span_id": span.span_id,
+                    "parent_id": "parent",
+                    "name": "name",
+                    "start": 10.0,
+                    "end": 10.5,
+                    "duration_ms": 500.0,
+                    "attributes": {"key": "value"},
+                },
+            )
+
+    def test_inject_extract(self) -> None:
+        """Test trace context propagation through headers."""
+        span = Span("name", "a" * 32)
+        headers = inject(span)
+
+        self.assertEqual(headers["traceparent"], f"00-{'a' * 32}-{span.span_id}-01")
+        self.assertEqual(extract(headers), ("a" * 32, span.span_id))
+
+        for bad_headers in [None, {}, {"traceparent": "00-abc-def-01"}, {"traceparent": "garbage"}]:
+            with self.subTest(bad_headers=bad_headers):
+                self.assertIsNone(extract(bad_headers))
+
+    def test_start_span(self) -> None:
+        """Test `Tracer.start_span()` for root, remote and local parents."""
+        root = self.tracer.start_span("root")
+        self.assertEqual(len(root.trace_id), 32)
+        self.assertEqual(root.parent_id, "")
+
+        remote = self.tracer.start_span("remote", ("b" * 32, "c" * 16))
+        self.assertEqual(remote.trace_id, "b" * 32)
+        self.assertEqual(remote.parent_id, "c" * 16)
+
+        with self.tracer.activate(root):
+            child = self.tracer.start_span("child", ("b" * 32, "c" * 16))
+
+        self.assertIs(child.parent, root)
+        self.assertEqual(child.trace_id, root.trace_id)
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertIsNone(self.tracer.current_span)
+
+    def test_end_span(self) -> None:
+        """Test `Tracer.end_span()` exports span."""
+        span = self.tracer.start_span("span")
+
+        self.tracer.end_span(span, "error")
+
+        self.assertIsNotNone(span.end)
+        self.assertEqual(span.attributes["error"], "error")
+        self.exporter_mock.export.assert_called_once_with(span)
+
+    def test_span_context_manager(self) -> None:
+        """Test `Tracer.span()` context manager for success and error."""
+        with self.tracer.span("success") as span:
+            self.assertIs(self.tracer.current_span, span)
+
+        self.assertNotIn("error", span.attributes)
+
+        with self.assertRaises(KeyError):
+            with self.tracer.span("error") as span:
+                raise KeyError("key")
+
+        self.assertEqual(span.attributes["error"], str(KeyError("key")))
+        self.assertEqual(self.exporter_mock.export.call_count, 2)
+        self.assertIsNone(self.tracer.current_span)
+
+    def test_null_exporter(self) -> None:
+        """Test `NullSpanExporter` does nothing."""
+        NullSpanExporter().export(Span("name", "trace"))
+
+    def test_stdout_exporter(self) -> None:
+        """Test `StdoutSpanExporter` writes JSON line."""
+        span = Span("name", "trace")
+        span.end = span.start
+
+        with mock.patch("service.tracing.sys.stdout") as stdout_mock:
+            StdoutSpanExporter().export(span)
+
+            stdout_mock.write.assert_called_once_with(json.dumps(span.to_dict()) + "\n")
+            stdout_mock.flush.assert_called_once_with()
+
+    def test_file_exporter(self) -> None:
+        """Test `FileSpanExporter` appends JSON line to file."""
+        span = Span("name", "trace")
+        span.end = span.start
+
+        with mock.patch.dict("service.tracing.os.environ", {"TRACING_FILE": "traces.jsonl"}):
+            self.assertEqual(FileSpanExporter().path, "traces.jsonl")
+
+        with mock.patch("service.tracing.open") as open_mock:
+            FileSpanExporter("path.jsonl").export(span)
+
+            open_mock.assert_called_once_with("path.jsonl", "a", encoding="utf8")
+            open_mock().__enter__().write.assert_called_once_with(json.dumps(span.to_dict()) + "\n")
@@ -18,10 +18,13 @@
 #
 
 """Test cases for utils functionality."""
+from types import ModuleType
 from unittest import (
     mock,
     TestCase,
 )
+import os
+import sys
 
 from service.handlers import (
     get_decoder,
@@ -34,7 +37,9 @@ from service.handlers import (
 )
 from service.utils import (
     create_dirs_from_envs,
+    get_connection_parameters,
     get_utc_timestamp_ms,
+    lazy_import,
 )
 
 
@@ -163,3 +168,42 @@ class TestUtils(TestCase):
 
         with self.assertRaises(ValueError, msg=f"{env_names[0]} is not set"):
             create_dirs_from_envs(self.config_mock)
+
+    def test_get_connection_parameters(self) -> None:
+        """Test `get_connection_parameters()` function."""
+        with mock.patch("service.utils.pika.ConnectionParameters") as connection_params_mock:
+            with mock.patch("service.utils.os.environ.get") as os_get_mock:
+                os_get_mock.side_effect = lambda *args: args[1]
+
+                self.assertEqual(get_connection_parameters(), connection_params_mock())
+
+                os_get_mock.assert_has_calls(
+                    [
+                        mock.call("RABBITMQ_HOST", "localhost"),
+                        mock.call("RABBITMQ_PORT", 5672),
+                        mock.call("RABBITMQ_CONNECTION_ATTEMPTS", 5),
+                        mock.call("RABBITMQ_RETRY_DELAY", 5),
+                    ]
+                )
+                connection_params_mock.assert_any_call(
+                    host="localhost",
+                    port=5672,
+                    connection_attempts=5,
+                    retry_delay=5,
+                )
+
+    def test_lazy_import(self) -> None:
+        """Test module is executed on first attribute access."""
+        with mock.patch.dict("service.utils.sys.modules"):
+            sys.modules.pop("colorsys", None)
+
+            module = lazy_import("colorsys")
+
+            self.assertIs(sys.modules["colorsys"], module)
+            self.assertIsNot(type(module), ModuleType)
+            self.assertEqual(module.rgb_to_hsv(0.0, 0.0, 0.0), (0.0, 0.0, 0.0))
+            self.assertIs(type(module), ModuleType)
+
+        self.assertIs(lazy_import("os"), os)
+        with self.assertRaises(ModuleNotFoundError):
+            lazy_import("service.missing")
@@ -0,0 +1,169 @@
+#
+# If not stated otherwise in this file or this component's LICENSE file the
+# following copyright and licenses apply:
+#
+# Copyright 2023 Liberty Global Technology Services BV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Test cases for reply timeout watchdog."""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from typing import (
+    Any,
+    cast,
+)
+from unittest import (
+    mock,
+    TestCase,
+)
+
+from tests import get_handler
+
+from service.handlers import Ticket
+from service.watchdog import Watchdog
+
+
+def get_watchdog(**values: Any) -> Watchdog:
+    """Get Watchdog configured with `values`."""
+    config_mock = mock.MagicMock(name="Config")
+    config_mock.get.side_effect = {f"watchdog.{key}": value for key, value in values.items()}.get
+    return Watchdog(config_mock)
+
+
+class TestWatchdog(TestCase):
+    """Test cases for `Watchdog` class."""
+
+    def test_disabled(self) -> None:
+        """Test watchdog without timeouts does not track tickets."""
+        watchdog = get_watchdog()
+        watchdog.track({"uuid": "uuid", "platform": "p1"})
+
+        self.assertFalse(watchdog.enabled)
+        self.assertListEqual(watchdog.heap, [])
+        self.assertEqual(watchdog.interval, 5)
+
+    def test_track(self) -> None:
+        """Test platform timeout takes precedence over default timeout."""
+        watchdog = get_watchdog(timeout=10, timeouts={"p1": 60, "p2": 0}, platform_field="target")
+
+        with mock.patch("service.watchdog.time.monotonic", return_value=100.0):
+            watchdog.track({"uuid": "uuid1", "target": "p1", "searchpath": "/search1"})
+            watchdog.track({"uuid": "uuid2", "target": "p3"})
+            watchdog.track({"uuid": "uuid3", "target": "p2"})
+
+        self.assertTrue(watchdog.enabled)
+        self.assertListEqual(watchdog.heap, [(110.0, "uuid2"), (160.0, "uuid1")])
+        self.assertDictEqual(watchdog.searchpaths, {"uuid1": "/search1", "uuid2": ""})
+
+    def test_expired(self) -> None:
+        """Test only due tickets without reply expire and their searchpaths are removed in background thread."""
+        watchdog = get_watchdog(timeout=10)
+
+        with TemporaryDirectory() as tmpdir:
+            searchpath = Path(tmpdir, "search")
+            searchpath.mkdir()
+            with mock.patch("service.watchdog.time.monotonic") as monotonic_mock:
+                monotonic_mock.side_effect = [0.0, 1.0, 2.0, 11.5, 100.0]
+                watchdog.track({"uuid": "uuid1", "searchpath": str(searchpath)})
+                watchdog.track({"uuid": "uuid2"})
+                watchdog.track({"uuid": "uuid3"})
+                watchdog.release("uuid2")
+
+                self.assertListEqual(watchdog.expired(), ["uuid1"])
+                cast(Thread, watchdog.cleaner).join()
+                self.assertFalse(searchpath.exists())
+                cleaner = watchdog.cleaner
+                self.assertListEqual(watchdog.expired(), ["uuid3"])
+                self.assertIs(watchdog.cleaner, cleaner)
+
+        self.assertListEqual(watchdog.heap, [])
+        self.assertDictEqual(watchdog.searchpaths, {})
+
+
+class TestWatchdogHandling(TestCase):
+    """TestCase for reply timeouts in BundleGenHandler."""
+
+    def setUp(self) -> None:
+        """Set up handler with real watchdog."""
+        super().setUp()
+        self.channel = mock.MagicMock(name="Channel")
+        self.handler = get_handler(mock.MagicMock(name="FileStructure"), Watchdog=get_watchdog(timeout=10))
+
+    def test_reply_releases_ticket(self) -> None:
+        """Test ticket sent to BundleGen is tracked until BundleGen replies."""
+        self.handler.request_id_map["uuid"] = "id"
+
+        with mock.patch("service.handlers.BundleGenHandler.out_encoder"):
+            self.handler.send_bundlegen_msg(self.channel, {"uuid": "uuid", "searchpath": "/search"})
+
+        self.assertDictEqual(self.handler.watchdog.searchpaths, {"uuid": "/search"})
+
+        with mock.patch.multiple(
+            self.handler,
+            decode_status_message=mock.MagicMock(return_value={"success": True, "uuid": "uuid"}),
+            send_success_msg=mock.DEFAULT,
+        ):
+            self.handler.h_response(self.channel, mock.MagicMock(name="Method"), mock.MagicMock(), b"body")
+
+        self.assertDictEqual(self.handler.watchdog.searchpaths, {})
+        self.assertDictEqual(self.handler.request_id_map, {})
+
+    def test_late_reply(self) -> None:
+        """Test reply of ticket given up by watchdog is dropped, ABS gets single status with its request id."""
+        self.handler.request_id_map["ticket-1"] = "abs-req-42"
+
+        with mock.patch("service.handlers.BundleGenHandler.out_encoder"):
+            with mock.patch("service.watchdog.time.monotonic", return_value=0.0):
+                self.handler.send_bundlegen_msg(self.channel, {"uuid": "ticket-1"})
+        self.channel.reset_mock()
+
+        with mock.patch("service.handlers.BundleGenHandler.status_encoder") as encoder_mock:
+            with mock.patch("service.watchdog.time.monotonic", return_value=20.0):
+                self.handler.abort_outstanding(self.channel, "timeout", self.handler.watchdog.expired())
+            reply = {"success": True, "uuid": "ticket-1"}
+            with mock.patch.object(self.handler, "decode_status_message", return_value=reply):
+                with mock.patch("service.handlers.count_late_reply") as late_mock:
+                    self.handler.h_response(self.channel, mock.MagicMock(name="Method"), mock.MagicMock(), b"body")
+
+        late_mock.assert_called_once_with()
+        self.channel.basic_publish.assert_called_once()
+        self.assertEqual(encoder_mock.encode.call_args[0][0]["phaseCode"], "BUNDLE_ERROR")
+        properties = self.channel.basic_publish.call_args[1]["properties"]
+        self.assertDictEqual(properties.headers, {"x-request-id": "abs-req-42"})
+        self.assertDictEqual(self.handler.request_id_map, {})
+
+    def test_abort_outstanding_releases_ticket(self) -> None:
+        """Test tickets given up on drain are not tracked by watchdog anymore."""
+        with mock.patch("service.handlers.BundleGenHandler.out_encoder"):
+            self.handler.send_bundlegen_msg(self.channel, {"uuid": "uuid", "searchpath": "/search"})
+
+        with mock.patch.object(self.handler, "send_error_msg"):
+            self.handler.abort_outstanding(self.channel, "shutdown")
+
+        self.assertDictEqual(self.handler.watchdog.searchpaths, {})
+
+    def test_fail_ticket_forgets_request(self) -> None:
+        """Test request id of failed ticket is dropped, unless ticket with the same id waits for reply."""
+        self.handler.request_id_map = {"a": "req-a", "b": "req-b"}
+        self.handler.launch_times["b"] = 1.0
+
+        for uuid in "ab":
+            ticket = Ticket(mock.MagicMock(name="Method"), mock.MagicMock(headers={}), b"body")
+            ticket.source_msg = {"id": uuid}
+            with mock.patch.object(self.handler, "send_error_msg"):
+                self.handler.fail_ticket(self.channel, ticket, OSError("failed"))
+
+        self.assertDictEqual(self.handler.request_id_map, {"b": "req-b"})
@@ -18,10 +18,12 @@
 #
 
 """Test cases for Worker class hierarchy."""
+from typing import List
 from unittest import (
     mock,
     TestCase,
 )
+import signal
 
 from pika.exceptions import (
     AMQPChannelError,
@@ -29,6 +31,10 @@ from pika.exceptions import (
     ConnectionClosedByBroker,
 )
 
+from service.batching import (
+    Batch,
+    Delivery,
+)
 from service.worker import Worker
 
 
@@ -41,13 +47,36 @@ class TestWorkers(TestCase):
 
         self.config_mock = mock.MagicMock(name="Config")
         self.handler_mock = mock.MagicMock(name="Handler")
+        self.heartbeat_mock = mock.MagicMock(name="HeartbeatSlot")
+        self.backpressure_mock = mock.MagicMock(name="Backpressure")
+
+        signal_patcher = mock.patch("service.worker.signal.signal")
+        self.signal_mock = signal_patcher.start()
+        self.addCleanup(signal_patcher.stop)
 
     def _get_worker(self) -> Worker:
         """Get Worker instance with mocks."""
         self.config_mock.reset_mock(return_value=True, side_effect=True)
         self.handler_mock.reset_mock(return_value=True, side_effect=True)
+        self.heartbeat_mock.reset_mock(return_value=True, side_effect=True)
+        self.handler_mock.affinity.enabled = False
+        self.handler_mock.affinity.subscribe.return_value = []
+        self.handler_mock.batch.enabled = False
+        self.handler_mock.batch.timer = None
+        self.handler_mock.batch.take.return_value = []
+        self.handler_mock.disk.enabled = False
+        self.handler_mock.disk.full.return_value = False
+        self.handler_mock.watchdog.enabled = False
 
-        return Worker(self.config_mock, self.handler_mock)
+        with mock.patch("service.worker.Backpressure") as backpressure_mock:
+            worker = Worker(self.config_mock, self.handler_mock, self.heartbeat_mock)
+
+        backpressure_mock.assert_called_once_with(self.config_mock)
+        self.config_mock.reset_mock()
+        self.backpressure_mock = backpressure_mock.return_value
+        self.backpressure_mock.enabled = False
+        self.backpressure_mock.update.return_value = False
+        return worker
 
     def test_init(self) -> None:
         """Test worker initialization."""
@@ -55,57 +84,48 @@ class TestWorkers(TestCase):
 
         self.assertEqual(worker.config, self.config_mock)
         self.assertEqual(worker.handler, self.handler_mock)
+        self.assertEqual(worker.heartbeat, self.heartbeat_mock)
+        self.assertListEqual(worker.consumer_tags, [])
 
     def test_queues_declare(self) -> None:
         """Test `queues_declare()` method."""
         worker = self._get_worker()
-        channel_mock = mock.MagicMock(name="BlockingChannel")
 
-        worker.queues_declare(channel_mock)
+        for max_priority, arguments in ((0, None), (10, {"x-max-priority": 10})):
+            with self.subTest(max_priority=max_priority):
+                self.config_mock.get.side_effect = {
+                    "worker.in_queue": "in",
+                    "worker.out_queue": "out",
+                    "worker.status_queue": "status",
+                    "worker.max_priority": max_priority,
+                }.get
+                channel_mock = mock.MagicMock(name="BlockingChannel")
 
-        self.config_mock.get.assert_has_calls(
-            [
-                mock.call("worker.in_queue"),
-                mock.call("worker.out_queue"),
-                mock.call("worker.status_queue"),
-            ],
-        )
-        channel_mock.queue_declare.assert_has_calls(
-            [
-                mock.call(queue=self.config_mock.get(), durable=True),
-                mock.call(queue=self.config_mock.get(), durable=True),
-                mock.call(queue=self.config_mock.get(), durable=True),
-            ],
-        )
+                worker.queues_declare(channel_mock)
+
+                self.assertListEqual(
+                    channel_mock.queue_declare.call_args_list,
+                    [
+                        mock.call(queue="in", durable=True, arguments=arguments),
+                        mock.call(queue="out", durable=True, arguments=arguments),
+                        mock.call(queue="status", durable=True),
+                    ],
+                )
+                self.handler_mock.retry.declare.assert_called_with(channel_mock)
+                self.handler_mock.affinity.declare.assert_called_with(channel_mock, arguments)
 
     def test_initialize_channel(self) -> None:
         """Test `initialize_channel()` method."""
         worker = self._get_worker()
 
-        with mock.patch("service.worker.ConnectionParameters") as connection_params_mock:
+        with mock.patch("service.worker.get_connection_parameters") as connection_params_mock:
             with mock.patch("service.worker.BlockingConnection") as blocking_conn_mock:
-                with mock.patch("service.worker.os.environ.get") as os_get_mock:
-                    os_get_mock.side_effect = lambda *args: args[1]
-                    channel = worker.initialize_channel()
-
-                    os_get_mock.assert_has_calls(
-                        [
-                            mock.call("RABBITMQ_HOST", "localhost"),
-                            mock.call("RABBITMQ_PORT", 5672),
-                            mock.call("RABBITMQ_CONNECTION_ATTEMPTS", 5),
-                            mock.call("RABBITMQ_RETRY_DELAY", 5),
-                        ]
-                    )
-                    connection_params_mock.assert_called_once_with(
-                        host="localhost",
-                        port=5672,
-                        connection_attempts=5,
-                        retry_delay=5,
-                    )
-                    blocking_conn_mock.assert_called_once_with(
-                        parameters=connection_params_mock(),
-                    )
-                    self.assertEqual(channel, blocking_conn_mock().channel())
+                channel = worker.initialize_channel()
+
+                blocking_conn_mock.assert_called_once_with(
+                    parameters=connection_params_mock(),
+                )
+                self.assertEqual(channel, blocking_conn_mock().channel())
 
     def test_run(self) -> None:
         """Test `run()` method for success case."""
@@ -113,25 +133,145 @@ class TestWorkers(TestCase):
 
         with mock.patch.object(worker, "initialize_channel") as init_channel_mock:
             with mock.patch.object(worker, "queues_declare") as queues_declare_mock:
-                worker.run()
+                with mock.patch("service.worker.install_profiling") as install_profiling_mock:
+                    worker.run()
 
+                install_profiling_mock.assert_called_once_with(worker.call_threadsafe)
+                self.signal_mock.assert_called_once_with(signal.SIGTERM, worker.on_terminate)
                 init_channel_mock.assert_called_once_with()
                 queues_declare_mock.assert_called_once_with(init_channel_mock())
-                self.config_mock.get.assert_called_once_with("worker.in_queue")
+                self.config_mock.get.assert_has_calls(
+                    [mock.call("worker.prefetch_count", 0), mock.call("worker.in_queue")],
+                    any_order=True,
+                )
+                init_channel_mock().basic_qos.assert_called_once_with(prefetch_count=self.config_mock.get())
                 init_channel_mock().basic_consume.assert_has_calls(
                     [
                         mock.call(
                             queue=self.config_mock.get(),
-                            on_message_callback=worker.handler.h_request,
+                            on_message_callback=worker.on_request,
                         ),
                         mock.call(
                             queue="amq.rabbitmq.reply-to",
-                            on_message_callback=worker.handler.h_response,
+                            on_message_callback=worker.on_response,
                             auto_ack=True,
                         ),
                     ]
                 )
                 init_channel_mock().start_consuming.assert_called_once_with()
+                init_channel_mock().connection.close.assert_called_once_with()
+                self.heartbeat_mock.start.assert_called_once_with(1)
+                self.heartbeat_mock.set_connected.assert_has_calls([mock.call(True), mock.call(False)])
+                init_channel_mock().connection.call_later.assert_called_once()
+
+    def test_consume_with_backpressure(self) -> None:
+        """Test `consume()` starts polling BundleGen queue if backpressure is enabled."""
+        worker = self._get_worker()
+        self.backpressure_mock.enabled = True
+        channel_mock = mock.MagicMock(name="Channel")
+
+        with mock.patch.object(worker, "watch") as watch_mock:
+            worker.consume(channel_mock)
+
+        watch_mock.assert_called_once_with(channel_mock)
+        channel_mock.start_consuming.assert_called_once_with()
+
+    def test_consume_with_watchdog(self) -> None:
+        """Test `consume()` starts checking reply timeouts if watchdog is enabled."""
+        worker = self._get_worker()
+        self.handler_mock.watchdog.enabled = True
+        channel_mock = mock.MagicMock(name="Channel")
+
+        with mock.patch.object(worker, "expire") as expire_mock:
+            worker.consume(channel_mock)
+
+        expire_mock.assert_called_once_with(channel_mock)
+        channel_mock.start_consuming.assert_called_once_with()
+
+    def test_threaded_mode(self) -> None:
+        """Test threaded mode creates dispatcher and limits prefetch to pool size."""
+        config = {"worker.mode": "threaded", "worker.threads": 8}
+        self.config_mock.get.side_effect = lambda key, default=None: config.get(key, default)
+        channel_mock = mock.MagicMock(name="Channel")
+
+        with mock.patch("service.worker.ThreadedDispatcher") as dispatcher_mock:
+            dispatcher_mock.return_value.threads = 8
+            worker = Worker(self.config_mock, self.handler_mock, self.heartbeat_mock)
+            worker.consume(channel_mock)
+            with mock.patch("service.worker.install_profiling"):
+                worker.started()
+
+        dispatcher_mock.assert_called_once_with(8)
+        self.heartbeat_mock.start.assert_called_once_with(8)
+        self.assertEqual(worker.dispatcher, dispatcher_mock.return_value)
+        channel_mock.basic_qos.assert_called_once_with(prefetch_count=8)
+
+    def test_on_request_threaded(self) -> None:
+        """Test `on_request()` hands message to pool thread and tracks it when done."""
+        worker = self._get_worker()
+        worker.dispatcher = mock.MagicMock(name="ThreadedDispatcher", pending=3)
+        args = (mock.MagicMock(name="Channel"), mock.MagicMock(name="Method"), mock.MagicMock(name="Props"), b"body")
+        proxy_mock = mock.MagicMock(name="ThreadsafeChannel")
+
+        worker.on_request(*args)
+
+        self.assertEqual(worker.pending, 3)
+        self.heartbeat_mock.message_started.assert_called_once_with()
+        channel, task, done = worker.dispatcher.submit.call_args[0]
+        self.assertEqual(channel, args[0])
+        self.handler_mock.h_request.assert_not_called()
+        self.heartbeat_mock.message_finished.assert_not_called()
+
+        task(proxy_mock)
+        done()
+
+        self.handler_mock.h_request.assert_called_once_with(proxy_mock, *args[1:])
+        self.heartbeat_mock.message_finished.assert_called_once_with()
+        self.backpressure_mock.update.assert_called_once_with(self.handler_mock.outstanding)
+
+    def _set_batch(self) -> List[Delivery]:
+        """Enable batches of 3 messages in handler and return 3 deliveries."""
+        config_mock = mock.MagicMock(name="Config")
+        config_mock.get.side_effect = {"batch.max_size": 3}.get
+        self.handler_mock.configure_mock(batch=Batch(config_mock))
+        return [(mock.MagicMock(name="Method"), mock.MagicMock(name="Props"), body) for body in (b"a", b"b", b"c")]
+
+    def test_on_request_batch_window(self) -> None:
+        """Test `on_request()` collects messages until batch window closes."""
+        worker = self._get_worker()
+        deliveries = self._set_batch()
+        channel_mock = mock.MagicMock(name="Channel")
+        connection_mock = channel_mock.connection
+
+        worker.on_request(channel_mock, *deliveries[0])
+        worker.on_request(channel_mock, *deliveries[1])
+
+        connection_mock.call_later.assert_called_once_with(0.0, mock.ANY)
+        self.handler_mock.h_batch.assert_not_called()
+
+        connection_mock.call_later.call_args[0][1]()
+        connection_mock.call_later.call_args[0][1]()
+
+        connection_mock.remove_timeout.assert_called_once_with(connection_mock.call_later.return_value)
+        self.handler_mock.h_batch.assert_called_once_with(channel_mock, deliveries[:2])
+        self.heartbeat_mock.message_started.assert_called_once_with()
+        self.heartbeat_mock.message_finished.assert_called_once_with()
+
+    def test_on_request_batch_full(self) -> None:
+        """Test `on_request()` handles batch as soon as it is full, single message is passed to `h_request()`."""
+        worker = self._get_worker()
+        deliveries = self._set_batch()
+        channel_mock = mock.MagicMock(name="Channel")
+
+        for delivery in deliveries:
+            worker.on_request(channel_mock, *delivery)
+
+        self.handler_mock.h_batch.assert_called_once_with(channel_mock, deliveries)
+
+        worker.on_request(channel_mock, *deliveries[0])
+        worker.flush(channel_mock)
+
+        self.handler_mock.h_request.assert_called_once_with(channel_mock, *deliveries[0])
 
     def test_run_exceptions(self) -> None:
         """Test `run()` method for exception case."""
@@ -145,3 +285,268 @@ class TestWorkers(TestCase):
                         worker.run()
 
                         close_mock.assert_called_once_with()
+                        self.heartbeat_mock.set_connected.assert_called_once_with(False)
+
+    def test_on_request(self) -> None:
+        """Test `on_request()` tracks in-flight message in heartbeat slot."""
+        worker = self._get_worker()
+        args = (mock.MagicMock(name="Channel"), mock.MagicMock(name="Method"), mock.MagicMock(name="Props"), b"body")
+        self.handler_mock.h_request.side_effect = KeyError()
+
+        with self.assertRaises(KeyError):
+            worker.on_request(*args)
+
+        self.handler_mock.h_request.assert_called_once_with(*args)
+        self.heartbeat_mock.message_started.assert_called_once_with()
+        self.heartbeat_mock.message_finished.assert_called_once_with()
+        self.backpressure_mock.update.assert_called_once_with(self.handler_mock.outstanding)
+
+    def test_startup_metrics(self) -> None:
+        """Test time to connection and to first message is observed once."""
+        with mock.patch("service.worker.time.monotonic", return_value=10.0):
+            worker = self._get_worker()
+        channel_mock = mock.MagicMock(name="Channel")
+        args = (channel_mock, mock.MagicMock(name="Method"), mock.MagicMock(name="Props"), b"body")
+
+        with mock.patch("service.worker.observe_startup") as observe_mock:
+            with mock.patch("service.worker.time.monotonic", return_value=12.5):
+                worker.consume(channel_mock)
+                worker.on_request(*args)
+                worker.on_request(*args)
+
+        observe_mock.assert_has_calls([mock.call("connected", 2.5), mock.call("first_message", 2.5)])
+        self.assertEqual(observe_mock.call_count, 2)
+        self.assertIsNone(worker.spawned_at)
+
+    def test_on_response(self) -> None:
+        """Test `on_response()` regulates backpressure after reply."""
+        worker = self._get_worker()
+        args = (mock.MagicMock(name="Channel"), mock.MagicMock(name="Method"), mock.MagicMock(name="Props"), b"body")
+
+        with mock.patch.object(worker, "regulate") as regulate_mock:
+            worker.on_response(*args)
+
+        self.handler_mock.h_response.assert_called_once_with(*args)
+        regulate_mock.assert_called_once_with(args[0])
+
+    def test_regulate(self) -> None:
+        """Test `regulate()` cancels input consumer on pause and subscribes again on resume."""
+        worker = self._get_worker()
+        channel_mock = mock.MagicMock(name="Channel")
+        channel_mock.basic_consume.return_value = "tag"
+        worker.subscribe(channel_mock)
+
+        worker.regulate(channel_mock)
+        channel_mock.basic_cancel.assert_not_called()
+
+        self.backpressure_mock.update.return_value = True
+        self.backpressure_mock.paused = True
+        worker.regulate(channel_mock)
+        channel_mock.basic_cancel.assert_called_once_with("tag")
+
+        self.backpressure_mock.paused = False
+        worker.regulate(channel_mock)
+        self.assertEqual(channel_mock.basic_consume.call_count, 2)
+        channel_mock.basic_consume.assert_called_with(
+            queue=self.config_mock.get(),
+            on_message_callback=worker.on_request,
+        )
+
+    def test_subscribe_affinity(self) -> None:
+        """Test input is routed to shard queues consumed by the same worker with template affinity."""
+        worker = self._get_worker()
+        self.handler_mock.affinity.enabled = True
+        self.handler_mock.affinity.subscribe.return_value = ["shard0", "shard1"]
+        channel_mock = mock.MagicMock(name="Channel")
+        channel_mock.basic_consume.return_value = "in"
+
+        worker.subscribe(channel_mock)
+
+        self.assertListEqual(worker.consumer_tags, ["in", "shard0", "shard1"])
+        channel_mock.basic_consume.assert_called_once_with(
+            queue=self.config_mock.get(),
+            on_message_callback=worker.on_route,
+        )
+        self.handler_mock.affinity.subscribe.assert_called_once_with(channel_mock, worker.on_request)
+
+        worker.unsubscribe(channel_mock)
+
+        self.assertListEqual(
+            channel_mock.basic_cancel.call_args_list,
+            [mock.call("in"), mock.call("shard0"), mock.call("shard1")],
+        )
+        self.assertListEqual(worker.consumer_tags, [])
+
+    def test_on_route(self) -> None:
+        """Test `on_route()` moves input message to shard queue of its template archive."""
+        worker = self._get_worker()
+        channel_mock = mock.MagicMock(name="Channel")
+        method_mock = mock.MagicMock(name="Method")
+        props_mock = mock.MagicMock(name="Props")
+
+        worker.on_route(channel_mock, method_mock, props_mock, b"body")
+
+        self.handler_mock.affinity_key.assert_called_once_with(b"body", props_mock)
+        self.handler_mock.affinity.route.assert_called_once_with(
+            channel_mock,
+            self.handler_mock.affinity_key.return_value,
+            props_mock,
+            b"body",
+        )
+        channel_mock.basic_ack.assert_called_once_with(delivery_tag=method_mock.delivery_tag)
+        self.handler_mock.h_request.assert_not_called()
+
+    def test_watch(self) -> None:
+        """Test `watch()` polls BundleGen queue depth and schedules itself."""
+        worker = self._get_worker()
+        channel_mock = mock.MagicMock(name="Channel")
+        channel_mock.queue_declare.return_value.method.message_count = 7
+
+        with mock.patch.object(worker, "regulate") as regulate_mock:
+            worker.watch(channel_mock)
+
+            channel_mock.queue_declare.assert_called_once_with(queue=self.config_mock.get(), passive=True)
+            self.assertEqual(self.backpressure_mock.queue_depth, 7)
+            regulate_mock.assert_called_once_with(channel_mock)
+            interval, callback = channel_mock.connection.call_later.call_args[0]
+            self.assertEqual(interval, self.backpressure_mock.interval)
+
+            callback()
+
+            self.assertEqual(regulate_mock.call_count, 2)
+
+    def test_expire(self) -> None:
+        """Test `expire()` fails timed out tickets, regulates and schedules itself."""
+        worker = self._get_worker()
+        channel_mock = mock.MagicMock(name="Channel")
+        self.handler_mock.watchdog.expired.side_effect = [["uuid"], []]
+
+        with mock.patch.object(worker, "regulate") as regulate_mock:
+            worker.expire(channel_mock)
+
+            self.handler_mock.abort_outstanding.assert_called_once_with(
+                channel_mock, "BundleGen did not reply in time", ["uuid"]
+            )
+            regulate_mock.assert_called_once_with(channel_mock)
+            interval, callback = channel_mock.connection.call_later.call_args[0]
+            self.assertEqual(interval, self.handler_mock.watchdog.interval)
+
+            callback()
+
+            self.handler_mock.abort_outstanding.assert_called_once()
+            regulate_mock.assert_called_once()
+            self.assertEqual(channel_mock.connection.call_later.call_count, 2)
+
+    def test_on_terminate(self) -> None:
+        """Test `SIGTERM` exits worker before connecting and drains it from consume loop after."""
+        worker = self._get_worker()
+
+        with self.assertRaises(SystemExit):
+            worker.on_terminate(signal.SIGTERM, None)
+
+        channel_mock = mock.MagicMock(name="Channel")
+        worker.channel = channel_mock
+
+        with mock.patch.object(worker, "drain") as drain_mock:
+            worker.on_terminate(signal.SIGTERM, None)
+            channel_mock.connection.add_callback_threadsafe.call_args[0][0]()
+
+        drain_mock.assert_called_once_with(channel_mock)
+
+    def test_call_threadsafe(self) -> None:
+        """Test callbacks are passed to consume loop once connected and dropped before."""
+        worker = self._get_worker()
+        callback = mock.MagicMock(name="callback")
+
+        worker.call_threadsafe(callback)
+
+        channel_mock = mock.MagicMock(name="Channel")
+        worker.channel = channel_mock
+        worker.call_threadsafe(callback)
+
+        channel_mock.connection.add_callback_threadsafe.assert_called_once_with(callback)
+        callback.assert_not_called()
+
+    def test_drain(self) -> None:
+        """Test `drain()` cancels input consumer and stops consuming when replies arrived or deadline passed."""
+        worker = self._get_worker()
+        worker.consumer_tags = ["tag"]
+        channel_mock = mock.MagicMock(name="Channel")
+        self.config_mock.get.return_value = 30
+        type(self.handler_mock).outstanding = mock.PropertyMock(side_effect=[2, 2, 0])
+
+        with mock.patch("service.worker.time.monotonic", return_value=100.0):
+            worker.drain(channel_mock)
+
+            self.config_mock.get.assert_called_once_with("worker.drain_timeout", 30)
+            self.assertEqual(worker.drain_deadline, 130.0)
+            channel_mock.basic_cancel.assert_called_once_with("tag")
+            self.handler_mock.batch.take.assert_called_once_with()
+            channel_mock.stop_consuming.assert_not_called()
+            interval, callback = channel_mock.connection.call_later.call_args[0]
+            self.assertEqual(interval, 0.5)
+
+            callback()
+
+            channel_mock.basic_cancel.assert_called_once_with("tag")
+            channel_mock.stop_consuming.assert_called_once_with()
+
+    def test_drain_deadline(self) -> None:
+        """Test `drain()` stops consuming after deadline even if replies are outstanding."""
+        worker = self._get_worker()
+        worker.drain_deadline = 130.0
+        channel_mock = mock.MagicMock(name="Channel")
+        type(self.handler_mock).outstanding = mock.PropertyMock(return_value=1)
+
+        with mock.patch("service.worker.time.monotonic", return_value=130.0):
+            worker.drain(channel_mock)
+
+        channel_mock.basic_cancel.assert_not_called()
+        channel_mock.connection.call_later.assert_not_called()
+        self.handler_mock.abort_outstanding.assert_called_once_with(
+            channel_mock,
+            "Worker shut down before BundleGen reply",
+        )
+        channel_mock.stop_consuming.assert_called_once_with()
+
+    def test_drain_pending(self) -> None:
+        """Test `drain()` waits for requests handled in pool threads."""
+        worker = self._get_worker()
+        worker.drain_deadline = 130.0
+        worker.dispatcher = mock.MagicMock(name="ThreadedDispatcher", pending=1)
+        channel_mock = mock.MagicMock(name="Channel")
+        type(self.handler_mock).outstanding = mock.PropertyMock(return_value=0)
+
+        with mock.patch("service.worker.time.monotonic", return_value=100.0):
+            worker.drain(channel_mock)
+
+        channel_mock.connection.call_later.assert_called_once()
+        channel_mock.stop_consuming.assert_not_called()
+
+    def test_regulate_while_draining(self) -> None:
+        """Test backpressure does not subscribe draining worker again."""
+        worker = self._get_worker()
+        worker.drain_deadline = 1.0
+        self.backpressure_mock.update.return_value = True
+        self.backpressure_mock.paused = False
+        channel_mock = mock.MagicMock(name="Channel")
+
+        worker.regulate(channel_mock)
+
+        channel_mock.basic_consume.assert_not_called()
+
+    def test_beat(self) -> None:
+        """Test `beat()` updates heartbeat slot and schedules itself."""
+        worker = self._get_worker()
+        connection_mock = mock.MagicMock(name="BlockingConnection")
+
+        with mock.patch.dict("service.worker.os.environ", {"HEARTBEAT_INTERVAL": "2"}):
+            worker.beat(connection_mock)
+
+            self.heartbeat_mock.update.assert_called_once_with()
+            interval, callback = connection_mock.call_later.call_args[0]
+            self.assertEqual(interval, 2.0)
+
+            callback()
+
+            self.assertEqual(self.heartbeat_mock.update.call_count, 2)